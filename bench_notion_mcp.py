@@ -0,0 +1,554 @@
+"""
+notion_mcp 基准测试：在本地启动一个模拟 Notion API 的服务器，测量各工具的吞吐与延迟，结果以 JSON 输出。
+
+用法:
+    python bench_notion_mcp.py                              # 默认参数运行全部场景
+    python bench_notion_mcp.py --latency-ms 50 --rate-429 0.05 --output run.json
+    python bench_notion_mcp.py --compare baseline.json      # 与上一次结果对比
+    python bench_notion_mcp.py --only normalize_properties --startup-budget-ms 1500   # 检查冷启动预算
+    python bench_notion_mcp.py --only json_decode_query json_decode_query_stdlib json_encode_query json_encode_query_stdlib
+
+模拟服务器支持 databases、pages、数据库 query 分页、block children 分页，可配置每个请求的延迟与 429 注入比例。
+所有数据仅保存在内存中，不会访问真实的 Notion。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import platform
+import statistics
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FAKE_DATABASE_ID = "b" * 32
+FAKE_TOKEN = "bench-token"
+
+# 模拟数据库的架构，覆盖常见属性类型
+FAKE_SCHEMA = {
+    "Name": {"id": "title", "type": "title", "title": {}},
+    "状态": {"id": "s1", "type": "select", "select": {"options": [{"name": "进行中"}, {"name": "已完成"}]}},
+    "工作类型": {"id": "s2", "type": "select", "select": {"options": [
+        {"name": "📱 小程序端"}, {"name": "💻 vue后台web端"}, {"name": "🔌 fastAPI后台接口端"}, {"name": "📝 日常记录"},
+    ]}},
+    "标签": {"id": "m1", "type": "multi_select", "multi_select": {"options": []}},
+    "记录时间": {"id": "d1", "type": "date", "date": {}},
+    "内容": {"id": "r1", "type": "rich_text", "rich_text": {}},
+    "Priority": {"id": "s3", "type": "select", "select": {"options": []}},
+}
+
+def now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+def typed_properties(properties):
+    """模拟 Notion：为写入的属性值补上 type 字段。"""
+    return {
+        name: dict(value, type=next(iter(value))) if isinstance(value, dict) and value and "type" not in value else value
+        for name, value in (properties or {}).items()
+    }
+
+class FakeNotion:
+    """模拟 Notion 的内存状态与故障注入配置。"""
+
+    def __init__(self, latency=0.0, rate_429=0.0, seed=0, retry_after=0.0):
+        self.latency = latency
+        self.rate_429 = rate_429
+        # 注入的 429 携带的 Retry-After（秒），0 表示不带该响应头
+        self.retry_after = retry_after
+        # throttle_next 强制接下来若干个请求返回 429，并携带指定的 Retry-After
+        self.forced_429 = 0
+        self.forced_retry_after = 0.0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.children = {}
+        self.requests = 0
+        self.throttled = 0
+        # 服务器接受的 TCP 连接数：远小于请求数说明客户端复用了 keep-alive 连接
+        self.connections = 0
+
+    def seed_pages(self, count):
+        for i in range(count):
+            page = self.new_page({
+                "Name": {"title": [{"text": {"content": f"任务 {i}"}, "plain_text": f"任务 {i}"}]},
+                "状态": {"select": {"name": "已完成" if i % 2 else "进行中"}},
+                "记录时间": {"date": {"start": "2026-01-01"}},
+            })
+            self.pages[page["id"]] = page
+
+    def new_page(self, properties):
+        page_id = uuid.uuid4().hex
+        timestamp = now_iso()
+        return {
+            "object": "page",
+            "id": page_id,
+            "url": f"https://www.notion.so/{page_id}",
+            "created_time": timestamp,
+            "last_edited_time": timestamp,
+            "parent": {"type": "database_id", "database_id": FAKE_DATABASE_ID},
+            "archived": False,
+            "properties": typed_properties(properties),
+        }
+
+    def throttle_next(self, count, retry_after):
+        with self.lock:
+            self.forced_429 = count
+            self.forced_retry_after = retry_after
+
+    def should_throttle(self):
+        """返回本次请求是否限流，以及 429 响应应携带的 Retry-After 秒数（None 表示不限流）。"""
+        with self.lock:
+            self.requests += 1
+            if self.forced_429 > 0:
+                self.forced_429 -= 1
+                self.throttled += 1
+                return self.forced_retry_after
+            if self.rate_429 and self.random.random() < self.rate_429:
+                self.throttled += 1
+                return self.retry_after
+        return None
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = 0
+            self.throttled = 0
+            self.connections = 0
+
+def paginate(items, start_cursor, page_size):
+    start = int(start_cursor or 0)
+    size = min(int(page_size or 100), 100)
+    chunk = items[start:start + size]
+    next_index = start + size
+    has_more = next_index < len(items)
+    return {"object": "list", "results": chunk, "next_cursor": str(next_index) if has_more else None, "has_more": has_more}
+
+class FakeNotionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体分两次写出，关闭 Nagle 以免延迟确认拖慢 keep-alive 请求
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        # 每个处理器实例对应一个被接受的连接（keep-alive 下会依次处理多个请求）
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def _send(self, status, obj, headers=None):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, code, message, headers=None):
+        self._send(status, {"object": "error", "status": status, "code": code, "message": message}, headers)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _handle(self, method):
+        state = self.state
+        body = self._body()
+        path, _, query = self.path.partition("?")
+        path = path.split("/v1/", 1)[-1].strip("/")
+        params = dict(part.split("=", 1) for part in query.split("&") if "=" in part)
+
+        if state.latency:
+            time.sleep(state.latency)
+        retry_after = state.should_throttle()
+        if retry_after is not None:
+            headers = {"Retry-After": f"{retry_after:g}"} if retry_after else None
+            return self._error(429, "rate_limited", "Rate limited (injected)", headers)
+        parts = path.split("/")
+
+        if parts[0] == "search":
+            database = {"object": "database", "id": FAKE_DATABASE_ID, "title": [{"plain_text": "工作日志"}], "url": "https://www.notion.so/db"}
+            return self._send(200, paginate([database], body.get("start_cursor"), body.get("page_size")))
+
+        if parts[0] == "databases" and len(parts) == 3 and parts[2] == "query":
+            with state.lock:
+                rows = list(state.pages.values())
+            return self._send(200, paginate(rows, body.get("start_cursor"), body.get("page_size")))
+
+        if parts[0] == "databases" and len(parts) == 2:
+            if method == "PATCH":
+                with state.lock:
+                    for name, value in (body.get("properties") or {}).items():
+                        if value is None:
+                            FAKE_SCHEMA.pop(name, None)
+                        else:
+                            FAKE_SCHEMA[name] = dict(value, type=next(iter(value)))
+            return self._send(200, {"object": "database", "id": FAKE_DATABASE_ID,
+                                    "title": [{"plain_text": "工作日志"}], "properties": FAKE_SCHEMA})
+
+        if parts[0] == "pages" and len(parts) == 1 and method == "POST":
+            unknown = [name for name in body.get("properties", {}) if name not in FAKE_SCHEMA]
+            if unknown:
+                return self._error(400, "validation_error", f"{unknown[0]} is not a property that exists.")
+            page = state.new_page(body.get("properties"))
+            with state.lock:
+                state.pages[page["id"]] = page
+                state.children[page["id"]] = list(body.get("children") or [])
+            return self._send(200, page)
+
+        if parts[0] == "pages" and len(parts) == 2:
+            with state.lock:
+                page = state.pages.get(parts[1])
+                if page is not None and method == "PATCH":
+                    page["properties"].update(typed_properties(body.get("properties")))
+                    page["last_edited_time"] = now_iso()
+            if page is None:
+                return self._error(404, "object_not_found", "Could not find page.")
+            return self._send(200, page)
+
+        if parts[0] == "blocks" and len(parts) == 3 and parts[2] == "children":
+            with state.lock:
+                blocks = state.children.setdefault(parts[1], [])
+                if method == "PATCH":
+                    appended = [dict(block, id=uuid.uuid4().hex, object="block", has_children=False)
+                                for block in body.get("children", [])]
+                    blocks.extend(appended)
+                    return self._send(200, {"object": "list", "results": appended})
+                items = list(blocks)
+            return self._send(200, paginate(items, params.get("start_cursor"), params.get("page_size")))
+
+        return self._error(404, "invalid_request_url", f"Unsupported path: {method} {path}")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+def start_fake_server(state):
+    handler = type("BoundFakeNotionHandler", (FakeNotionHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-notion", daemon=True).start()
+    return server
+
+def summarize(latencies, elapsed, requests):
+    """汇总单个场景：吞吐、延迟分位数（毫秒）与每次操作的上游请求数。"""
+    ordered = sorted(latencies)
+
+    def pct(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "iterations": len(ordered),
+        "ops_per_sec": round(len(ordered) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "requests_per_op": round(requests / len(ordered), 2),
+    }
+
+def run_scenario(state, fn, iterations, warmup):
+    for i in range(warmup):
+        fn(i)
+    state.reset_counters()
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        result = fn(i)
+        latencies.append(time.perf_counter() - t0)
+        if isinstance(result, str) and result.startswith("Error"):
+            raise RuntimeError(f"Benchmark call failed: {result[:300]}")
+    elapsed = time.perf_counter() - started
+    # 计时阶段新建的连接数（预热阶段已建立的连接被复用时不计入）
+    return dict(summarize(latencies, elapsed, state.requests), throttled=state.throttled,
+                new_connections=state.connections)
+
+def build_scenarios(nm, state, args):
+    """返回 {场景名: 单次调用函数}；模块需在配置好环境变量后再导入。"""
+    page_ids = []
+    long_markdown = "\n\n".join(f"## 小节 {i}\n- 要点 {i}\n" + "正文内容 " * 40 for i in range(30))
+
+    def create(i):
+        result = nm.create_notion_page(
+            title=f"基准页面 {i}",
+            properties={"zhuang_tai": "进行中", "gong_zuo_lei_xing": "💻 vue后台web端", "Priority": "High"},
+            content="修复了登录页在 Safari 下的样式问题",
+        )
+        with state.lock:
+            page_ids.append(next(reversed(state.pages)))
+        return result
+
+    def query(i):
+        return nm.query_database(max_results=args.rows, format="compact")
+
+    def update(i):
+        return nm.update_notion_page(page_ids[i % len(page_ids)], {"zhuangtai": "已完成", "neirong": f"更新 {i}"},
+                                     database_id=FAKE_DATABASE_ID)
+
+    def append(i):
+        return nm.append_page_content(page_ids[i % len(page_ids)], long_markdown)
+
+    schema = {"properties": FAKE_SCHEMA}
+    raw_props = {"zhuang_tai": "已完成", "gong_zuo_lei_xing": "📝 日常记录", "biaoqian": ["a", "b"],
+                 "jilushijian": "today", "neirong": "本地归一化", "Priority": "Low"}
+
+    # 同一批 100 个页面：create_notion_pages 一次批量提交（有限并发）与逐个调用 create_notion_page 对比
+    bulk_items = [{"title": f"批量页面 {n}", "properties": {"zhuang_tai": "进行中", "Priority": "Low"}, "content": "批量创建"}
+                  for n in range(BULK_PAGES)]
+
+    # 与 MCP 服务一样在同一个长期运行的事件循环中调用，异步连接池跨调用复用
+    bulk_loop = asyncio.new_event_loop()
+
+    def create_bulk(i):
+        summary = json.loads(bulk_loop.run_until_complete(nm.create_notion_pages(items=bulk_items)))
+        if summary["failed"]:
+            return f"Error: {summary['failed']} of {BULK_PAGES} bulk creates failed"
+        return summary
+
+    def create_sequential(i):
+        for item in bulk_items:
+            result = nm.create_notion_page(**item)
+            if result.startswith("Error"):
+                return result
+        return result
+
+    # 每次调用的首个请求被强制限流并携带 Retry-After：耗时应不低于该值，说明客户端按响应头退避而非指数退避
+    probe_page_id = next(iter(state.pages), None)
+
+    def retry_after(i):
+        state.throttle_next(1, RETRY_AFTER_PROBE)
+        return nm.get_page_info(probe_page_id)
+
+    def normalize(i):
+        return nm.normalize_properties(FAKE_DATABASE_ID, raw_props, db_props=schema["properties"])
+
+    # 100 行的 query 响应：解码对应 notion_request 解析响应体，编码对应工具返回值（stdlib 场景为对照组）
+    query_payload = {"object": "list", "results": list(state.pages.values())[:100], "next_cursor": None, "has_more": False}
+    query_body = json.dumps(query_payload).encode("utf-8")
+
+    def json_decode(i):
+        return nm.json_loads(query_body)
+
+    def json_decode_stdlib(i):
+        return json.loads(query_body.decode("utf-8"))
+
+    def json_encode(i):
+        return nm.to_json(query_payload)
+
+    def json_encode_stdlib(i):
+        return json.dumps(query_payload, indent=2, ensure_ascii=False)
+
+    return {
+        "create_notion_page": create,
+        "query_database": query,
+        "update_notion_page": update,
+        "append_page_content": append,
+        "retry_after_backoff": retry_after,
+        "create_notion_pages_100": create_bulk,
+        "create_notion_page_x100": create_sequential,
+        "normalize_properties": normalize,
+        "json_decode_query": json_decode,
+        "json_decode_query_stdlib": json_decode_stdlib,
+        "json_encode_query": json_encode,
+        "json_encode_query_stdlib": json_encode_stdlib,
+    }
+
+# 批量建页对比场景每次调用创建的页面数
+BULK_PAGES = 100
+# 批量建页对比场景默认的每请求延迟（毫秒）：并发的收益来自重叠网络等待，延迟为 0 时两者都只受本进程 CPU 限制
+BULK_LATENCY_MS = 20.0
+BULK_SCENARIOS = ("create_notion_pages_100", "create_notion_page_x100")
+
+# retry_after_backoff 场景中强制 429 携带的 Retry-After（秒），为基准环境下指数退避上限（NOTION_BACKOFF_MAX=0.05）的两倍
+RETRY_AFTER_PROBE = 0.1
+
+# 不访问模拟服务器的纯 CPU 场景：单次耗时短，使用单独的调用次数
+CPU_SCENARIOS = ("normalize_properties", "json_decode_query", "json_decode_query_stdlib",
+                 "json_encode_query", "json_encode_query_stdlib")
+
+# 在全新子进程中测量冷启动：导入耗时、导入后是否已加载重量级依赖，以及（可选预热后）首次建页耗时
+STARTUP_SNIPPET = """
+import sys, time, json, asyncio
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import notion_mcp as nm
+imported = time.perf_counter() - started
+loaded = [name for name in ("requests", "httpx", "pypinyin") if name in sys.modules]
+if {warm}:
+    asyncio.run(nm.warm_up())
+started = time.perf_counter()
+result = nm.create_notion_page(title="startup", properties={{"zhuang_tai": "进行中"}})
+first_call = time.perf_counter() - started
+assert not result.startswith("Error"), result
+print(json.dumps({{"import_ms": imported * 1000, "first_create_ms": first_call * 1000, "eager_modules": loaded}}))
+"""
+
+def measure_startup(runs):
+    """分别在冷启动与预热后各运行 runs 次子进程，返回中位数汇总。"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    samples = {"cold": [], "warm": []}
+    for mode in samples:
+        code = STARTUP_SNIPPET.format(root=root, warm=mode == "warm")
+        for _ in range(runs):
+            started = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", code], env=os.environ, capture_output=True, text=True, check=True)
+            sample = json.loads(output.stdout.strip().splitlines()[-1])
+            sample["process_ms"] = (time.perf_counter() - started) * 1000
+            samples[mode].append(sample)
+
+    def median(mode, key):
+        return round(statistics.median(sample[key] for sample in samples[mode]), 3)
+
+    return {
+        "runs": runs,
+        "import_ms": median("cold", "import_ms"),
+        "process_ms": median("cold", "process_ms"),
+        "eager_modules": samples["cold"][0]["eager_modules"],
+        "first_create_cold_ms": median("cold", "first_create_ms"),
+        "first_create_warm_ms": median("warm", "first_create_ms"),
+    }
+
+def compare(current, baseline):
+    """按场景比较 p50 与吞吐的变化比例（正数表示变慢/变少）。"""
+    report = {}
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        report[name] = {
+            "p50_change": round(result["p50_ms"] / before["p50_ms"] - 1, 4) if before.get("p50_ms") else None,
+            "ops_per_sec_change": round(result["ops_per_sec"] / before["ops_per_sec"] - 1, 4) if before.get("ops_per_sec") else None,
+        }
+    if current.get("startup") and baseline.get("startup", {}).get("import_ms"):
+        report["startup"] = {"import_ms_change": round(current["startup"]["import_ms"] / baseline["startup"]["import_ms"] - 1, 4)}
+    return report
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark notion_mcp tools against a local fake Notion API.")
+    parser.add_argument("--iterations", type=int, default=50, help="每个场景的计时调用次数")
+    parser.add_argument("--warmup", type=int, default=5, help="每个场景的预热调用次数")
+    parser.add_argument("--normalize-iterations", type=int, default=20000, help="normalize_properties 的调用次数")
+    parser.add_argument("--bulk-iterations", type=int, default=3, help=f"批量建页对比场景的调用次数（每次 {BULK_PAGES} 个页面）")
+    parser.add_argument("--bulk-latency-ms", type=float, default=BULK_LATENCY_MS,
+                        help="批量建页对比场景中模拟服务器每个请求的延迟（毫秒），代替 --latency-ms")
+    parser.add_argument("--codec-iterations", type=int, default=2000, help="JSON 编解码场景（100 行 query 载荷）的调用次数")
+    parser.add_argument("--rows", type=int, default=500, help="query_database 场景的数据库行数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="模拟服务器每个请求的附加延迟（毫秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="随机返回 429 的请求比例（0~1）")
+    parser.add_argument("--retry-after", type=float, default=0.0, help="随机注入的 429 携带的 Retry-After 秒数（0 表示不带该响应头）")
+    parser.add_argument("--seed", type=int, default=0, help="429 注入的随机种子")
+    parser.add_argument("--only", nargs="*", help="只运行这些场景")
+    parser.add_argument("--startup-runs", type=int, default=3, help="冷启动测量的子进程次数（0 表示跳过）")
+    parser.add_argument("--startup-budget-ms", type=float, default=2500, help="导入耗时预算（毫秒），超出时以退出码 1 结束")
+    parser.add_argument("--output", help="将 JSON 结果写入该文件（默认输出到 stdout）")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    state = FakeNotion(latency=args.latency_ms / 1000, rate_429=args.rate_429, seed=args.seed, retry_after=args.retry_after)
+    server = start_fake_server(state)
+    workdir = tempfile.mkdtemp(prefix="notion-bench-")
+
+    # notion_mcp 在导入时读取配置，因此先设置环境变量：指向模拟服务器、放开客户端限流、关闭查询缓存以测量真实路径
+    os.environ.update({
+        "NOTION_API_BASE": f"http://127.0.0.1:{server.server_port}/v1/",
+        "NOTION_TOKEN": FAKE_TOKEN,
+        "DATABASE_ID": FAKE_DATABASE_ID,
+        "NOTION_RATE_LIMIT": "100000",
+        "NOTION_RATE_BURST": "100000",
+        "NOTION_BACKOFF_BASE": "0.01",
+        "NOTION_BACKOFF_MAX": "0.05",
+        "NOTION_QUERY_CACHE_TTL": "0",
+        "NOTION_MIRROR_PATH": os.path.join(workdir, "mirror.sqlite3"),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import notion_mcp as nm
+
+    startup = measure_startup(args.startup_runs) if args.startup_runs > 0 else None
+    if startup:
+        startup["budget_ms"] = args.startup_budget_ms
+        startup["within_budget"] = startup["import_ms"] <= args.startup_budget_ms
+
+    state.seed_pages(args.rows)
+    scenarios = build_scenarios(nm, state, args)
+    selected = args.only or list(scenarios)
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(unknown)}. Available: {', '.join(scenarios)}")
+    # update / append 依赖 create 生成的页面
+    if {"update_notion_page", "append_page_content"} & set(selected) and "create_notion_page" not in selected:
+        for i in range(args.warmup):
+            scenarios["create_notion_page"](i)
+
+    results = {}
+    for name in selected:
+        if name == "normalize_properties":
+            iterations = args.normalize_iterations
+        elif name in CPU_SCENARIOS:
+            iterations = args.codec_iterations
+        elif name in BULK_SCENARIOS:
+            iterations = args.bulk_iterations
+        else:
+            iterations = args.iterations
+        if name in CPU_SCENARIOS:
+            warmup = 100
+        elif name in BULK_SCENARIOS:
+            warmup = 1
+        else:
+            warmup = args.warmup
+        if name in BULK_SCENARIOS:
+            state.latency = args.bulk_latency_ms / 1000
+            results[name] = dict(run_scenario(state, scenarios[name], iterations, warmup), latency_ms=args.bulk_latency_ms)
+            state.latency = args.latency_ms / 1000
+        else:
+            results[name] = run_scenario(state, scenarios[name], iterations, warmup)
+    if set(BULK_SCENARIOS) <= set(results):
+        bulk, sequential = (results[name] for name in BULK_SCENARIOS)
+        bulk["speedup_vs_sequential"] = round(sequential["p50_ms"] / bulk["p50_ms"], 2)
+    if "retry_after_backoff" in results:
+        probe = results["retry_after_backoff"]
+        probe["retry_after_ms"] = RETRY_AFTER_PROBE * 1000
+        probe["retry_after_honored"] = probe["min_ms"] >= RETRY_AFTER_PROBE * 1000
+
+    report = {
+        "timestamp": now_iso(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "startup": startup,
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    server.shutdown()
+    if startup and not startup["within_budget"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
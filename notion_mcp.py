@@ -1,20 +1,146 @@
 import os
+import re
 import json
 import sys
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError, URLError
-import requests
+import copy
+import random
+import bisect
+import asyncio
+import inspect
+import threading
+import time
+import weakref
+import sqlite3
+import hashlib
+import functools
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict
+from http.cookiejar import DefaultCookiePolicy
 from datetime import datetime, timedelta, timezone
+from typing import Annotated, Optional
+from pydantic import Field
 from fastmcp import FastMCP
-import pypinyin
+from fastmcp.server.middleware import Middleware
+# 可选依赖：安装了 orjson 时用作 JSON 编解码后端
+try:
+    import orjson
+except ImportError:
+    orjson = None
+# requests、httpx 与 pypinyin（词典较大）导入较慢，延迟到首次使用时导入，以缩短服务冷启动时间
 
 # Initialize MCP
 mcp = FastMCP("Notion MCP Server")
 
-API_BASE = "https://api.notion.com/v1/"
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+DEFAULT_PROFILE = "default"
+# 命名配置档案：NOTION_TOKEN_<NAME> / DATABASE_ID_<NAME>
+PROFILE_KEY_RE = re.compile(r"(NOTION_TOKEN|DATABASE_ID)_([A-Za-z0-9]+)")
+
+def parse_env_file(path):
+    """解析 .env 文件为 dict，文件不存在时返回空 dict。"""
+    values = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "=" not in line:
+                    continue
+                k, v = line.split("=", 1)
+                values[k.strip()] = v.strip().strip('"').strip("'")
+    except FileNotFoundError:
+        pass
+    return values
+
+# 启动时读取一次的 .env 内容：下方各项运行参数既可写在 .env 中，也可通过进程环境变量设置
+ENV_FILE_SETTINGS = parse_env_file(ENV_PATH)
+
+def setting(name, default):
+    """
+    读取运行参数：进程环境变量优先，其次为 .env。只在导入时读取，修改后需重启服务生效；
+    凭据与档案（NOTION_TOKEN / DATABASE_ID / NOTION_PROFILE）由 ConfigStore 管理并支持热更新。
+    """
+    value = os.environ.get(name)
+    return ENV_FILE_SETTINGS.get(name, default) if value is None else value
+
+# 允许通过 NOTION_API_BASE 指向本地替身服务（测试/压测用）
+API_BASE = setting("NOTION_API_BASE", "https://api.notion.com/v1/")
 # Default to the most stable version for property operations
 DEFAULT_NOTION_VERSION = "2022-06-28"
 
+# HTTP 连接池配置
+NOTION_POOL_SIZE = int(setting("NOTION_POOL_SIZE", "10"))
+NOTION_CONNECT_TIMEOUT = float(setting("NOTION_CONNECT_TIMEOUT", "5"))
+NOTION_READ_TIMEOUT = float(setting("NOTION_READ_TIMEOUT", "30"))
+
+# 客户端限流（Notion 官方限制平均 3 次/秒）与重试配置
+NOTION_RATE_LIMIT = float(setting("NOTION_RATE_LIMIT", "3"))
+NOTION_RATE_BURST = int(setting("NOTION_RATE_BURST", "3"))
+NOTION_MAX_RETRIES = int(setting("NOTION_MAX_RETRIES", "5"))
+NOTION_BACKOFF_BASE = float(setting("NOTION_BACKOFF_BASE", "0.5"))
+NOTION_BACKOFF_MAX = float(setting("NOTION_BACKOFF_MAX", "8"))
+# 单次工具调用（含所有重试与限流等待）的总时限（秒）
+NOTION_CALL_DEADLINE = float(setting("NOTION_CALL_DEADLINE", "60"))
+# 批量工具同时在途的写请求数
+NOTION_BULK_CONCURRENCY = int(setting("NOTION_BULK_CONCURRENCY", "5"))
+
+# 数据库架构缓存配置：TTL（秒）与最多缓存的数据库数量
+NOTION_SCHEMA_TTL = float(setting("NOTION_SCHEMA_TTL", "300"))
+NOTION_SCHEMA_CACHE_SIZE = int(setting("NOTION_SCHEMA_CACHE_SIZE", "64"))
+# 数据库查询结果缓存：TTL（秒，0 表示关闭）与总容量（字节）
+NOTION_QUERY_CACHE_TTL = float(setting("NOTION_QUERY_CACHE_TTL", "30"))
+NOTION_QUERY_CACHE_BYTES = int(setting("NOTION_QUERY_CACHE_BYTES", str(8 * 1024 * 1024)))
+# 运行指标：是否启用，以及 Prometheus 文本文件的输出路径与写出间隔（秒）
+NOTION_METRICS = setting("NOTION_METRICS", "1").lower() not in ("0", "false", "no", "off")
+NOTION_METRICS_FILE = setting("NOTION_METRICS_FILE", "")
+NOTION_METRICS_INTERVAL = float(setting("NOTION_METRICS_INTERVAL", "15"))
+# 本地 SQLite 镜像文件路径
+NOTION_MIRROR_PATH = setting(
+    "NOTION_MIRROR_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "notion_mirror.sqlite3")
+)
+# 工作类型关键词表（JSON：{"选项名": ["关键词", ...]}），文件不存在时使用内置映射；
+# 以及检查该文件是否修改的间隔（秒，0 表示只在首次使用时加载一次）
+NOTION_WORK_TYPE_KEYWORDS = setting(
+    "NOTION_WORK_TYPE_KEYWORDS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "work_type_keywords.json")
+)
+NOTION_WORK_TYPE_KEYWORDS_RELOAD_INTERVAL = float(setting("NOTION_WORK_TYPE_KEYWORDS_RELOAD_INTERVAL", "2"))
+# 写后台化（write-behind）：开启后建页与追加正文先写入本地日志并立即返回票据，由后台线程按顺序提交
+NOTION_WRITE_BEHIND = setting("NOTION_WRITE_BEHIND", "0").lower() not in ("0", "false", "no", "off")
+NOTION_WRITE_JOURNAL_PATH = setting(
+    "NOTION_WRITE_JOURNAL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "notion_writes.sqlite3")
+)
+# 同一页面的连续追加最多合并多少条，以及上游故障时重试间隔的上限（秒）
+NOTION_WRITE_BATCH = int(setting("NOTION_WRITE_BATCH", "20"))
+NOTION_WRITE_RETRY_MAX = float(setting("NOTION_WRITE_RETRY_MAX", "60"))
+# 队首写入持续暂时性失败时的放弃条件：最多尝试次数与最长等待时长（秒），达到后标记为失败，不再阻塞后续写入
+NOTION_WRITE_MAX_ATTEMPTS = int(setting("NOTION_WRITE_MAX_ATTEMPTS", "100"))
+NOTION_WRITE_MAX_AGE = float(setting("NOTION_WRITE_MAX_AGE", "86400"))
+# 传输方式：stdio（默认）、http 或 sse；后两者监听 NOTION_HOST:NOTION_PORT
+NOTION_TRANSPORT = setting("NOTION_TRANSPORT", "stdio").lower()
+NOTION_HOST = setting("NOTION_HOST", "127.0.0.1")
+NOTION_PORT = int(setting("NOTION_PORT", "8000"))
+# HTTP/SSE 多租户：是否要求每个请求携带 X-Notion-Token（否则回落到 .env 配置），以及租户状态的空闲回收时间（秒）与上限
+NOTION_REQUIRE_TENANT_TOKEN = setting("NOTION_REQUIRE_TENANT_TOKEN", "0").lower() not in ("0", "false", "no", "off")
+NOTION_TENANT_IDLE_TTL = float(setting("NOTION_TENANT_IDLE_TTL", "1800"))
+NOTION_TENANT_MAX = int(setting("NOTION_TENANT_MAX", "1000"))
+# JSON 编解码：工具返回值的默认样式（pretty 缩进 / minified 最小化），以及后端（auto 优先 orjson / stdlib 强制标准库）
+NOTION_JSON_STYLE = setting("NOTION_JSON_STYLE", "pretty").lower()
+NOTION_JSON_BACKEND = setting("NOTION_JSON_BACKEND", "auto").lower()
+
+# MCP 握手完成后是否在后台预热（拉取默认数据库架构、编译属性解析器、加载拼音词典）
+NOTION_WARMUP = setting("NOTION_WARMUP", "1").lower() not in ("0", "false", "no", "off")
+# .env 中凭据与档案热更新的检查间隔（秒，0 表示只在启动时加载一次）
+NOTION_CONFIG_RELOAD_INTERVAL = float(setting("NOTION_CONFIG_RELOAD_INTERVAL", "2"))
+
+# 已授权数据库目录（标题 -> ID 索引）的刷新间隔（秒），以及按标题解析未命中时强制刷新的最短间隔（秒）
+NOTION_DIRECTORY_TTL = float(setting("NOTION_DIRECTORY_TTL", "300"))
+NOTION_DIRECTORY_MISS_REFRESH = float(setting("NOTION_DIRECTORY_MISS_REFRESH", "30"))
+
+# 页面 -> 所属数据库映射的最多缓存条数
+NOTION_PAGE_PARENT_CACHE_SIZE = int(setting("NOTION_PAGE_PARENT_CACHE_SIZE", "4096"))
+# Block 子树缓存的最多条目数（get_page_content）
+NOTION_BLOCK_CACHE_SIZE = int(setting("NOTION_BLOCK_CACHE_SIZE", "1024"))
+
 def get_now_str():
     """Get current time in ISO 8601 format for Notion date property (Beijing time)."""
     tz_beijing = timezone(timedelta(hours=8))
@@ -26,618 +152,4506 @@ def mask_id(id_str):
         return "****"
     return f"{id_str[:4]}...{id_str[-4:]}"
 
-def load_env_vars():
-    """从环境变量或 .env 文件安全加载配置。"""
-    token = os.environ.get("NOTION_TOKEN")
-    db_id = os.environ.get("DATABASE_ID")
-    
-    # 如果系统环境变量中没有，再尝试读取本地 .env 文件
-    if not token or not db_id:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        env_path = os.path.join(base_dir, ".env")
-        if os.path.exists(env_path):
-            with open(env_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith("#"):
-                        continue
-                    if "=" in line:
-                        k, v = line.split("=", 1)
-                        k, v = k.strip(), v.strip().strip('"').strip("'")
-                        if k == "NOTION_TOKEN" and not token:
-                            token = v
-                        elif k == "DATABASE_ID" and not db_id:
-                            db_id = v
-    
-    # 如果依然缺失，在 stderr 输出警告（有助于云端日志排查）
-    if not token:
-        print("⚠️ 警告: 未找到 NOTION_TOKEN 配置", file=sys.stderr)
-    if not db_id:
-        print("⚠️ 警告: 未找到 DATABASE_ID 配置", file=sys.stderr)
-        
-    return token, db_id
 
-def notion_request(method, path, body=None, version=DEFAULT_NOTION_VERSION):
+class NotionConfig:
     """
-    Unified Notion API request handler.
+    一次解析得到的凭据与档案快照（热更新时整体替换，不做原地修改）；其余运行参数见 setting()，只在启动时读取。
+    环境变量优先于 .env；默认档案来自 NOTION_TOKEN / DATABASE_ID，
+    命名档案来自 NOTION_TOKEN_<NAME> / DATABASE_ID_<NAME>，未单独配置 Token 的档案沿用默认 Token。
     """
-    token, _ = load_env_vars()
-    if not token:
-        return 0, {"error": "Missing NOTION_TOKEN in environment or .env file"}
-    
-    url = API_BASE + path
+
+    def __init__(self, values):
+        self.profiles = {DEFAULT_PROFILE: {"token": values.get("NOTION_TOKEN"), "database_id": values.get("DATABASE_ID")}}
+        for key, value in values.items():
+            match = PROFILE_KEY_RE.fullmatch(key)
+            if not match:
+                continue
+            field = "token" if match.group(1) == "NOTION_TOKEN" else "database_id"
+            self.profiles.setdefault(match.group(2).lower(), {"token": None, "database_id": None})[field] = value
+        for name, profile in self.profiles.items():
+            if name != DEFAULT_PROFILE and not profile["token"]:
+                profile["token"] = self.profiles[DEFAULT_PROFILE]["token"]
+        self.default_profile = (values.get("NOTION_PROFILE") or DEFAULT_PROFILE).lower()
+
+    def profile(self, name=None):
+        """返回档案的 (token, database_id)，档案不存在时返回 (None, None)。"""
+        profile = self.profiles.get((name or self.default_profile).lower())
+        if profile is None:
+            return None, None
+        return profile["token"], profile["database_id"]
+
+class ConfigStore:
+    """
+    凭据与档案（NOTION_TOKEN / DATABASE_ID / NOTION_PROFILE 及命名档案）的缓存：首次访问时加载，
+    之后由后台线程按 .env 的 mtime 热更新；请求路径上只读取内存中的快照，不做任何文件 I/O。
+    """
+
+    def __init__(self, env_path=ENV_PATH, reload_interval=None):
+        self.env_path = env_path
+        self.reload_interval = NOTION_CONFIG_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        self._config = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.env_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self, force=False):
+        """.env 的 mtime 变化（或 force）时重新解析；返回是否发生了重载。"""
+        mtime = self._stat_mtime()
+        with self._lock:
+            if not force and self._config is not None and mtime == self._mtime:
+                return False
+            values = parse_env_file(self.env_path)
+            values.update({k: v for k, v in os.environ.items() if k in ("NOTION_TOKEN", "DATABASE_ID", "NOTION_PROFILE")
+                           or PROFILE_KEY_RE.fullmatch(k)})
+            config = NotionConfig(values)
+            self._config, self._mtime = config, mtime
+
+        # 只在加载时提示缺失项（有助于云端日志排查），不再每次请求重复输出
+        token, db_id = config.profile()
+        if not token:
+            print("⚠️ 警告: 未找到 NOTION_TOKEN 配置", file=sys.stderr)
+        if not db_id:
+            print("⚠️ 警告: 未找到 DATABASE_ID 配置", file=sys.stderr)
+        return True
+
+    def get(self):
+        config = self._config
+        if config is None:
+            self.reload()
+            self._start_watcher()
+            config = self._config
+        return config
+
+    def _start_watcher(self):
+        with self._lock:
+            if self._watcher is not None or self.reload_interval <= 0:
+                return
+
+            def run():
+                while True:
+                    time.sleep(self.reload_interval)
+                    self.reload()
+
+            self._watcher = threading.Thread(target=run, name="notion-config-watcher", daemon=True)
+        self._watcher.start()
+
+config_store = ConfigStore()
+
+# 当前工具调用选用的配置档案（None 表示默认档案）
+_active_profile = contextvars.ContextVar("notion_profile", default=None)
+
+@contextmanager
+def use_profile(name=None):
+    """在此上下文内的 Notion 请求与默认数据库使用指定档案。"""
+    token = _active_profile.set(name.lower() if name else None)
+    try:
+        yield
+    finally:
+        _active_profile.reset(token)
+
+# 当前请求所属租户的 (token, database_id)，由 HTTP 请求头提供；None 表示使用 .env 配置
+_active_tenant = contextvars.ContextVar("notion_tenant", default=None)
+
+@contextmanager
+def use_tenant(token, database_id=None):
+    """在此上下文内的 Notion 请求使用租户自带的 Token 与默认数据库（不读取 .env 中的凭据与档案）。"""
+    reset_token = _active_tenant.set((token, database_id or None))
+    try:
+        yield
+    finally:
+        _active_tenant.reset(reset_token)
+
+def tenant_session():
+    """当前调用是否来自携带自有 Token 的租户。"""
+    return _active_tenant.get() is not None
+
+def load_env_vars(profile=None):
+    """返回当前租户或档案的 (token, database_id)，读取的是已缓存的配置，不访问文件系统。"""
+    tenant = _active_tenant.get()
+    if tenant is not None:
+        return tenant
+    return config_store.get().profile(profile or _active_profile.get())
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器：按 rate 次/秒补充令牌，最多积攒 burst 个。
+    采用预约模式：取令牌时直接扣减（可为负），返回需要等待的秒数。
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate or NOTION_RATE_LIMIT
+        self.burst = burst or NOTION_RATE_BURST
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预约一个令牌，返回需要等待的秒数（0 表示可立即发送）。"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def cancel(self):
+        """归还一个未使用的预约令牌。"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def acquire(self, deadline=None):
+        """阻塞直到获得令牌；若等待会超过 deadline 则放弃并返回 False。"""
+        wait = self.reserve()
+        if deadline is not None and time.monotonic() + wait > deadline:
+            self.cancel()
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def acquire_async(self, deadline=None):
+        """acquire 的异步版本：等待期间让出事件循环。"""
+        wait = self.reserve()
+        if deadline is not None and time.monotonic() + wait > deadline:
+            self.cancel()
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+def get_rate_limiter(token):
+    """按集成 Token 获取共享限流器，同一 Token 的所有调用共用一个令牌桶。"""
+    return tenants.get(token).rate_limiter
+
+class TenantScoped:
+    """
+    模块级缓存对象的代理：按当前调用的集成 Token 转发到该租户自己的实例，
+    调用方仍以 schema_cache.get(...) 等原有方式使用，不同 Token 之间的缓存互不可见。
+    """
+
+    def __init__(self, attr):
+        self._attr = attr
+
+    def __getattr__(self, name):
+        token, _ = load_env_vars()
+        return getattr(getattr(tenants.get(token), self._attr), name)
+
+# 当前工具调用的截止时间 (time.monotonic 值)，由 call_deadline 设置
+_call_deadline = contextvars.ContextVar("notion_call_deadline", default=None)
+
+@contextmanager
+def call_deadline(seconds=None):
+    """为一次工具调用设置总时限；嵌套调用沿用最外层的截止时间。"""
+    if _call_deadline.get() is not None:
+        yield
+        return
+    reset_token = _call_deadline.set(time.monotonic() + (seconds or NOTION_CALL_DEADLINE))
+    try:
+        yield
+    finally:
+        _call_deadline.reset(reset_token)
+
+def current_deadline():
+    """返回当前调用的截止时间；不在工具调用内时为单次请求单独计算。"""
+    return _call_deadline.get() or time.monotonic() + NOTION_CALL_DEADLINE
+
+def with_call_deadline(fn):
+    """工具装饰器：整个工具调用内的 Notion 请求共享同一个总时限（同时支持同步与异步工具）。"""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with call_deadline():
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with call_deadline():
+            return fn(*args, **kwargs)
+    return wrapper
+
+# MCP 工具的 profile 参数（由 with_profile 统一添加）
+ProfileParam = Annotated[Optional[str], Field(
+    description="配置档案名，对应 .env 中的 NOTION_TOKEN_<NAME> / DATABASE_ID_<NAME>；不传时使用默认档案。"
+)]
+
+def with_profile(fn):
+    """工具装饰器：增加可选的 profile 参数，调用期间的 Notion 请求与默认数据库使用该档案；未知档案直接返回错误。"""
+    def unknown_profile(profile):
+        if profile and tenant_session():
+            return "Error: profile is not available when the request carries its own X-Notion-Token."
+        profiles = config_store.get().profiles
+        if profile and profile.lower() not in profiles:
+            return f"Error: Unknown profile {to_json(profile)}. Available: {', '.join(profiles)}"
+        return None
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, profile=None, **kwargs):
+            error = unknown_profile(profile)
+            if error:
+                return error
+            with use_profile(profile):
+                return await fn(*args, **kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, profile=None, **kwargs):
+            error = unknown_profile(profile)
+            if error:
+                return error
+            with use_profile(profile):
+                return fn(*args, **kwargs)
+
+    signature = inspect.signature(fn)
+    profile_param = inspect.Parameter("profile", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=ProfileParam)
+    wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), profile_param])
+    wrapper.__annotations__ = dict(fn.__annotations__, profile=ProfileParam)
+    return wrapper
+
+# 可重试的状态码 (0 表示网络异常)
+RETRYABLE_STATUS = {0, 429, 500, 502, 503, 504}
+# 写请求仅在确定未被处理时重试，避免重复创建
+RETRYABLE_WRITE_STATUS = {429, 503}
+
+def is_read_only(method, path):
+    """GET 以及 search / 数据库 query 等只读 POST 可安全重试。"""
+    method = method.upper()
+    return method == "GET" or (method == "POST" and (path == "search" or path.endswith("/query")))
+
+def should_retry(method, path, status):
+    if is_read_only(method, path):
+        return status in RETRYABLE_STATUS
+    return status in RETRYABLE_WRITE_STATUS
+
+def retry_delay(attempt, headers=None):
+    """计算第 attempt 次重试前的等待时间：优先遵循 Retry-After，否则指数退避 + 全抖动。"""
+    retry_after = (headers or {}).get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(NOTION_BACKOFF_MAX, NOTION_BACKOFF_BASE * (2 ** attempt)))
+
+DEADLINE_EXCEEDED_ERROR = {"error": "Notion request deadline exceeded (rate limited or retrying)"}
+
+def flight_key(method, path, token, body, version):
+    """只读请求的合并键（含 Token 与 API 版本）；写请求返回 None，不参与合并。"""
+    if not is_read_only(method, path):
+        return None
+    body_key = json_bytes(body, sort_keys=True) if body else b""
+    return method.upper(), path, token, version, body_key
+
+class SingleFlight:
+    """
+    线程间的请求合并：同一键同时只有一个上游调用在途，其余调用等待并共享其结果。
+    发生共享时每个调用方都拿到结果的独立副本，互不影响。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn, deadline):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "waiters": 0}
+            else:
+                call["waiters"] += 1
+                self.shared += 1
+
+        if leader:
+            try:
+                call["result"] = fn()
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call["done"].set()
+            # 此后不会再有新的等待者加入，无人共享时直接返回原对象
+            return copy.deepcopy(call["result"]) if call["waiters"] else call["result"]
+
+        if not call["done"].wait(max(0.0, deadline - time.monotonic())):
+            return 0, dict(DEADLINE_EXCEEDED_ERROR)
+        if call["result"] is None:
+            # 领头调用异常退出：自行发起请求
+            return fn()
+        return copy.deepcopy(call["result"])
+
+class AsyncSingleFlight:
+    """SingleFlight 的 asyncio 版本：上游调用作为独立任务运行，单个调用方被取消不会影响其他等待者。"""
+
+    def __init__(self):
+        self._calls = {}
+        self.shared = 0
+
+    async def do(self, key, factory, deadline):
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(factory())
+            call = self._calls[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            call["waiters"] += 1
+            self.shared += 1
+
+        try:
+            status, result = await asyncio.wait_for(
+                asyncio.shield(call["task"]), max(0.001, deadline - time.monotonic())
+            )
+        except asyncio.TimeoutError:
+            return 0, dict(DEADLINE_EXCEEDED_ERROR)
+        return (status, copy.deepcopy(result)) if call["waiters"] else (status, result)
+
+# 统一的 JSON 编解码层：请求体、响应解析、缓存条目与工具返回值都经过这里
+JSON_BACKEND = "orjson" if orjson is not None and NOTION_JSON_BACKEND != "stdlib" else "json"
+JSON_PRETTY = NOTION_JSON_STYLE != "minified"
+
+def json_bytes(obj, sort_keys=False):
+    """编码为紧凑的 UTF-8 JSON bytes（请求体、缓存条目与合并键）。"""
+    if JSON_BACKEND == "orjson":
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            # orjson 不支持的值（非字符串键、超过 64 位的整数等）交给标准库
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys).encode("utf-8")
+
+def json_loads(data):
+    """解析 bytes 或 str 形式的 JSON；orjson 直接解析 bytes，不产生中间的解码副本。"""
+    if JSON_BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+def to_json(obj, pretty=None):
+    """工具返回值的 JSON 文本（保留中文原文）；pretty 未指定时按 NOTION_JSON_STYLE 决定是否缩进。"""
+    pretty = JSON_PRETTY if pretty is None else pretty
+    if JSON_BACKEND == "orjson":
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0).decode("utf-8")
+        except TypeError:
+            pass
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def build_request(token, version, body):
+    """构造请求头与 JSON 请求体，返回 (headers, data)。"""
     headers = {
         "Authorization": f"Bearer {token}",
         "Notion-Version": version,
         "Accept": "application/json",
     }
-    
     data = None
     if body is not None:
         headers["Content-Type"] = "application/json"
-        data = json.dumps(body).encode("utf-8")
-    
-    req = Request(url, data=data, headers=headers, method=method.upper())
+        data = json_bytes(body)
+    return headers, data
+
+def parse_response(content):
+    """解析响应体：空响应返回 {}，非 JSON 响应包装为 {"error": 原文}。"""
     try:
-        with urlopen(req) as resp:
-            return resp.status, json.loads(resp.read().decode("utf-8"))
-    except HTTPError as e:
-        err_body = e.read().decode("utf-8", errors="ignore")
+        return json_loads(content) if content else {}
+    except ValueError:
+        return {"error": content.decode("utf-8", errors="ignore")}
+
+# 运行指标：工具调用与 Notion 请求的耗时直方图、状态码、重试次数、收发字节数及缓存命中率。
+# 耗时直方图的桶上界（秒），最后隐含 +Inf 桶
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+NOTION_ID_RE = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+
+def endpoint_name(method, path):
+    """将请求归并为端点模板，例如 "PATCH pages/:id"（去掉 ID 与查询串）。"""
+    return f"{method.upper()} {NOTION_ID_RE.sub(':id', path.split('?', 1)[0])}"
+
+class Histogram:
+    """固定桶的耗时直方图。"""
+
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """按桶上界估算分位数。"""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float("inf") else LATENCY_BUCKETS[-1]
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 4) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+class ServerMetrics:
+    """进程内指标汇总；关闭时所有 record_* 直接返回。"""
+
+    def __init__(self, enabled=None):
+        self.enabled = NOTION_METRICS if enabled is None else enabled
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.tools = {}
+        self.endpoints = {}
+
+    def record_tool(self, name, seconds, error):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self.tools.get(name)
+            if entry is None:
+                entry = self.tools[name] = {"latency": Histogram(), "errors": 0}
+            entry["latency"].observe(seconds)
+            entry["errors"] += bool(error)
+
+    def _endpoint(self, method, path):
+        name = endpoint_name(method, path)
+        entry = self.endpoints.get(name)
+        if entry is None:
+            entry = self.endpoints[name] = {"latency": Histogram(), "status": {}, "retries": 0, "bytes_out": 0, "bytes_in": 0}
+        return entry
+
+    def record_request(self, method, path, status, seconds, bytes_out, bytes_in):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._endpoint(method, path)
+            entry["latency"].observe(seconds)
+            entry["status"][status] = entry["status"].get(status, 0) + 1
+            entry["bytes_out"] += bytes_out
+            entry["bytes_in"] += bytes_in
+
+    def record_retry(self, method, path):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._endpoint(method, path)["retries"] += 1
+
+    def cache_stats(self):
+        coalesced = get_notion_client().flights.shared + sum(client.flights.shared for client in list(_async_clients.values()))
+        return {
+            "query_cache": query_cache.stats(),
+            "schema_cache": schema_cache.stats(),
+            "block_cache": block_cache.stats(),
+            "coalesced_requests": coalesced,
+            "tenants": tenants.stats(),
+        }
+
+    def snapshot(self):
+        with self._lock:
+            tools = {name: dict(entry["latency"].summary(), errors=entry["errors"]) for name, entry in self.tools.items()}
+            endpoints = {
+                name: dict(entry["latency"].summary(), status={str(k): v for k, v in entry["status"].items()},
+                           retries=entry["retries"], bytes_out=entry["bytes_out"], bytes_in=entry["bytes_in"])
+                for name, entry in self.endpoints.items()
+            }
+        return {
+            "enabled": self.enabled,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "tools": tools,
+            "endpoints": endpoints,
+            "caches": self.cache_stats(),
+        }
+
+    def prometheus(self):
+        """以 Prometheus 文本格式导出全部指标。"""
+        lines = []
+
+        def histogram(metric, label, name, hist):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, hist.buckets):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {hist.count}')
+            lines.append(f'{metric}_sum{{{label}="{name}"}} {hist.total:.6f}')
+            lines.append(f'{metric}_count{{{label}="{name}"}} {hist.count}')
+
+        with self._lock:
+            lines.append("# TYPE notion_mcp_tool_duration_seconds histogram")
+            for name, entry in self.tools.items():
+                histogram("notion_mcp_tool_duration_seconds", "tool", name, entry["latency"])
+            lines.append("# TYPE notion_mcp_tool_errors_total counter")
+            for name, entry in self.tools.items():
+                lines.append(f'notion_mcp_tool_errors_total{{tool="{name}"}} {entry["errors"]}')
+            lines.append("# TYPE notion_mcp_request_duration_seconds histogram")
+            for name, entry in self.endpoints.items():
+                histogram("notion_mcp_request_duration_seconds", "endpoint", name, entry["latency"])
+            lines.append("# TYPE notion_mcp_requests_total counter")
+            for name, entry in self.endpoints.items():
+                for status, count in entry["status"].items():
+                    lines.append(f'notion_mcp_requests_total{{endpoint="{name}",status="{status}"}} {count}')
+            for metric, field in (("retries", "retries"), ("sent_bytes", "bytes_out"), ("received_bytes", "bytes_in")):
+                lines.append(f"# TYPE notion_mcp_request_{metric}_total counter")
+                for name, entry in self.endpoints.items():
+                    lines.append(f'notion_mcp_request_{metric}_total{{endpoint="{name}"}} {entry[field]}')
+
+        caches = self.cache_stats()
+        lines.append("# TYPE notion_mcp_cache_hits_total counter")
+        lines.append("# TYPE notion_mcp_cache_misses_total counter")
+        for cache in ("query_cache", "schema_cache"):
+            lines.append(f'notion_mcp_cache_hits_total{{cache="{cache}"}} {caches[cache]["hits"]}')
+            lines.append(f'notion_mcp_cache_misses_total{{cache="{cache}"}} {caches[cache]["misses"]}')
+        lines.append("# TYPE notion_mcp_coalesced_requests_total counter")
+        lines.append(f"notion_mcp_coalesced_requests_total {caches['coalesced_requests']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """原子地写出 Prometheus 文本文件（先写临时文件再替换）。"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+metrics = ServerMetrics()
+
+def start_metrics_dump(path=None, interval=None):
+    """配置了 NOTION_METRICS_FILE 时，启动后台线程定期写出 Prometheus 指标文件。"""
+    path = path or NOTION_METRICS_FILE
+    if not (metrics.enabled and path):
+        return None
+    interval = interval or NOTION_METRICS_INTERVAL
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                metrics.write_prometheus(path)
+            except OSError as e:
+                print(f"⚠️ 警告: 写出指标文件失败: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=run, name="notion-metrics-dump", daemon=True)
+    thread.start()
+    return thread
+
+def is_error_result(result):
+    """工具返回的首段文本以 "Error" 开头时视为失败（所有工具的失败与部分失败信息统一使用该前缀）。"""
+    content = getattr(result, "content", None) or []
+    text = getattr(content[0], "text", "") if content else ""
+    return text.startswith("Error")
+
+class ToolMetricsMiddleware(Middleware):
+    """记录每次 MCP 工具调用的耗时与失败次数。"""
+
+    async def on_call_tool(self, context, call_next):
+        start = time.perf_counter()
+        error = True
         try:
-            parsed = json.loads(err_body)
-        except Exception:
-            parsed = {"error": err_body}
-        return e.code, parsed
-    except URLError as e:
-        return 0, {"error": str(e)}
+            result = await call_next(context)
+            error = is_error_result(result)
+            return result
+        finally:
+            metrics.record_tool(context.message.name, time.perf_counter() - start, error)
 
-def find_title_property_name(database_id):
-    """Helper to find the property name of type 'title'."""
-    status, result = notion_request("GET", f"databases/{database_id}")
-    if status == 200:
-        props = result.get("properties", {})
-        for name, spec in props.items():
-            if spec.get("type") == "title":
-                return name
-    return "Name"  # Default fallback
+if metrics.enabled:
+    mcp.add_middleware(ToolMetricsMiddleware())
 
-def normalize_properties(db_id, input_props, db_props=None):
+class NotionClient:
     """
-    智能属性转换：
-    1. 将输入属性名映射到数据库实际属性名（支持拼音、别名、大小写及模糊匹配）。
-    2. 将简单的字符串值包装成 Notion 要求的复杂 JSON 结构。
+    长连接 Notion HTTP 客户端：
+    1. 基于 requests.Session 的连接池 + keep-alive，同一主机的 TCP/TLS 握手只付一次。
+    2. 线程安全：连接池满时阻塞等待空闲连接，且不保存任何 Cookie 状态。
+    3. 按 Token 共享令牌桶限流，429/5xx 自动指数退避重试，并受调用总时限约束。
+    4. 并发的相同只读请求（GET、search、数据库 query）合并为一次上游调用。
     """
-    if not input_props:
-        return {}
-    
-    # 如果没有传入 db_props，则实时从 Notion 获取最新架构
-    if db_props is None:
-        status, db = notion_request("GET", f"databases/{db_id}")
-        if status != 200:
-            return input_props 
-        db_props = db.get("properties", {})
-    
-    normalized = {}
-    
-    def get_clean_key(text):
-        return text.lower().replace(" ", "").replace("_", "").replace("-", "")
 
-    def get_pinyin(text):
-        return "".join(pypinyin.lazy_pinyin(text.lower()))
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None):
+        self.base_url = base_url or API_BASE
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else NOTION_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else NOTION_READ_TIMEOUT,
+        )
+        pool_size = pool_size or NOTION_POOL_SIZE
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.network_errors = requests.RequestException
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.flights = SingleFlight()
 
-    # 建立多维度映射索引
-    name_map = {}
-    for name in db_props.keys():
-        clean_name = get_clean_key(name)
-        py_name = get_pinyin(name)
-        name_map[clean_name] = name
-        name_map[py_name] = name
+    def request(self, method, path, token, body=None, version=DEFAULT_NOTION_VERSION):
+        """发送请求并返回 (status, json)，网络异常时 status 为 0。"""
+        key = flight_key(method, path, token, body, version)
+        if key is None:
+            return self._request(method, path, token, body, version)
+        return self.flights.do(key, lambda: self._request(method, path, token, body, version), current_deadline())
 
-    # 常见别名映射 (语义增强)
-    alias_map = {
-        "content": ["workcontent", "summary", "description", "desc", "note", "内容", "描述", "备注", "工作内容", "detail"],
-        "status": ["state", "zhuangtai", "状态", "进度", "phase"],
-        "date": ["time", "riqi", "shijian", "日期", "时间", "when"],
-        "type": ["category", "worktype", "leixing", "类型", "工作类型", "tag"]
-    }
-    
-    # 逆向别名索引
-    reverse_alias = {}
-    for standard, aliases in alias_map.items():
-        for alias in aliases:
-            reverse_alias[get_clean_key(alias)] = standard
+    def _request(self, method, path, token, body, version):
+        deadline = current_deadline()
+        limiter = get_rate_limiter(token)
+        attempt = 0
+        while True:
+            if not limiter.acquire(deadline):
+                return 0, dict(DEADLINE_EXCEEDED_ERROR)
+            status, result, headers = self._send(method, path, token, body, version, deadline)
+            if attempt >= NOTION_MAX_RETRIES or not should_retry(method, path, status):
+                return status, result
+            delay = retry_delay(attempt, headers)
+            if time.monotonic() + delay >= deadline:
+                return status, result
+            metrics.record_retry(method, path)
+            time.sleep(delay)
+            attempt += 1
 
-    # 预先按类型对数据库属性进行分组，用于语义推断
-    props_by_type = {}
-    for name, spec in db_props.items():
-        ptype = spec.get("type")
-        if ptype not in props_by_type:
-            props_by_type[ptype] = []
-        props_by_type[ptype].append(name)
+    def _send(self, method, path, token, body, version, deadline):
+        """发送单次请求，返回 (status, json, headers)。"""
+        headers, data = build_request(token, version, body)
 
-    for key, value in input_props.items():
-        clean_key = get_clean_key(key)
-        py_key = get_pinyin(key)
-        
-        # 1. 优先级最高：直接匹配 (含大小写/空格忽略/拼音)
-        target_key = name_map.get(clean_key) or name_map.get(py_key)
-        
-        # 2. 优先级中等：别名逻辑
-        if not target_key:
-            standard_term = reverse_alias.get(clean_key)
-            if standard_term:
-                target_key = next((name for name in db_props.keys() if standard_term in get_clean_key(name) or standard_term in get_pinyin(name)), None)
-            
-            # 模糊匹配：输入 key 包含在某个属性名中
-            if not target_key:
-                target_key = next((name for name in db_props.keys() if clean_key in get_clean_key(name) or clean_key in get_pinyin(name)), None)
+        # 读超时不超过调用剩余时间
+        connect_timeout, read_timeout = self.timeout
+        remaining = max(0.001, deadline - time.monotonic())
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(
+                method.upper(), self.base_url + path, data=data, headers=headers,
+                timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)),
+            )
+        except self.network_errors as e:
+            metrics.record_request(method, path, 0, time.perf_counter() - start, len(data or b""), 0)
+            return 0, {"error": str(e)}, None
 
-        # 3. 优先级最低：语义类型推断 (当名称完全无法对应时)
-        if not target_key:
-            if clean_key in ["content", "desc", "note"] and len(props_by_type.get("rich_text", [])) == 1:
-                target_key = props_by_type["rich_text"][0]
-            elif clean_key in ["status", "state"] and len(props_by_type.get("status", [])) == 1:
-                target_key = props_by_type["status"][0]
-            elif clean_key in ["date", "time"] and len(props_by_type.get("date", [])) == 1:
-                target_key = props_by_type["date"][0]
+        metrics.record_request(method, path, resp.status_code, time.perf_counter() - start, len(data or b""), len(resp.content))
+        return resp.status_code, parse_response(resp.content), resp.headers
 
-        if not target_key:
-            normalized[key] = value 
-            continue
-            
-        prop_info = db_props[target_key]
-        prop_type = prop_info.get("type")
-        
-        # 已经包装好的结构不再包装
-        if isinstance(value, dict) and (prop_type in value or "type" in value):
-            normalized[target_key] = value
-            continue
-            
-        # 包装简单值
-        if prop_type == "select":
-            normalized[target_key] = {"select": {"name": str(value)}} if value else None
-        elif prop_type == "multi_select":
-            if isinstance(value, list):
-                normalized[target_key] = {"multi_select": [{"name": str(v)} for v in value]}
-            else:
-                normalized[target_key] = {"multi_select": [{"name": str(value)}]}
-        elif prop_type == "rich_text":
-            normalized[target_key] = {"rich_text": [{"text": {"content": str(value)}}]}
-        elif prop_type == "title":
-            normalized[target_key] = {"title": [{"text": {"content": str(value)}}]}
-        elif prop_type == "date":
-            if isinstance(value, str):
-                # 增强日期处理：支持关键字和自动时间填充
-                date_val = value
-                if value.lower() in ["now", "today", "当前时间", "今天"]:
-                    date_val = get_now_str()
-                normalized[target_key] = {"date": {"start": date_val}}
-            else:
-                normalized[target_key] = value
-        elif prop_type == "status":
-            normalized[target_key] = {"status": {"name": str(value)}}
-        else:
-            normalized[target_key] = value
-            
-    return normalized
+    def close(self):
+        self.session.close()
 
-def infer_work_type(title, content, db_props):
+_client = None
+_client_lock = threading.Lock()
+
+def get_notion_client():
+    """获取进程级共享的 NotionClient（首次调用时创建）。"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = NotionClient()
+    return _client
+
+def notion_request(method, path, body=None, version=DEFAULT_NOTION_VERSION):
     """
-    根据标题和正文内容智能预测“Work Type”。
+    Unified Notion API request handler.
     """
-    text = (title + (content or "")).lower()
-    
-    # 定义关键字映射
-    mapping = {
-        "📱 小程序端": ["miniprogram", "weixin", "微信", "mp"],
-        "💻 vue后台web端": ["vue", "web", "frontend", "前端", "css", "html", "js", "ts", "page"],
-        "🔌 fastAPI后台接口端": ["fastapi", "api", "backend", "python", "database", "server"],
-        "📝 日常记录": ["daily", "routine", "日常", "记录", "test", "summary", "mcp"]
-    }
-    
-    # 动态寻找“Work Type”属性名
-    work_type_attr = next((name for name in db_props.keys() if name.lower() in ["work type", "work_type", "工作类型"]), None)
-    if not work_type_attr:
+    token, _ = load_env_vars()
+    if not token:
+        return 0, {"error": "Missing NOTION_TOKEN in environment or .env file"}
+
+    return get_notion_client().request(method, path, token, body=body, version=version)
+
+# Notion 单页最多返回 100 条
+NOTION_MAX_PAGE_SIZE = 100
+
+class Paginator:
+    """
+    基于 start_cursor 的分页 POST 接口（数据库 query、search）的翻页状态，同步与异步遍历共用：
+    只负责构造每页的请求体、读写查询缓存与推进游标，不发送请求。
+    1. 传入 max_results 时按剩余数量收缩 page_size，保证最后一页的 next_cursor 精确可续。
+    2. 传入 cache_scope（数据库 ID）时逐页读写查询缓存。
+    3. 出错或读完后 done 为 True。
+    """
+
+    def __init__(self, body=None, page_size=NOTION_MAX_PAGE_SIZE, start_cursor=None, max_results=None, cache_scope=None):
+        self.body = body or {}
+        self.page_size = min(page_size or NOTION_MAX_PAGE_SIZE, NOTION_MAX_PAGE_SIZE)
+        self.cursor = start_cursor
+        self.remaining = max_results
+        self.cache_scope = cache_scope if cache_scope and query_cache.enabled else None
+        self.done = False
+        self._key = self._generation = None
+
+    def next_body(self):
+        """返回下一页的请求体。"""
+        request_body = dict(self.body)
+        request_body["page_size"] = self.page_size if self.remaining is None else min(self.page_size, self.remaining)
+        if self.cursor:
+            request_body["start_cursor"] = self.cursor
+        return request_body
+
+    def cached(self, request_body):
+        """查询缓存命中时返回 (200, page)，否则返回 None 并记下回填缓存所需的键与代数。"""
+        self._key = None
+        if self.cache_scope:
+            key = query_cache.make_key(self.cache_scope, request_body)
+            generation = query_cache.generation(self.cache_scope)
+            page = query_cache.get(key)
+            if page is not None:
+                return 200, page
+            self._key, self._generation = key, generation
         return None
 
-    work_type_prop = db_props.get(work_type_attr, {})
-    options = [opt.get("name") for opt in work_type_prop.get("select", {}).get("options", [])]
-    
-    best_match = None
-    max_hits = 0
-    
-    for opt_name, keywords in mapping.items():
-        # 在选项列表中寻找最接近的真实名称
-        actual_name = next((o for o in options if opt_name in o or o in opt_name), None)
-        if not actual_name:
-            continue
-            
-        hits = sum(1 for kw in keywords if kw in text)
-        if hits > max_hits:
-            max_hits = hits
-            best_match = actual_name
-            
-    return best_match or next((o for o in options if "Daily" in o or "日常" in o), options[0] if options else None)
+    def received(self, status, page):
+        """处理一页响应（回填缓存、推进游标），原样返回 (status, page)。"""
+        if status != 200:
+            self.done = True
+            return status, page
+        if self._key is not None:
+            query_cache.put(self._key, page, self._generation)
+        if self.remaining is not None:
+            self.remaining -= len(page.get("results", []))
+        self.cursor = page.get("next_cursor")
+        self.done = not page.get("has_more") or not self.cursor or (self.remaining is not None and self.remaining <= 0)
+        return status, page
 
-@mcp.tool()
-def list_databases() -> str:
+def query_body(filter_params=None, sorts=None):
+    """数据库 query 的请求体（不含分页参数）。"""
+    body = {}
+    if filter_params:
+        body["filter"] = filter_params
+    if sorts:
+        body["sorts"] = sorts
+    return body
+
+def iter_paginated(path, body=None, page_size=NOTION_MAX_PAGE_SIZE, start_cursor=None, max_results=None, cache_scope=None):
     """
-    功能: 列出当前集成有权访问的所有数据库。
-    
-    返回: 数据库列表的 JSON 字符串，包含每个数据库的标题和 ID。
+    惰性遍历分页 POST 接口，参数含义见 Paginator。
+    每次 yield 一页的 (status, response)；出错时 yield 错误后停止。
     """
-    body = {
-        "filter": {
-            "value": "database",
-            "property": "object"
-        }
-    }
-    status, results = notion_request("POST", "search", body=body)
-    if status != 200:
-        return f"错误 (状态码 {status}): {json.dumps(results, indent=2, ensure_ascii=False)}"
-    
-    databases = []
-    for db in results.get("results", []):
-        title_list = db.get("title", [])
-        title = title_list[0].get("plain_text", "Untitled") if title_list else "Untitled"
-        databases.append({
-            "title": title,
-            "id": db.get("id"),
-            "url": db.get("url")
-        })
-    
-    return json.dumps(databases, indent=2, ensure_ascii=False)
+    pager = Paginator(body, page_size, start_cursor, max_results, cache_scope)
+    while not pager.done:
+        request_body = pager.next_body()
+        yield pager.received(*(pager.cached(request_body) or notion_request("POST", path, body=request_body)))
+
+def iter_query_pages(db_id, filter_params=None, sorts=None, page_size=NOTION_MAX_PAGE_SIZE, start_cursor=None, max_results=None, cached=False):
+    """逐页遍历数据库查询结果，参数含义同 query_database。"""
+    return iter_paginated(f"databases/{db_id}/query", query_body(filter_params, sorts), page_size, start_cursor,
+                          max_results, cache_scope=db_id if cached else None)
+
+def collect_pages(pages):
+    """
+    汇总 iter_paginated 产生的各页结果。
+    返回 (status, {"results", "next_cursor", "has_more"})；出错时返回首个错误。
+    """
+    results, next_cursor, has_more = [], None, False
+    for status, page in pages:
+        if status != 200:
+            return status, page
+        results.extend(page.get("results", []))
+        next_cursor = page.get("next_cursor")
+        has_more = bool(page.get("has_more"))
+    return 200, {"object": "list", "results": results, "next_cursor": next_cursor, "has_more": has_more}
+
+class AsyncNotionClient:
+    """
+    asyncio 原生 Notion 客户端（基于 httpx.AsyncClient 连接池）：
+    返回值约定与 NotionClient 相同，并共享同一套令牌桶限流、重试、调用时限与只读请求合并逻辑。
+    """
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None):
+        self.base_url = base_url or API_BASE
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else NOTION_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else NOTION_READ_TIMEOUT,
+        )
+        pool_size = pool_size or NOTION_POOL_SIZE
+        import httpx
+        self.httpx = httpx
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+        self.flights = AsyncSingleFlight()
+
+    async def request(self, method, path, token, body=None, version=DEFAULT_NOTION_VERSION):
+        """发送请求并返回 (status, json)，网络异常时 status 为 0。"""
+        key = flight_key(method, path, token, body, version)
+        if key is None:
+            return await self._request(method, path, token, body, version)
+        return await self.flights.do(
+            key, lambda: self._request(method, path, token, body, version), current_deadline()
+        )
+
+    async def _request(self, method, path, token, body, version):
+        deadline = current_deadline()
+        limiter = get_rate_limiter(token)
+        attempt = 0
+        while True:
+            if not await limiter.acquire_async(deadline):
+                return 0, dict(DEADLINE_EXCEEDED_ERROR)
+            status, result, headers = await self._send(method, path, token, body, version, deadline)
+            if attempt >= NOTION_MAX_RETRIES or not should_retry(method, path, status):
+                return status, result
+            delay = retry_delay(attempt, headers)
+            if time.monotonic() + delay >= deadline:
+                return status, result
+            metrics.record_retry(method, path)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send(self, method, path, token, body, version, deadline):
+        """发送单次请求，返回 (status, json, headers)。"""
+        headers, data = build_request(token, version, body)
+
+        # 读超时不超过调用剩余时间
+        connect_timeout, read_timeout = self.timeout
+        remaining = max(0.001, deadline - time.monotonic())
+        timeout = self.httpx.Timeout(min(read_timeout, remaining), connect=min(connect_timeout, remaining))
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(
+                method.upper(), self.base_url + path, content=data, headers=headers, timeout=timeout
+            )
+        except self.httpx.HTTPError as e:
+            metrics.record_request(method, path, 0, time.perf_counter() - start, len(data or b""), 0)
+            return 0, {"error": str(e) or type(e).__name__}, None
+
+        metrics.record_request(method, path, resp.status_code, time.perf_counter() - start, len(data or b""), len(resp.content))
+        return resp.status_code, parse_response(resp.content), resp.headers
+
+    async def aclose(self):
+        await self.client.aclose()
+
+# httpx 连接池绑定在创建它的事件循环上，因此按事件循环各建一个客户端
+_async_clients = weakref.WeakKeyDictionary()
+
+async def close_on_shutdown(client):
+    """
+    挂起直到所在事件循环关闭：asyncio.run 结束前会取消全部剩余任务，此时关闭该循环的客户端，
+    释放连接池中的连接，避免每次 asyncio.run 都遗留一组未关闭的连接。
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.create_future()
+    finally:
+        _async_clients.pop(loop, None)
+        await client.aclose()
+
+def get_async_notion_client():
+    """获取当前事件循环共享的 AsyncNotionClient（首次调用时创建，循环关闭时自动关闭）。"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncNotionClient()
+        # 事件循环只弱引用任务，由客户端持有关闭任务的引用
+        client.closer = loop.create_task(close_on_shutdown(client))
+    return client
+
+async def async_notion_request(method, path, body=None, version=DEFAULT_NOTION_VERSION):
+    """notion_request 的异步版本，返回 (status, json)。"""
+    token, _ = load_env_vars()
+    if not token:
+        return 0, {"error": "Missing NOTION_TOKEN in environment or .env file"}
+
+    return await get_async_notion_client().request(method, path, token, body=body, version=version)
+
+async def aiter_paginated(path, body=None, page_size=NOTION_MAX_PAGE_SIZE, start_cursor=None, max_results=None, cache_scope=None):
+    """iter_paginated 的异步版本：每次 yield 一页的 (status, response)。"""
+    pager = Paginator(body, page_size, start_cursor, max_results, cache_scope)
+    while not pager.done:
+        request_body = pager.next_body()
+        yield pager.received(*(pager.cached(request_body) or await async_notion_request("POST", path, body=request_body)))
+
+def aiter_query_pages(db_id, filter_params=None, sorts=None, page_size=NOTION_MAX_PAGE_SIZE, start_cursor=None, max_results=None, cached=False):
+    """iter_query_pages 的异步版本。"""
+    return aiter_paginated(f"databases/{db_id}/query", query_body(filter_params, sorts), page_size, start_cursor,
+                           max_results, cache_scope=db_id if cached else None)
+
+# ---------------------------------------------------------------------------
+# 请求流程：需要发出多个请求的逻辑写成生成器，每次 yield 一个 (method, path, body) 请求并接收 (status, result)，
+# 可用 yield from 组合，return 值即流程结果。run_flow / arun_flow 分别用同步、异步客户端驱动同一个流程，
+# 因此同步与异步版本只在发送方式上不同。
+# ---------------------------------------------------------------------------
+
+def run_flow(flow):
+    """用 NotionClient 逐个发送流程的请求，返回流程结果。"""
+    try:
+        request = next(flow)
+        while True:
+            method, path, body = request
+            request = flow.send(notion_request(method, path, body=body))
+    except StopIteration as done:
+        return done.value
+
+async def arun_flow(flow):
+    """run_flow 的异步版本（AsyncNotionClient）。"""
+    try:
+        request = next(flow)
+        while True:
+            method, path, body = request
+            request = flow.send(await async_notion_request(method, path, body=body))
+    except StopIteration as done:
+        return done.value
+
+def collect_flow(path, body=None):
+    """请求流程：读取分页接口的全部结果，返回值同 collect_pages。"""
+    pager = Paginator(body)
+    pages = []
+    while not pager.done:
+        request_body = pager.next_body()
+        pages.append(pager.received(*(yield "POST", path, request_body)))
+    return collect_pages(pages)
+
+def cache_key(id_str):
+    """统一 Notion ID 的缓存键：去除空白、尖括号与连字符并转小写。"""
+    return id_str.strip().strip("<>").replace("-", "").lower()
+
+class SchemaCache:
+    """
+    进程内数据库架构缓存 (databases/{id})：
+    1. 每个条目在 TTL 到期后失效，下次访问时重新拉取。
+    2. 按 LRU 淘汰，最多保留 max_entries 个数据库。
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = NOTION_SCHEMA_TTL if ttl is None else ttl
+        self.max_entries = max_entries or NOTION_SCHEMA_CACHE_SIZE
+        self._entries = OrderedDict()
+        self._resolvers = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def _key(db_id):
+        return cache_key(db_id)
+
+    def get(self, db_id):
+        key = self._key(db_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry["fetched_at"] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["db"]
+
+    def put(self, db_id, db):
+        key = self._key(db_id)
+        with self._lock:
+            self._entries[key] = {"db": db, "fetched_at": time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, db_id=None):
+        """使指定数据库的缓存失效；不传 db_id 时清空全部（含已编译的解析器）。"""
+        with self._lock:
+            if db_id is None:
+                self._entries.clear()
+                self._resolvers.clear()
+            else:
+                self._entries.pop(self._key(db_id), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def resolver_for(self, db_props):
+        """按架构版本返回已编译的 PropertyResolver，同一版本只编译一次。"""
+        version = schema_version(db_props)
+        with self._lock:
+            resolver = self._resolvers.get(version)
+            if resolver is not None:
+                self._resolvers.move_to_end(version)
+                return resolver
+
+        resolver = PropertyResolver(db_props)
+        with self._lock:
+            self._resolvers[version] = resolver
+            while len(self._resolvers) > self.max_entries:
+                self._resolvers.popitem(last=False)
+        return resolver
+
+schema_cache = TenantScoped("schema_cache")
+
+def schema_flow(db_id, force_refresh=False):
+    """
+    请求流程：获取数据库元数据，优先命中架构缓存。
+    返回值与 notion_request 一致：(status, db)。
+    """
+    if not force_refresh:
+        cached = schema_cache.get(db_id)
+        if cached is not None:
+            return 200, cached
+
+    status, db = yield "GET", f"databases/{db_id}", None
+    if status == 200:
+        schema_cache.put(db_id, db)
+    return status, db
+
+def get_database_schema(db_id, force_refresh=False):
+    """获取数据库元数据（见 schema_flow）。"""
+    return run_flow(schema_flow(db_id, force_refresh))
+
+async def async_get_database_schema(db_id, force_refresh=False):
+    """get_database_schema 的异步版本，与同步版本共享架构缓存。"""
+    return await arun_flow(schema_flow(db_id, force_refresh))
+
+def refresh_schema_cache(db_id, result):
+    """架构写入成功后调用：丢弃旧缓存（含查询缓存），并用 PATCH 返回的最新数据库对象回填。"""
+    schema_cache.invalidate(db_id)
+    invalidate_database_queries(db_id)
+    if isinstance(result, dict) and result.get("object") == "database":
+        schema_cache.put(db_id, result)
+
+class PageParentCache:
+    """
+    页面 -> 所属数据库 ID 的 LRU 映射。页面的父级极少变化，因此不设 TTL；
+    写入因架构校验失败时由调用方强制刷新。非数据库页面记录为空字符串。
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or NOTION_PAGE_PARENT_CACHE_SIZE
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, page_id):
+        """返回缓存的数据库 ID（非数据库页面为 ""），未缓存时返回 None。"""
+        key = cache_key(page_id)
+        with self._lock:
+            parent = self._entries.get(key)
+            if parent is not None:
+                self._entries.move_to_end(key)
+            return parent
+
+    def put(self, page_id, database_id):
+        key = cache_key(page_id)
+        with self._lock:
+            self._entries[key] = database_id or ""
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, page_id=None):
+        with self._lock:
+            if page_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(cache_key(page_id), None)
+
+page_parents = TenantScoped("page_parents")
+
+class QueryCache:
+    """
+    数据库查询结果缓存（databases/{id}/query 的单页响应）：
+    1. 键为 (数据库, 规范化后的 filter/sorts/cursor/page_size)，条目在 TTL 到期后失效。
+    2. 以序列化后的字节数计量容量，超出 max_bytes 时按 LRU 淘汰。
+    3. 对某数据库的写入会使其全部条目失效；写入期间在途的查询结果不会回填。
+    """
+
+    def __init__(self, ttl=None, max_bytes=None):
+        self.ttl = NOTION_QUERY_CACHE_TTL if ttl is None else ttl
+        self.max_bytes = NOTION_QUERY_CACHE_BYTES if max_bytes is None else max_bytes
+        self._entries = OrderedDict()
+        self._keys_by_db = {}
+        self._generations = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def make_key(db_id, body):
+        return cache_key(db_id), json_bytes(body, sort_keys=True)
+
+    def generation(self, db_id):
+        with self._lock:
+            return self._generations.get(cache_key(db_id), 0)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry["fetched_at"] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            data = entry["data"]
+        # 每次命中返回独立副本，调用方可安全修改
+        return json_loads(data)
+
+    def put(self, key, page, generation):
+        data = json_bytes(page)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return
+            self._remove(key)
+            self._entries[key] = {"data": data, "fetched_at": time.monotonic()}
+            self._keys_by_db.setdefault(key[0], set()).add(key)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry["data"])
+            keys = self._keys_by_db.get(key[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_db[key[0]]
+
+    def invalidate(self, db_id=None):
+        """使指定数据库的查询缓存失效；不传 db_id 时清空全部。"""
+        with self._lock:
+            if db_id is None:
+                self._entries.clear()
+                self._keys_by_db.clear()
+                self._bytes = 0
+                for key in self._generations:
+                    self._generations[key] += 1
+                return
+            key = cache_key(db_id)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            for entry_key in list(self._keys_by_db.get(key, ())):
+                self._remove(entry_key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+query_cache = TenantScoped("query_cache")
+
+def invalidate_database_queries(db_id):
+    """对数据库的写入（建页、改页、改架构）成功后调用，丢弃其查询缓存。"""
+    if db_id:
+        query_cache.invalidate(db_id)
+
+# Notion 的 last_edited_time 只精确到分钟
+NOTION_TIMESTAMP_GRANULARITY = 60
+
+def edited_recently(timestamp):
+    """时间戳是否落在最近的一个计时粒度内（此时同一分钟内的后续编辑不会改变 last_edited_time）。"""
+    try:
+        edited = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return True
+    return (datetime.now(timezone.utc) - edited).total_seconds() < 2 * NOTION_TIMESTAMP_GRANULARITY
+
+class BlockTreeCache:
+    """
+    Block 子树缓存（blocks/{id}/children 的递归读取结果）：
+    1. 键为 Block（或页面）ID，条目记录其 last_edited_time 与已展开的深度；时间戳一致且深度足够时直接复用。
+    2. 最近两分钟内编辑过的 Block 不写入缓存，避免同一分钟内的后续修改读到旧内容。
+    3. 按条目数 LRU 淘汰。
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = NOTION_BLOCK_CACHE_SIZE if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, block_id, edited, depth):
+        key = cache_key(block_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not edited or entry["edited"] != edited or entry["depth"] < depth:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["children"]
+
+    def put(self, block_id, edited, depth, children):
+        if self.max_entries <= 0 or edited_recently(edited):
+            return
+        key = cache_key(block_id)
+        with self._lock:
+            self._entries[key] = {"edited": edited, "depth": depth, "children": children}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, block_id):
+        with self._lock:
+            self._entries.pop(cache_key(block_id), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+block_cache = TenantScoped("block_cache")
+
+class TenantState:
+    """单个集成 Token 的独立状态：限流器、架构缓存、页面父级缓存、查询缓存、Block 子树缓存与数据库目录。"""
+
+    def __init__(self):
+        self.rate_limiter = TokenBucket()
+        self.schema_cache = SchemaCache()
+        self.page_parents = PageParentCache()
+        self.query_cache = QueryCache()
+        self.block_cache = BlockTreeCache()
+        self.databases = DatabaseDirectory()
+        self.last_used = time.monotonic()
+
+class TenantRegistry:
+    """
+    按集成 Token 索引的租户状态注册表（HTTP/SSE 多租户部署时每个请求可携带自己的 Token）：
+    1. 首次使用某个 Token 时创建其 TenantState，之后同一 Token 的所有调用共享。
+    2. 访问时顺带回收超过 idle_ttl 未使用的租户（LRU 队首即最久未用者，摊还 O(1)）；总数超过 max_tenants 时淘汰最久未用者。
+    """
+
+    def __init__(self, idle_ttl=None, max_tenants=None):
+        self.idle_ttl = NOTION_TENANT_IDLE_TTL if idle_ttl is None else idle_ttl
+        self.max_tenants = max_tenants or NOTION_TENANT_MAX
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, token):
+        token = token or ""
+        now = time.monotonic()
+        with self._lock:
+            state = self._tenants.get(token)
+            if state is None:
+                state = self._tenants[token] = TenantState()
+            else:
+                self._tenants.move_to_end(token)
+            state.last_used = now
+            while len(self._tenants) > 1:
+                oldest_token, oldest = next(iter(self._tenants.items()))
+                if len(self._tenants) <= self.max_tenants and (self.idle_ttl <= 0 or now - oldest.last_used < self.idle_ttl):
+                    break
+                del self._tenants[oldest_token]
+                self.evictions += 1
+            return state
+
+    def stats(self):
+        with self._lock:
+            return {"tenants": len(self._tenants), "idle_ttl": self.idle_ttl, "evictions": self.evictions}
+
+tenants = TenantRegistry()
+
+def remember_page_parent(page):
+    """从页面对象中记录其所属数据库（创建、读取、查询结果均可调用）。"""
+    if isinstance(page, dict) and page.get("object") == "page" and page.get("id"):
+        page_parents.put(page["id"], page.get("parent", {}).get("database_id"))
+
+def page_parent_flow(page_id, hint=None, force_refresh=False):
+    """
+    请求流程：获取页面所属数据库 ID，优先使用调用方提示与缓存，未命中时 GET 页面。
+    返回 (status, database_id)；status 非 200 时第二项为错误详情，database_id 为 None 表示非数据库页面。
+    """
+    if not force_refresh:
+        if hint:
+            return 200, hint
+        cached = page_parents.get(page_id)
+        if cached is not None:
+            return 200, cached or None
+
+    status, page = yield "GET", f"pages/{page_id}", None
+    if status != 200:
+        return status, page
+    remember_page_parent(page)
+    return 200, page.get("parent", {}).get("database_id")
+
+def get_page_parent(page_id, hint=None, force_refresh=False):
+    """获取页面所属数据库 ID（见 page_parent_flow）。"""
+    return run_flow(page_parent_flow(page_id, hint, force_refresh))
+
+async def async_get_page_parent(page_id, hint=None, force_refresh=False):
+    """get_page_parent 的异步版本，与同步版本共享缓存。"""
+    return await arun_flow(page_parent_flow(page_id, hint, force_refresh))
+
+def is_stale_schema_error(status, result):
+    """判断写入失败是否可能由缓存架构过期引起（属性名/类型与数据库实际不符）。"""
+    if status != 400 or not isinstance(result, dict):
+        return False
+    if result.get("code") != "validation_error":
+        return False
+    return "propert" in str(result.get("message", "")).lower()
+
+def find_title_property_name(database_id):
+    """Helper to find the property name of type 'title'."""
+    status, result = get_database_schema(database_id)
+    if status == 200:
+        props = result.get("properties", {})
+        for name, spec in props.items():
+            if spec.get("type") == "title":
+                return name
+    return "Name"  # Default fallback
+
+def get_clean_key(text):
+    return text.lower().replace(" ", "").replace("_", "").replace("-", "")
+
+def pinyin_syllables(text):
+    """返回文本的拼音音节列表（首次调用时才导入 pypinyin）。"""
+    import pypinyin
+    return pypinyin.lazy_pinyin(text)
+
+def get_pinyin(text):
+    return "".join(pinyin_syllables(text.lower()))
+
+# 常见别名映射 (语义增强)
+PROPERTY_ALIAS_MAP = {
+    "content": ["workcontent", "summary", "description", "desc", "note", "内容", "描述", "备注", "工作内容", "detail"],
+    "status": ["state", "zhuangtai", "状态", "进度", "phase"],
+    "date": ["time", "riqi", "shijian", "日期", "时间", "when"],
+    "type": ["category", "worktype", "leixing", "类型", "工作类型", "tag"]
+}
+
+# 逆向别名索引
+REVERSE_ALIAS = {get_clean_key(alias): standard for standard, aliases in PROPERTY_ALIAS_MAP.items() for alias in aliases}
+
+class PropertyResolver:
+    """
+    按数据库架构预编译的属性解析器：
+    1. 构建时一次性计算每个属性的 clean key、拼音、别名目标及类型分组。
+    2. 解析输入属性名时不再调用 pypinyin 扫描全部列，结果按输入名记忆化。
+    """
+
+    MEMO_LIMIT = 1024
+
+    def __init__(self, db_props):
+        self.db_props = db_props
+        # [(属性名, clean key, 拼音)]，保持数据库列顺序，用于别名/模糊匹配
+        self.search_keys = [(name, get_clean_key(name), get_pinyin(name)) for name in db_props.keys()]
+
+        # 建立多维度映射索引
+        self.name_map = {}
+        for name, clean_name, py_name in self.search_keys:
+            self.name_map[clean_name] = name
+            self.name_map[py_name] = name
+
+        # 每个标准别名对应的第一个数据库列
+        self.alias_targets = {
+            standard: self._first_containing(standard) for standard in PROPERTY_ALIAS_MAP
+        }
+
+        # 预先按类型对数据库属性进行分组，用于语义推断
+        self.props_by_type = {}
+        for name, spec in db_props.items():
+            self.props_by_type.setdefault(spec.get("type"), []).append(name)
+
+        self.title_prop = next(iter(self.props_by_type.get("title", [])), "Name")
+        self._memo = {}
+        self._keyword_memo = {}
+
+    def _first_containing(self, term):
+        return next((name for name, clean_name, py_name in self.search_keys if term in clean_name or term in py_name), None)
+
+    def resolve(self, key):
+        """将输入属性名映射到数据库实际属性名，无法对应时返回 None。"""
+        if key in self._memo:
+            return self._memo[key]
+
+        clean_key = get_clean_key(key)
+
+        # 1. 优先级最高：直接匹配 (含大小写/空格忽略/拼音)
+        target_key = self.name_map.get(clean_key)
+        if not target_key:
+            target_key = self.name_map.get(get_pinyin(key))
+
+        # 2. 优先级中等：别名逻辑
+        if not target_key:
+            standard_term = REVERSE_ALIAS.get(clean_key)
+            if standard_term:
+                target_key = self.alias_targets.get(standard_term)
+
+            # 模糊匹配：输入 key 包含在某个属性名中
+            if not target_key:
+                target_key = self._first_containing(clean_key)
+
+        # 3. 优先级最低：语义类型推断 (当名称完全无法对应时)
+        if not target_key:
+            if clean_key in ["content", "desc", "note"] and len(self.props_by_type.get("rich_text", [])) == 1:
+                target_key = self.props_by_type["rich_text"][0]
+            elif clean_key in ["status", "state"] and len(self.props_by_type.get("status", [])) == 1:
+                target_key = self.props_by_type["status"][0]
+            elif clean_key in ["date", "time"] and len(self.props_by_type.get("date", [])) == 1:
+                target_key = self.props_by_type["date"][0]
+
+        if len(self._memo) >= self.MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[key] = target_key
+        return target_key
+
+    def find_by_keywords(self, ptype, keywords):
+        """返回第一个类型为 ptype 且名称（或拼音）包含任一关键词的属性名。"""
+        memo_key = (ptype, tuple(keywords))
+        if memo_key not in self._keyword_memo:
+            self._keyword_memo[memo_key] = next(
+                (name for name, _, py_name in self.search_keys
+                 if self.db_props[name].get("type") == ptype and
+                 any(kw in name.lower() or kw in py_name for kw in keywords)),
+                None,
+            )
+        return self._keyword_memo[memo_key]
+
+    def normalize(self, input_props):
+        normalized = {}
+        for key, value in input_props.items():
+            target_key = self.resolve(key)
+            if not target_key:
+                normalized[key] = value
+                continue
+            normalized[target_key] = wrap_property_value(self.db_props[target_key].get("type"), value)
+        return normalized
+
+def schema_version(db_props):
+    """架构版本指纹：属性名与类型一致即视为同一版本。"""
+    return tuple((name, spec.get("type")) for name, spec in db_props.items())
+
+def get_property_resolver(db_props):
+    """获取（必要时编译）当前架构版本的属性解析器，与架构缓存一同缓存。"""
+    return schema_cache.resolver_for(db_props)
+
+def wrap_property_value(prop_type, value):
+    """将简单值包装为 Notion 要求的属性结构。"""
+    # 已经包装好的结构不再包装
+    if isinstance(value, dict) and (prop_type in value or "type" in value):
+        return value
+
+    if prop_type == "select":
+        return {"select": {"name": str(value)}} if value else None
+    elif prop_type == "multi_select":
+        if isinstance(value, list):
+            return {"multi_select": [{"name": str(v)} for v in value]}
+        return {"multi_select": [{"name": str(value)}]}
+    elif prop_type == "rich_text":
+        return {"rich_text": rich_text_segments(str(value))}
+    elif prop_type == "title":
+        return {"title": rich_text_segments(str(value))}
+    elif prop_type == "date":
+        if isinstance(value, str):
+            # 增强日期处理：支持关键字和自动时间填充
+            date_val = value
+            if value.lower() in ["now", "today", "当前时间", "今天"]:
+                date_val = get_now_str()
+            return {"date": {"start": date_val}}
+        return value
+    elif prop_type == "status":
+        return {"status": {"name": str(value)}}
+    return value
+
+def normalize_properties(db_id, input_props, db_props=None):
+    """
+    智能属性转换：
+    1. 将输入属性名映射到数据库实际属性名（支持拼音、别名、大小写及模糊匹配）。
+    2. 将简单的字符串值包装成 Notion 要求的复杂 JSON 结构。
+    """
+    if not input_props:
+        return {}
+    
+    # 如果没有传入 db_props，则从架构缓存获取（未命中时实时拉取）
+    if db_props is None:
+        status, db = get_database_schema(db_id)
+        if status != 200:
+            return input_props 
+        db_props = db.get("properties", {})
+
+    return get_property_resolver(db_props).normalize(input_props)
+
+def normalize_properties_batch(db_id, items, db_props=None):
+    """
+    批量属性转换：多个属性字典共享同一份架构与解析器，适用于批量写入。
+    返回与 items 等长的列表。
+    """
+    if db_props is None:
+        status, db = get_database_schema(db_id)
+        if status != 200:
+            return [dict(item or {}) for item in items]
+        db_props = db.get("properties", {})
+
+    resolver = get_property_resolver(db_props)
+    return [resolver.normalize(item) if item else {} for item in items]
+
+# 内置的工作类型关键词映射，键为选项名（与数据库选项互相包含即视为对应）
+DEFAULT_WORK_TYPE_KEYWORDS = {
+    "📱 小程序端": ["miniprogram", "weixin", "微信", "mp"],
+    "💻 vue后台web端": ["vue", "web", "frontend", "前端", "css", "html", "js", "ts", "page"],
+    "🔌 fastAPI后台接口端": ["fastapi", "api", "backend", "python", "database", "server"],
+    "📝 日常记录": ["daily", "routine", "日常", "记录", "test", "summary", "mcp"]
+}
+WORK_TYPE_ATTR_NAMES = ("work type", "work_type", "工作类型")
+
+class WorkTypeKeywords:
+    """
+    工作类型关键词表：从 JSON 文件加载，按文件 mtime 热更新（最多每 check_interval 秒检查一次，0 表示只加载一次）；
+    文件不存在或格式错误时使用内置映射。按数据库选项列表缓存已编译的分类器，关键词表变化时整体重建。
+    """
+
+    def __init__(self, path, check_interval=None):
+        self.path = path
+        self.check_interval = NOTION_WORK_TYPE_KEYWORDS_RELOAD_INTERVAL if check_interval is None else check_interval
+        self.version = 0
+        self._mtime = None
+        self._checked_at = None
+        self._mapping = DEFAULT_WORK_TYPE_KEYWORDS
+        self._classifiers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                mapping = json.load(f)
+            if not isinstance(mapping, dict) or not all(isinstance(v, list) for v in mapping.values()):
+                raise ValueError("expected an object mapping option names to keyword lists")
+            return mapping
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 警告: 工作类型关键词文件 {self.path} 无法使用，改用内置映射: {e}", file=sys.stderr)
+            return DEFAULT_WORK_TYPE_KEYWORDS
+
+    def get(self):
+        """返回 (version, mapping)。"""
+        now = time.monotonic()
+        if self._checked_at is not None and (self.check_interval <= 0 or now - self._checked_at < self.check_interval):
+            return self.version, self._mapping
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._mapping = self._load() if mtime is not None else DEFAULT_WORK_TYPE_KEYWORDS
+                    self._mtime = mtime
+                    self.version += 1
+                    self._classifiers.clear()
+        return self.version, self._mapping
+
+    def classifier(self, options):
+        """返回该选项列表的工作类型分类器；选项增删或改名后键随之变化，自动编译新的分类器。"""
+        version, mapping = self.get()
+        key = (version, tuple(options))
+        with self._lock:
+            classifier = self._classifiers.get(key)
+            if classifier is not None:
+                self._classifiers.move_to_end(key)
+                return classifier
+
+        classifier = WorkTypeClassifier(options, mapping)
+        with self._lock:
+            self._classifiers[key] = classifier
+            while len(self._classifiers) > NOTION_SCHEMA_CACHE_SIZE:
+                self._classifiers.popitem(last=False)
+        return classifier
+
+work_type_keywords = WorkTypeKeywords(NOTION_WORK_TYPE_KEYWORDS)
+
+def keyword_pattern(keyword):
+    """
+    单个关键词的正则：以字母/数字开头或结尾的一侧要求单词边界（"js" 不会命中 "json"），
+    中文等其余字符不加边界，保持子串匹配。
+    """
+    pattern = re.escape(keyword)
+    if re.match(r"[a-z0-9]", keyword):
+        pattern = r"(?<![a-z0-9])" + pattern
+    if re.search(r"[a-z0-9]$", keyword):
+        pattern += r"(?![a-z0-9])"
+    return pattern
+
+class WorkTypeClassifier:
+    """
+    按数据库选项预编译的工作类型分类器：
+    1. 所有关键词合并为一个正则（前瞻匹配，重叠的关键词也能命中），一次扫描文本即可统计各选项的命中。
+    2. 得分为命中的不同关键词个数，同分时按关键词表中的顺序取前者；全部未命中时回退到“日常”选项或第一个选项。
+    """
+
+    def __init__(self, options, mapping):
+        self.options = options
+        self.fallback = next((o for o in options if "Daily" in o or "日常" in o), options[0] if options else None)
+        # 关键词 -> 对应的数据库选项名
+        self.keyword_options = {}
+        # 选项名 -> 在关键词表中的顺序，用于同分时的取舍
+        self.order = {}
+        for label, keywords in mapping.items():
+            # 在选项列表中寻找最接近的真实名称
+            actual_name = next((o for o in options if label in o or o in label), None)
+            if not actual_name:
+                continue
+            self.order.setdefault(actual_name, len(self.order))
+            for keyword in keywords:
+                keyword = str(keyword).strip().lower()
+                if not keyword:
+                    continue
+                targets = self.keyword_options.setdefault(keyword, [])
+                if actual_name not in targets:
+                    targets.append(actual_name)
+
+        # 长关键词优先，保证同一位置上命中最长的关键词
+        keywords = sorted(self.keyword_options, key=len, reverse=True)
+        self.pattern = re.compile("(?=(" + "|".join(map(keyword_pattern, keywords)) + "))") if keywords else None
+
+    def scores(self, title, content=None):
+        """返回按得分降序排列的 [{"option", "score", "keywords"}]，只包含有命中的选项。"""
+        if self.pattern is None:
+            return []
+        text = f"{title or ''}\n{content or ''}".lower()
+        hits = {}
+        for keyword in {match.group(1) for match in self.pattern.finditer(text)}:
+            for option in self.keyword_options[keyword]:
+                hits.setdefault(option, []).append(keyword)
+        ranked = sorted(hits.items(), key=lambda item: (-len(item[1]), self.order[item[0]]))
+        return [{"option": option, "score": len(found), "keywords": sorted(found)} for option, found in ranked]
+
+    def classify(self, title, content=None):
+        ranked = self.scores(title, content)
+        return ranked[0]["option"] if ranked else self.fallback
+
+def work_type_classifier(db_props):
+    """获取当前选项列表（及关键词表版本）的工作类型分类器；数据库没有工作类型属性时返回 None。"""
+    # 动态寻找“Work Type”属性名
+    attr = next((name for name in db_props.keys() if name.lower() in WORK_TYPE_ATTR_NAMES), None)
+    if not attr:
+        return None
+    options = [opt.get("name") for opt in db_props[attr].get("select", {}).get("options", [])]
+    return work_type_keywords.classifier(options)
+
+def infer_work_type(title, content, db_props):
+    """
+    根据标题和正文内容智能预测“Work Type”。
+    """
+    classifier = work_type_classifier(db_props)
+    return classifier.classify(title, content) if classifier else None
+
+def infer_work_types(db_props, items):
+    """
+    批量预测工作类型：items 为 (title, content) 序列，共享同一个已编译的分类器。
+    返回与 items 等长的列表。
+    """
+    classifier = work_type_classifier(db_props)
+    if classifier is None:
+        return [None] * len(items)
+    return [classifier.classify(title, content) for title, content in items]
+
+# 输出格式：full 为原始 Notion JSON（按 NOTION_JSON_STYLE 缩进），compact 为扁平化纯值（压缩 JSON）
+OUTPUT_FORMATS = ("full", "compact")
+
+def dump_result(obj, fmt="full"):
+    """按输出格式序列化结果：compact 模式总是输出无缩进的最小化 JSON。"""
+    return to_json(obj, pretty=False if fmt == "compact" else None)
+
+def plain_text(rich_text):
+    """将 rich_text / title 数组拼接为纯文本。"""
+    if not isinstance(rich_text, list):
+        return ""
+    return "".join(
+        (item.get("plain_text") or item.get("text", {}).get("content", ""))
+        for item in rich_text if isinstance(item, dict)
+    )
+
+# 属性值的预期结构：与之不符的值（迁移残留、第三方写入等）按空值处理
+DICT_VALUED_TYPES = {"select", "status", "date", "created_by", "last_edited_by", "unique_id", "formula", "rollup"}
+LIST_VALUED_TYPES = {"title", "rich_text", "multi_select", "people", "relation", "files"}
+
+def property_value(prop):
+    """
+    返回属性的 (type, value)。属性本身不是字典、或值与类型的预期结构不符时返回 (type, None)，
+    simplify_property、分组统计、本地镜像与检索索引都经由这里读取属性值。
+    """
+    if not isinstance(prop, dict):
+        return None, None
+    ptype = prop.get("type")
+    if not isinstance(ptype, str):
+        return None, None
+    value = prop.get(ptype)
+    if (ptype in DICT_VALUED_TYPES and not isinstance(value, dict)) or \
+            (ptype in LIST_VALUED_TYPES and not isinstance(value, list)):
+        return ptype, None
+    return ptype, value
+
+def simplify_property(prop):
+    """将单个 Notion 属性值扁平化为纯值（标题文本、选项名、日期起点等）。"""
+    ptype, value = property_value(prop)
+    if value is None:
+        return None
+
+    if ptype in ("title", "rich_text"):
+        return plain_text(value)
+    if ptype in ("select", "status"):
+        return value.get("name")
+    if ptype in ("multi_select", "people", "relation", "files"):
+        value = [item for item in value if isinstance(item, dict)]
+    if ptype == "multi_select":
+        return [opt.get("name") for opt in value]
+    if ptype == "date":
+        return value.get("start") if not value.get("end") else {"start": value.get("start"), "end": value.get("end")}
+    if ptype == "people":
+        return [person.get("name") or person.get("id") for person in value]
+    if ptype == "relation":
+        return [rel.get("id") for rel in value]
+    if ptype == "files":
+        return [f.get("name") or (f.get(f.get("type")) or {}).get("url") for f in value]
+    if ptype in ("created_by", "last_edited_by"):
+        return value.get("name") or value.get("id")
+    if ptype == "unique_id":
+        prefix = value.get("prefix")
+        return f"{prefix}-{value.get('number')}" if prefix else value.get("number")
+    if ptype == "formula":
+        return value.get(value.get("type"))
+    if ptype == "rollup":
+        if value.get("type") == "array":
+            return [simplify_property(item) for item in value.get("array") or []]
+        return value.get(value.get("type"))
+    return value
+
+def select_properties(props, fields):
+    """
+    按 fields 投影属性字典。fields 中的名称与 normalize_properties 一样支持拼音、别名与大小写模糊匹配。
+    """
+    if not fields:
+        return props
+    resolver = get_property_resolver(props)
+    selected = {}
+    for field in fields:
+        name = resolver.resolve(field)
+        if name and name in props:
+            selected[name] = props[name]
+    return selected
+
+def simplify_page(page, fields=None):
+    """将页面对象压缩为 {id, url, 属性名: 纯值}，省略空值。"""
+    compact = {k: page[k] for k in ("id", "url") if page.get(k)}
+    for name, prop in select_properties(page.get("properties", {}), fields).items():
+        value = simplify_property(prop)
+        if value not in (None, "", [], {}):
+            compact[name] = value
+    return compact
+
+def shape_page(page, fields=None, fmt="full"):
+    """按投影字段与输出格式整理单个页面对象。"""
+    if fmt == "compact":
+        return simplify_page(page, fields)
+    if not fields:
+        return page
+    return dict(page, properties=select_properties(page.get("properties", {}), fields))
+
+def simplify_database(db, fields=None):
+    """将数据库对象压缩为标题、ID 与 {属性名: 类型/选项} 的简表。"""
+    columns = {}
+    for name, spec in select_properties(db.get("properties", {}), fields).items():
+        ptype = spec.get("type")
+        options = spec.get(ptype, {}).get("options") if isinstance(spec.get(ptype), dict) else None
+        columns[name] = {"type": ptype, "options": [opt.get("name") for opt in options]} if options else ptype
+    compact = {
+        "id": db.get("id"),
+        "title": plain_text(db.get("title")),
+        "url": db.get("url"),
+        "properties": columns,
+    }
+    return {k: v for k, v in compact.items() if v is not None}
+
+def encode_resume_cursor(page_cursor, offset):
+    """
+    生成本地续读游标：字节预算截断发生在某页中间时，记录该页的起始游标与页内偏移。
+    格式为 "<Notion 游标>@<偏移>"，首页的 Notion 游标为空。
+    """
+    return f"{page_cursor or ''}@{offset}"
+
+def decode_resume_cursor(cursor):
+    """解析 start_cursor，返回 (Notion 游标, 需要跳过的条数)。"""
+    if cursor and "@" in cursor:
+        page_cursor, _, offset = cursor.rpartition("@")
+        if offset.isdigit():
+            return page_cursor or None, int(offset)
+    return cursor, 0
+
+class QueryResultBuilder:
+    """
+    累积 query_database 的分页结果：按 fields/format 整理每一行，
+    超出字节预算时在页内截断并生成可续读游标。
+    """
+
+    def __init__(self, fields=None, fmt="full", max_bytes=None, start_cursor=None):
+        self.fields = fields
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.page_cursor, self.skip = decode_resume_cursor(start_cursor)
+        self.results = []
+        self.used_bytes = 0
+        self.next_cursor = None
+        self.has_more = False
+
+    def add_page(self, page):
+        """加入一页查询结果；因字节预算截断时返回 False，调用方应停止翻页。"""
+        for offset, item in enumerate(page.get("results", [])[self.skip:], start=self.skip):
+            remember_page_parent(item)
+            row = shape_page(item, self.fields, self.fmt)
+            if self.max_bytes:
+                size = len(dump_result(row, self.fmt).encode("utf-8"))
+                # 至少返回一条，避免单条超过预算时无法前进
+                if self.results and self.used_bytes + size > self.max_bytes:
+                    self.next_cursor, self.has_more = encode_resume_cursor(self.page_cursor, offset), True
+                    return False
+                self.used_bytes += size
+            self.results.append(row)
+
+        self.skip = 0
+        self.page_cursor = page.get("next_cursor")
+        self.next_cursor, self.has_more = self.page_cursor, bool(page.get("has_more"))
+        return True
+
+    def result(self):
+        return {"object": "list", "results": self.results, "next_cursor": self.next_cursor, "has_more": self.has_more}
+
+# aggregate_database 支持的日期分桶粒度
+AGGREGATE_BUCKETS = ("day", "week", "month", "year")
+# 页面级时间戳，可直接作为分组字段
+PAGE_TIMESTAMPS = ("created_time", "last_edited_time")
+DATE_PROPERTY_TYPES = ("date", "created_time", "last_edited_time")
+
+def bucket_date(value, bucket):
+    """将日期/时间字符串归入分桶：day 为日期，week 为该周周一的日期，month 为 YYYY-MM，year 为 YYYY。"""
+    if isinstance(value, dict):
+        value = value.get("start")
+    if not value:
+        return None
+    day = str(value)[:10]
+    if bucket == "month":
+        return day[:7]
+    if bucket == "year":
+        return day[:4]
+    if bucket == "week":
+        try:
+            date = datetime.strptime(day, "%Y-%m-%d").date()
+        except ValueError:
+            return day
+        return (date - timedelta(days=date.weekday())).isoformat()
+    return day
+
+class GroupCounter:
+    """
+    流式分组计数：逐页累加，只保留各分组的计数，内存与行数无关。
+    多选属性按每个选项分别计入；空值归入 null 分组。
+    """
+
+    def __init__(self, group_by, prop_types, bucket="day"):
+        self.group_by = group_by
+        self.prop_types = prop_types
+        self.bucket = bucket
+        self.total = 0
+        self.counts = {}
+        # 页面时间戳（非同名属性）与日期类属性按分桶取值
+        self.date_fields = {
+            name for name in group_by
+            if prop_types.get(name) in DATE_PROPERTY_TYPES or (name in PAGE_TIMESTAMPS and name not in prop_types)
+        }
+
+    def _values(self, page, name):
+        if name in PAGE_TIMESTAMPS and name not in self.prop_types:
+            return [bucket_date(page.get(name), self.bucket)]
+        value = simplify_property(page.get("properties", {}).get(name))
+        if name in self.date_fields:
+            return [bucket_date(value, self.bucket)]
+        items = value if isinstance(value, list) else [value]
+        # 分组键需可哈希：日期区间取起点（与本地镜像一致），其余结构化值按文本计入
+        items = [item.get("start") if isinstance(item, dict) else item for item in items]
+        return [item if item is None or isinstance(item, (str, int, float, bool)) else str(item)
+                for item in items] or [None]
+
+    def add_page(self, page):
+        self.total += 1
+        keys = [()]
+        for name in self.group_by:
+            keys = [key + (value,) for key in keys for value in self._values(page, name)]
+        for key in keys:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def result(self, limit=None):
+        """返回分组汇总：含日期分桶时按分组键排序，否则按计数倒序。"""
+        if self.date_fields:
+            items = sorted(self.counts.items(), key=lambda item: tuple("" if v is None else str(v) for v in item[0]))
+        else:
+            items = sorted(self.counts.items(), key=lambda item: -item[1])
+        groups = [dict(zip(self.group_by, key), count=count) for key, count in items[:limit or None]]
+        return {"total": self.total, "group_count": len(self.counts), "groups": groups}
+
+# list_databases 使用的 search 过滤条件
+DATABASE_SEARCH_BODY = {
+    "filter": {
+        "value": "database",
+        "property": "object"
+    }
+}
+
+def summarize_databases(results):
+    """从 search 结果中提取数据库的标题、ID 与 URL。"""
+    databases = []
+    for db in results.get("results", []):
+        title_list = db.get("title", [])
+        title = title_list[0].get("plain_text", "Untitled") if title_list else "Untitled"
+        databases.append({
+            "title": title,
+            "id": db.get("id"),
+            "url": db.get("url")
+        })
+    return databases
+
+def directory_key(text):
+    """数据库标题的索引键：小写并去除空白、标点与表情符号（保留中文）。"""
+    return re.sub(r"[\W_]+", "", (text or "").lower())
+
+def looks_like_id(ref):
+    """是否为 Notion ID（32 位十六进制，可带连字符与尖括号）。"""
+    return bool(NOTION_ID_RE.fullmatch(ref.strip().strip("<>")))
+
+class DatabaseDirectory:
+    """
+    已授权数据库目录缓存（每个集成 Token 一份）：
+    1. 完整分页读取 search 的数据库结果，TTL 到期或显式刷新时重建。
+    2. 按规范化标题、全拼与拼音首字母建立索引，标题解析为 ID 只需一次字典查找，不再每次调用都发起 search。
+    3. 解析未命中时（例如刚共享给集成的数据库）允许提前刷新，但两次刷新至少间隔 miss_refresh 秒。
+    """
+
+    def __init__(self, ttl=None, miss_refresh=None):
+        self.ttl = NOTION_DIRECTORY_TTL if ttl is None else ttl
+        self.miss_refresh = NOTION_DIRECTORY_MISS_REFRESH if miss_refresh is None else miss_refresh
+        self.databases = []
+        self._index = {}
+        self._fetched_at = None
+
+    def fresh(self):
+        return self._fetched_at is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    def may_refresh_on_miss(self):
+        return self._fetched_at is None or time.monotonic() - self._fetched_at >= self.miss_refresh
+
+    def load(self, results):
+        databases = summarize_databases(results)
+        index = {}
+        for db in databases:
+            key = directory_key(db["title"])
+            if not key:
+                continue
+            keys = {key}
+            # 拼音键只对含中文的标题有意义（英文标题的“首字母”会与其他标题大量冲突）
+            if re.search(r"[\u4e00-\u9fff]", key):
+                syllables = pinyin_syllables(key)
+                keys.update({directory_key("".join(syllables)), directory_key("".join(s[:1] for s in syllables))})
+            for index_key in keys:
+                index.setdefault(index_key, []).append(db)
+        self.databases, self._index, self._fetched_at = databases, index, time.monotonic()
+
+    def lookup(self, name):
+        key = directory_key(name)
+        if not key:
+            return []
+        return self._index.get(key) or self._index.get(directory_key(get_pinyin(key)), [])
+
+    def choose(self, name, matches):
+        """返回 (database_id, error)：恰好一个匹配时返回其 ID，否则返回带候选项的错误信息。"""
+        if len(matches) == 1:
+            return matches[0]["id"], None
+        if matches:
+            candidates = ", ".join(f"{db['title']} ({db['id']})" for db in matches)
+            return None, f"Error: Multiple databases are titled {to_json(name)}: {candidates}. Pass database_id instead."
+        available = ", ".join(db["title"] for db in self.databases) or "none"
+        return None, f"Error: No accessible database titled {to_json(name)}. Available: {available}"
+
+database_directory = TenantScoped("databases")
+
+def directory_error(status, results):
+    return f"Error (Status {status}): {to_json(results)}"
+
+def directory_flow(force=False):
+    """请求流程：必要时（过期或 force）重建数据库目录，返回 (status, error)。"""
+    if force or not database_directory.fresh():
+        status, results = yield from collect_flow("search", DATABASE_SEARCH_BODY)
+        if status != 200:
+            return status, directory_error(status, results)
+        database_directory.load(results)
+    return 200, None
+
+def load_database_directory(force=False):
+    """必要时重建数据库目录（见 directory_flow）。"""
+    return run_flow(directory_flow(force))
+
+async def async_load_database_directory(force=False):
+    """load_database_directory 的异步版本。"""
+    return await arun_flow(directory_flow(force))
+
+def resolve_database_flow(ref):
+    """请求流程：将数据库标题（或拼音）解析为 ID，返回 (database_id, error)；ID 原样返回。"""
+    if not ref or looks_like_id(ref):
+        return ref, None
+    status, error = yield from directory_flow()
+    if error:
+        return None, error
+    matches = database_directory.lookup(ref)
+    if not matches and database_directory.may_refresh_on_miss():
+        status, error = yield from directory_flow(force=True)
+        if error:
+            return None, error
+        matches = database_directory.lookup(ref)
+    return database_directory.choose(ref, matches)
+
+def resolve_database(ref):
+    """将数据库标题（或拼音）解析为 ID（见 resolve_database_flow）。"""
+    return run_flow(resolve_database_flow(ref))
+
+async def async_resolve_database(ref):
+    """resolve_database 的异步版本。"""
+    return await arun_flow(resolve_database_flow(ref))
+
+DatabaseParam = Annotated[Optional[str], Field(
+    description="数据库标题（支持拼音，如 \"工作日志\" 或 \"gongzuorizhi\"），在已授权数据库目录中解析为 ID；也可以直接传 ID。优先于 database_id。"
+)]
+
+def with_database(fn):
+    """
+    工具装饰器：为带 database_id 参数的工具增加可选的 database 参数；
+    database（或 database_id）传入的是标题/拼音时，先在缓存的数据库目录中解析为 ID，无法唯一解析时直接返回错误。
+    """
+    signature = inspect.signature(fn)
+    if "database_id" not in signature.parameters:
+        return fn
+
+    def bind(args, kwargs, database):
+        bound = signature.bind_partial(*args, **kwargs)
+        if database:
+            bound.arguments["database_id"] = database
+        return bound
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, database=None, **kwargs):
+            bound = bind(args, kwargs, database)
+            resolved, error = await async_resolve_database(bound.arguments.get("database_id"))
+            if error:
+                return error
+            bound.arguments["database_id"] = resolved
+            return await fn(*bound.args, **bound.kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, database=None, **kwargs):
+            bound = bind(args, kwargs, database)
+            resolved, error = resolve_database(bound.arguments.get("database_id"))
+            if error:
+                return error
+            bound.arguments["database_id"] = resolved
+            return fn(*bound.args, **bound.kwargs)
+
+    database_param = inspect.Parameter("database", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=DatabaseParam)
+    wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), database_param])
+    wrapper.__annotations__ = dict(fn.__annotations__, database=DatabaseParam)
+    return wrapper
+
+def render_database_info(db, fields=None, fmt="full"):
+    """按投影字段与输出格式序列化数据库对象。"""
+    if fmt == "compact":
+        return dump_result(simplify_database(db, fields), fmt)
+    if fields:
+        db = dict(db, properties=select_properties(db.get("properties", {}), fields))
+    return dump_result(db, fmt)
+
+# Notion 限制：单个 rich_text 文本 2000 字符，单个 Block 最多 100 个 rich_text，单次最多追加 100 个 Block
+NOTION_TEXT_LIMIT = 2000
+NOTION_RICH_TEXT_ITEMS = 100
+NOTION_BLOCK_BATCH = 100
+
+# Notion 代码块支持的常用语言及别名
+NOTION_CODE_LANGUAGES = {
+    "bash", "c", "c#", "c++", "css", "dart", "diff", "docker", "go", "graphql", "html", "java",
+    "javascript", "json", "kotlin", "latex", "makefile", "markdown", "php", "plain text",
+    "powershell", "python", "ruby", "rust", "scss", "shell", "sql", "swift", "typescript",
+    "xml", "yaml",
+}
+CODE_LANGUAGE_ALIASES = {
+    "py": "python", "js": "javascript", "ts": "typescript", "sh": "shell", "zsh": "shell",
+    "yml": "yaml", "md": "markdown", "cpp": "c++", "cs": "c#", "dockerfile": "docker",
+    "text": "plain text", "txt": "plain text", "vue": "html", "jsx": "javascript", "tsx": "typescript",
+}
+
+MD_FENCE_RE = re.compile(r"^\s*```\s*([\w+#.-]*)\s*$")
+MD_DIVIDER_RE = re.compile(r"^\s*(-{3,}|\*{3,}|_{3,})\s*$")
+MD_HEADING_RE = re.compile(r"^(#{1,3})\s+(.*)$")
+MD_TODO_RE = re.compile(r"^\s*[-*+]\s+\[([ xX])\]\s+(.*)$")
+MD_BULLET_RE = re.compile(r"^\s*[-*+]\s+(.*)$")
+MD_NUMBERED_RE = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+MD_QUOTE_RE = re.compile(r"^\s*>\s?(.*)$")
+
+def split_text(text, limit=NOTION_TEXT_LIMIT):
+    """按 Notion 字符上限（UTF-16 编码单元）切分文本，emoji 等增补字符计为 2。"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        chunk = text[start:start + limit]
+        units = len(chunk.encode("utf-16-le")) // 2
+        while units > limit:
+            chunk = chunk[:len(chunk) - max(1, (units - limit + 1) // 2)]
+            units = len(chunk.encode("utf-16-le")) // 2
+        chunks.append(chunk)
+        start += len(chunk)
+    return chunks
+
+def rich_text_segments(text):
+    """将任意长度文本转换为 rich_text 数组，每段不超过 2000 字符。"""
+    return [{"type": "text", "text": {"content": chunk}} for chunk in split_text(text)]
+
+def text_blocks(block_type, text, **extra):
+    """构造文本类 Block；超过单个 Block 的 rich_text 数量上限时拆成多个同类 Block。"""
+    segments = rich_text_segments(text) or [{"type": "text", "text": {"content": ""}}]
+    return [
+        {"object": "block", "type": block_type,
+         block_type: dict(extra, rich_text=segments[i:i + NOTION_RICH_TEXT_ITEMS])}
+        for i in range(0, len(segments), NOTION_RICH_TEXT_ITEMS)
+    ]
+
+def code_language(tag):
+    tag = (tag or "").lower()
+    tag = CODE_LANGUAGE_ALIASES.get(tag, tag)
+    return tag if tag in NOTION_CODE_LANGUAGES else "plain text"
+
+def iter_markdown_blocks(text):
+    """
+    流式将 Markdown 文本转换为 Notion Block：
+    支持 #/##/### 标题、无序/有序列表、待办、引用、分割线与 ``` 代码块，其余连续行合并为段落。
+    """
+    paragraph = []
+    code_lines, code_lang = None, None
+
+    def flush_paragraph():
+        if paragraph:
+            yield from text_blocks("paragraph", "\n".join(paragraph))
+            paragraph.clear()
+
+    for line in (text or "").splitlines():
+        if code_lines is not None:
+            if MD_FENCE_RE.match(line):
+                yield from text_blocks("code", "\n".join(code_lines), language=code_lang)
+                code_lines = None
+            else:
+                code_lines.append(line)
+            continue
+
+        fence = MD_FENCE_RE.match(line)
+        if fence:
+            yield from flush_paragraph()
+            code_lines, code_lang = [], code_language(fence.group(1))
+            continue
+
+        if not line.strip():
+            yield from flush_paragraph()
+            continue
+
+        if MD_DIVIDER_RE.match(line):
+            yield from flush_paragraph()
+            yield {"object": "block", "type": "divider", "divider": {}}
+            continue
+
+        heading = MD_HEADING_RE.match(line)
+        todo = MD_TODO_RE.match(line)
+        bullet = MD_BULLET_RE.match(line)
+        numbered = MD_NUMBERED_RE.match(line)
+        quote = MD_QUOTE_RE.match(line)
+        if heading:
+            yield from flush_paragraph()
+            yield from text_blocks(f"heading_{len(heading.group(1))}", heading.group(2).strip())
+        elif todo:
+            yield from flush_paragraph()
+            yield from text_blocks("to_do", todo.group(2), checked=todo.group(1).lower() == "x")
+        elif bullet:
+            yield from flush_paragraph()
+            yield from text_blocks("bulleted_list_item", bullet.group(1))
+        elif numbered:
+            yield from flush_paragraph()
+            yield from text_blocks("numbered_list_item", numbered.group(1))
+        elif quote:
+            yield from flush_paragraph()
+            yield from text_blocks("quote", quote.group(1))
+        else:
+            paragraph.append(line)
+
+    # 未闭合的代码块按已读取内容输出
+    if code_lines is not None:
+        yield from text_blocks("code", "\n".join(code_lines), language=code_lang)
+    yield from flush_paragraph()
+
+def iter_block_batches(blocks, size=NOTION_BLOCK_BATCH):
+    """将 Block 流按每批最多 size 个分组，只在内存中保留当前一批。"""
+    batch = []
+    for block in blocks:
+        batch.append(block)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def split_initial_children(payload):
+    """创建页面时最多携带 100 个子 Block，返回需在创建成功后追加的剩余 Block。"""
+    children = payload.get("children")
+    if not children or len(children) <= NOTION_BLOCK_BATCH:
+        return []
+    payload["children"] = children[:NOTION_BLOCK_BATCH]
+    return children[NOTION_BLOCK_BATCH:]
+
+def append_blocks_flow(block_id, blocks):
+    """
+    请求流程：按顺序分批追加 Block（Notion 总是追加到末尾，因此批次必须串行以保证顺序）。
+    返回 (status, result, appended, requests)；失败时 result 为错误详情。
+    """
+    appended = requests_sent = 0
+    status, result = 200, {}
+    for batch in iter_block_batches(blocks):
+        status, result = yield "PATCH", f"blocks/{block_id}/children", {"children": batch}
+        requests_sent += 1
+        if status != 200:
+            break
+        appended += len(batch)
+    return status, result, appended, requests_sent
+
+def append_blocks(block_id, blocks):
+    """分批追加 Block（见 append_blocks_flow）。"""
+    return run_flow(append_blocks_flow(block_id, blocks))
+
+async def async_append_blocks(block_id, blocks):
+    """append_blocks 的异步版本。"""
+    return await arun_flow(append_blocks_flow(block_id, blocks))
+
+def append_result_message(status, result, appended, requests_sent):
+    """生成追加正文的结果消息。"""
+    if status != 200:
+        return f"Error after appending {appended} blocks: {to_json(result)}"
+    return f"Content appended to page successfully ({appended} blocks in {requests_sent} requests)."
+
+# upgrade_database_schema 添加的标准工作日志字段
+WORKLOG_SCHEMA_PROPERTIES = {
+    "工作类型": {
+        "select": {
+            "options": [
+                {"name": "📱 小程序端", "color": "blue"},
+                {"name": "💻 vue后台web端", "color": "green"},
+                {"name": "🔌 fastAPI后台接口端", "color": "purple"},
+                {"name": "📝 日常记录", "color": "gray"}
+            ]
+        }
+    },
+    "状态": {
+        "select": {
+            "options": [
+                {"name": "未开始", "color": "gray"},
+                {"name": "进行中", "color": "blue"},
+                {"name": "已完成", "color": "green"}
+            ]
+        }
+    }
+}
+
+def build_page_payload(db_id, db_props_meta, title, properties, content):
+    """
+    根据数据库架构构造创建页面的请求体。
+    返回 (payload, error)，error 不为空时表示无法构造。
+    """
+    # 1. 归一化输入属性 (透传已获取的 db_props_meta)
+    normalized_input = normalize_properties(db_id, properties or {}, db_props=db_props_meta)
+    
+    # 2. 构造最终属性 payload
+    payload_props = {}
+    
+    # 寻找标题属性名称
+    resolver = get_property_resolver(db_props_meta)
+    title_prop_name = resolver.title_prop
+    
+    # 处理标题：优先从归一化属性中提取，其次使用 title 参数
+    if title_prop_name in normalized_input:
+        payload_props[title_prop_name] = normalized_input.pop(title_prop_name)
+    elif title:
+        payload_props[title_prop_name] = {"title": rich_text_segments(title)}
+    
+    # 处理正文 (Content)：优先寻找名字匹配的属性，其次作为正文 Block
+    content_placed_in_prop = False
+    if content:
+        # 定义内容属性可能的候选名 (根据属性名来放内容)
+        content_keywords = ["内容", "正文", "描述", "备注", "summary", "content", "description", "note", "detail"]
+        
+        # 1. 尝试在数据库中寻找匹配这些关键词的 rich_text 属性
+        target_content_prop = resolver.find_by_keywords("rich_text", content_keywords)
+        
+        if target_content_prop and target_content_prop not in normalized_input:
+            payload_props[target_content_prop] = {"rich_text": rich_text_segments(content)}
+            content_placed_in_prop = True
+
+    # 3. 自动填充辅助属性 (如果数据库支持且未手动提供)
+    
+    # 记录时间 (智能寻找日期属性)
+    date_prop = next((name for name, spec in db_props_meta.items() if spec.get("type") == "date"), None)
+    if date_prop and date_prop not in payload_props and date_prop not in normalized_input:
+        payload_props[date_prop] = {"date": {"start": get_now_str()}}
+    
+    # 智能预测工作类型 (如果未手动提供)
+    work_type_prop = resolver.find_by_keywords("select", ["type", "类型"])
+    
+    if work_type_prop and work_type_prop not in normalized_input:
+        predicted = infer_work_type(title, content, db_props_meta)
+        if predicted:
+            payload_props[work_type_prop] = {"select": {"name": predicted}}
+    
+    # 4. 合并剩余属性
+    payload_props.update(normalized_input)
+    
+    # 最终检查：移除任何可能导致 Notion 报错的空值或不规范键
+    final_props = {k: v for k, v in payload_props.items() if k in db_props_meta}
+    
+    # 确保标题存在 (兜底)
+    if title_prop_name not in final_props:
+        if title:
+            final_props[title_prop_name] = {"title": rich_text_segments(title)}
+        elif properties:
+             first_val = list(properties.values())[0]
+             final_props[title_prop_name] = {"title": rich_text_segments(str(first_val))}
+        else:
+             return None, f"Error: Title property ('{title_prop_name}') is mandatory."
+
+    payload = {
+        "parent": {"database_id": db_id},
+        "properties": final_props
+    }
+
+    # 如果 content 没有被放入属性，则按 Markdown 转换为正文 Block 插入
+    if content and not content_placed_in_prop:
+        payload["children"] = list(iter_markdown_blocks(content))
+
+    return payload, None
+
+# ---------------------------------------------------------------------------
+# 本地 SQLite 镜像：sync_database 将数据库页面同步到本地，query_local 在本地执行 Notion 风格过滤。
+# ---------------------------------------------------------------------------
+
+MIRROR_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    page_id TEXT PRIMARY KEY,
+    database_id TEXT NOT NULL,
+    created_time TEXT,
+    last_edited_time TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_db_edited ON pages (database_id, last_edited_time);
+CREATE INDEX IF NOT EXISTS idx_pages_db_created ON pages (database_id, created_time);
+
+-- 每个属性值一行（multi_select 等多值属性展开为多行），供过滤条件走索引
+CREATE TABLE IF NOT EXISTS page_props (
+    page_id TEXT NOT NULL,
+    database_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value_text TEXT,
+    value_num REAL
+);
+CREATE INDEX IF NOT EXISTS idx_props_page ON page_props (page_id, name);
+CREATE INDEX IF NOT EXISTS idx_props_text ON page_props (database_id, name, value_text);
+CREATE INDEX IF NOT EXISTS idx_props_num ON page_props (database_id, name, value_num);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    database_id TEXT PRIMARY KEY,
+    last_edited_time TEXT,
+    synced_at TEXT,
+    schema TEXT
+);
+"""
+
+def mirror_values(prop):
+    """将属性扁平化为镜像行的 (value_text, value_num) 列表，空值不产生行。"""
+    value = simplify_property(prop)
+    items = value if isinstance(value, list) else [value]
+    rows = []
+    for item in items:
+        if isinstance(item, dict):
+            item = item.get("start")
+        if item is None or item == "":
+            continue
+        if isinstance(item, bool):
+            rows.append(("true" if item else "false", 1 if item else 0))
+        elif isinstance(item, (int, float)):
+            rows.append((str(item), item))
+        else:
+            rows.append((str(item), None))
+    return rows
+
+class LocalMirror:
+    """线程安全的本地 SQLite 镜像（单连接 + 锁，WAL 模式）。"""
+
+    def __init__(self, path=None):
+        self.path = path or NOTION_MIRROR_PATH
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(MIRROR_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get_state(self, db_id):
+        """返回 (last_edited_time, schema)，从未同步过时返回 None。"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT last_edited_time, schema FROM sync_state WHERE database_id = ?", (cache_key(db_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json_loads(row[1]) if row[1] else {}
+
+    def upsert_pages(self, db_id, pages):
+        """写入一批页面（单个事务），已归档的页面从镜像中删除。"""
+        key = cache_key(db_id)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for page in pages:
+                    page_id = cache_key(page["id"])
+                    conn.execute("DELETE FROM page_props WHERE page_id = ?", (page_id,))
+                    if page.get("archived") or page.get("in_trash"):
+                        conn.execute("DELETE FROM pages WHERE page_id = ?", (page_id,))
+                        continue
+                    conn.execute(
+                        "INSERT OR REPLACE INTO pages (page_id, database_id, created_time, last_edited_time, data) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (page_id, key, page.get("created_time"), page.get("last_edited_time"),
+                         json_bytes(page).decode("utf-8")),
+                    )
+                    conn.executemany(
+                        "INSERT INTO page_props (page_id, database_id, name, value_text, value_num) VALUES (?, ?, ?, ?, ?)",
+                        [(page_id, key, name, text, num)
+                         for name, prop in page.get("properties", {}).items()
+                         for text, num in mirror_values(prop)],
+                    )
+
+    def prune(self, db_id, keep_ids):
+        """全量同步后删除本次未出现的页面（已在 Notion 中删除或移出数据库）。"""
+        key = cache_key(db_id)
+        keep = {cache_key(page_id) for page_id in keep_ids}
+        with self._lock:
+            conn = self._connection()
+            stale = [row[0] for row in conn.execute("SELECT page_id FROM pages WHERE database_id = ?", (key,))
+                     if row[0] not in keep]
+            with conn:
+                conn.executemany("DELETE FROM pages WHERE page_id = ?", [(page_id,) for page_id in stale])
+                conn.executemany("DELETE FROM page_props WHERE page_id = ?", [(page_id,) for page_id in stale])
+        return stale
+
+    def set_state(self, db_id, last_edited_time, schema):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (database_id, last_edited_time, synced_at, schema) VALUES (?, ?, ?, ?)",
+                    (cache_key(db_id), last_edited_time, get_now_str(), json_bytes(schema).decode("utf-8")),
+                )
+
+    def count(self, db_id):
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM pages WHERE database_id = ?", (cache_key(db_id),)
+            ).fetchone()[0]
+
+    def query(self, db_id, where_sql, params, order_sql, order_params, limit):
+        """执行已编译的过滤与排序，返回页面对象列表。"""
+        sql = f"SELECT p.data FROM pages p WHERE p.database_id = ? AND ({where_sql}) ORDER BY {order_sql}"
+        args = [cache_key(db_id), *params, *order_params]
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            rows = self._connection().execute(sql, args).fetchall()
+        return [json_loads(row[0]) for row in rows]
+
+local_mirror = LocalMirror()
+
+# ---------------------------------------------------------------------------
+# 全文检索：与镜像共用 SQLite 文件，基于 FTS5 索引标题、rich_text 属性与正文文本，并附加拼音词元。
+# ---------------------------------------------------------------------------
+
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    rowid INTEGER PRIMARY KEY,
+    page_id TEXT UNIQUE NOT NULL,
+    database_id TEXT,
+    url TEXT,
+    title TEXT NOT NULL DEFAULT '',
+    props TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT '',
+    last_edited_time TEXT,
+    scope TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(title, props, content, pinyin);
+"""
+
+# 各列的 BM25 权重：标题 > 拼音 > 属性 > 正文
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0, 3.0)
+# 每段连续汉字生成拼音词元时的最大音节窗口
+PINYIN_WINDOW = 8
+SEARCH_SNIPPET_CHARS = 40
+
+CJK_CHAR_RE = re.compile(r"([㐀-鿿豈-﫿])")
+CJK_RUN_RE = re.compile(r"[㐀-鿿豈-﫿]+")
+
+def segment_cjk(text):
+    """在每个汉字两侧插入空格，使 unicode61 分词器按字切分中文（短语查询即子串匹配）。"""
+    return CJK_CHAR_RE.sub(r" \1 ", text or "")
+
+def pinyin_tokens(text):
+    """
+    为每段连续汉字生成拼音词元：从每个音节起连续若干音节的全拼与首字母拼接，
+    配合前缀查询即可用 "gongzuo"、"rizhi"、"gzrz" 等命中“工作日志”。
+    """
+    tokens = []
+    for run in CJK_RUN_RE.findall(text or ""):
+        syllables = pinyin_syllables(run)
+        for i in range(len(syllables)):
+            window = syllables[i:i + PINYIN_WINDOW]
+            tokens.append("".join(window))
+            tokens.append("".join(s[0] for s in window if s))
+    return " ".join(tokens)
+
+def page_search_fields(page):
+    """从页面对象提取 (标题, rich_text 属性文本)。"""
+    title, texts = "", []
+    for prop in page.get("properties", {}).values():
+        ptype, value = property_value(prop)
+        if ptype == "title":
+            title = plain_text(value)
+        elif ptype == "rich_text":
+            text = plain_text(value)
+            if text:
+                texts.append(text)
+    return title, "\n".join(texts)
+
+def block_plain_text(block):
+    """提取单个 Block 的纯文本（段落、标题、列表、待办、引用、代码等带 rich_text 的类型）。"""
+    return plain_text(block.get(block.get("type"), {}).get("rich_text"))
+
+def fts_query(query):
+    """将用户查询拆词编译为 FTS5 表达式：中文按字组成短语，纯字母数字词按前缀匹配，词之间取交集。"""
+    terms = []
+    for term in query.split():
+        tokens = segment_cjk(term).split()
+        if not tokens:
+            continue
+        phrase = '"' + " ".join(tokens).replace('"', '""') + '"'
+        terms.append(phrase + "*" if term.isascii() and term.isalnum() else phrase)
+    return " AND ".join(terms)
+
+def search_snippet(texts, query, width=SEARCH_SNIPPET_CHARS):
+    """在原文中定位首个命中的查询词并截取上下文；仅拼音命中时返回标题或正文开头。"""
+    terms = [term.lower() for term in query.split()]
+    for text in texts:
+        lowered = text.lower()
+        for term in terms:
+            pos = lowered.find(term)
+            if pos >= 0:
+                start, end = max(0, pos - width), min(len(text), pos + len(term) + width)
+                snippet = text[start:end].replace("\n", " ")
+                return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+    fallback = next((text for text in texts if text), "")
+    return fallback[:width * 2].replace("\n", " ") + ("…" if len(fallback) > width * 2 else "")
+
+class SearchIndex:
+    """
+    页面全文索引：search_docs 保存原文，search_fts 保存分词后的文本与拼音词元，二者以 rowid 关联。
+    每条文档记录写入它的凭据（scope，见 index_scope），检索只返回当前凭据写入的页面。
+    """
+
+    def __init__(self, mirror):
+        self.mirror = mirror
+        self._ready = False
+
+    def _connection(self):
+        conn = self.mirror._connection()
+        if not self._ready:
+            conn.executescript(SEARCH_SCHEMA)
+            # 没有 scope 列的旧索引：补上该列，旧条目不属于任何凭据，重新 sync_database 后可再次检索
+            if "scope" not in {row[1] for row in conn.execute("PRAGMA table_info(search_docs)")}:
+                conn.execute("ALTER TABLE search_docs ADD COLUMN scope TEXT")
+            self._ready = True
+        return conn
+
+    def _refresh_fts(self, conn, rowid):
+        title, props, content = conn.execute(
+            "SELECT title, props, content FROM search_docs WHERE rowid = ?", (rowid,)
+        ).fetchone()
+        conn.execute("DELETE FROM search_fts WHERE rowid = ?", (rowid,))
+        conn.execute(
+            "INSERT INTO search_fts (rowid, title, props, content, pinyin) VALUES (?, ?, ?, ?, ?)",
+            (rowid, segment_cjk(title), segment_cjk(props), segment_cjk(content),
+             pinyin_tokens(title + "\n" + props)),
+        )
+
+    def index_pages(self, pages, contents=None, scope=None):
+        """
+        写入或刷新页面的标题与属性文本；contents 为 {page_id: 正文} 时同时替换正文，否则保留已索引的正文。
+        已归档的页面从索引中删除。
+        """
+        contents = {cache_key(page_id): text for page_id, text in (contents or {}).items()}
+        with self.mirror._lock:
+            conn = self._connection()
+            with conn:
+                for page in pages:
+                    page_id = cache_key(page["id"])
+                    if page.get("archived") or page.get("in_trash"):
+                        self._delete(conn, [page_id])
+                        continue
+                    title, props = page_search_fields(page)
+                    db_id = page.get("parent", {}).get("database_id")
+                    conn.execute(
+                        "INSERT INTO search_docs (page_id, database_id, url, title, props, last_edited_time, scope) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(page_id) DO UPDATE SET "
+                        "database_id = excluded.database_id, url = excluded.url, title = excluded.title, "
+                        "props = excluded.props, last_edited_time = excluded.last_edited_time, scope = excluded.scope",
+                        (page_id, cache_key(db_id) if db_id else None, page.get("url"), title, props,
+                         page.get("last_edited_time"), scope),
+                    )
+                    if page_id in contents:
+                        conn.execute("UPDATE search_docs SET content = ? WHERE page_id = ?",
+                                     (contents[page_id] or "", page_id))
+                    rowid = conn.execute("SELECT rowid FROM search_docs WHERE page_id = ?", (page_id,)).fetchone()[0]
+                    self._refresh_fts(conn, rowid)
+
+    def append_content(self, page_id, text, scope=None):
+        """将追加到页面的正文文本合并进索引。"""
+        page_id = cache_key(page_id)
+        with self.mirror._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO search_docs (page_id, content, scope) VALUES (?, ?, ?) ON CONFLICT(page_id) DO UPDATE SET "
+                    "content = CASE WHEN content = '' THEN excluded.content ELSE content || char(10) || excluded.content END",
+                    (page_id, text, scope),
+                )
+                rowid = conn.execute("SELECT rowid FROM search_docs WHERE page_id = ?", (page_id,)).fetchone()[0]
+                self._refresh_fts(conn, rowid)
+
+    def _delete(self, conn, page_ids):
+        for page_id in page_ids:
+            row = conn.execute("SELECT rowid FROM search_docs WHERE page_id = ?", (page_id,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM search_fts WHERE rowid = ?", row)
+                conn.execute("DELETE FROM search_docs WHERE rowid = ?", row)
+
+    def remove(self, page_ids):
+        with self.mirror._lock:
+            conn = self._connection()
+            with conn:
+                self._delete(conn, [cache_key(page_id) for page_id in page_ids])
+
+    def search(self, query, db_id=None, limit=20, scope=None):
+        """按 BM25 排序返回 scope 下的命中页面（含片段），查询为空时返回空列表。"""
+        expression = fts_query(query)
+        if not expression:
+            return []
+        sql = (
+            "SELECT d.page_id, d.database_id, d.url, d.title, d.props, d.content, d.last_edited_time, "
+            f"bm25(search_fts, {', '.join(map(str, SEARCH_WEIGHTS))}) AS score "
+            "FROM search_fts JOIN search_docs d ON d.rowid = search_fts.rowid WHERE search_fts MATCH ? AND d.scope = ?"
+        )
+        args = [expression, scope]
+        if db_id:
+            sql += " AND d.database_id = ?"
+            args.append(cache_key(db_id))
+        sql += " ORDER BY score LIMIT ?"
+        args.append(limit)
+        with self.mirror._lock:
+            rows = self._connection().execute(sql, args).fetchall()
+        return [
+            {
+                "id": page_id,
+                "database_id": database_id,
+                "url": url,
+                "title": title,
+                "snippet": search_snippet((title, props, content), query),
+                "last_edited_time": last_edited,
+                "score": round(-score, 4),
+            }
+            for page_id, database_id, url, title, props, content, last_edited, score in rows
+        ]
+
+search_index = SearchIndex(local_mirror)
+
+def index_scope():
+    """
+    当前档案凭据在检索索引中的归属键：Token 的摘要（磁盘上不保存 Token 本身）。
+    不同档案的 Token 对应不同工作区，检索时互不可见；沿用默认 Token 的档案与默认档案共享索引。
+    """
+    token, _ = load_env_vars()
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16] if token else ""
+
+def index_pages(pages, contents=None):
+    """写入后更新检索索引；索引失败只告警，不影响写入结果。租户请求的数据不写入本机索引。"""
+    if tenant_session():
+        return
+    try:
+        search_index.index_pages(pages, contents, index_scope())
+    except sqlite3.Error as e:
+        print(f"⚠️ 警告: 更新检索索引失败: {e}", file=sys.stderr)
+
+def index_appended_content(page_id, content):
+    if tenant_session():
+        return
+    try:
+        search_index.append_content(page_id, content, index_scope())
+    except sqlite3.Error as e:
+        print(f"⚠️ 警告: 更新检索索引失败: {e}", file=sys.stderr)
+
+TENANT_LOCAL_STORE_ERROR = "Error: This tool reads the server's local store and is not available to requests carrying their own X-Notion-Token."
+
+def local_store_only(fn):
+    """工具装饰器：本地镜像、检索索引与写入日志只保存本机 .env 凭据下的数据，租户请求直接返回错误（同时支持同步与异步工具）。"""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            if tenant_session():
+                return TENANT_LOCAL_STORE_ERROR
+            return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if tenant_session():
+            return TENANT_LOCAL_STORE_ERROR
+        return fn(*args, **kwargs)
+    return wrapper
+
+# Notion 过滤运算符 -> SQL 比较符
+NUMBER_FILTER_OPS = {
+    "equals": "=", "does_not_equal": "=", "greater_than": ">", "less_than": "<",
+    "greater_than_or_equal_to": ">=", "less_than_or_equal_to": "<=",
+}
+DATE_FILTER_OPS = {"before": "<", "after": ">", "on_or_before": "<=", "on_or_after": ">="}
+RELATIVE_DATE_FILTERS = {
+    "past_week": (-7, 0), "past_month": (-30, 0), "past_year": (-365, 0),
+    "next_week": (0, 7), "next_month": (0, 30), "next_year": (0, 365),
+}
+# 多值属性的 contains 表示“包含某个值”，而非子串匹配
+MULTI_VALUE_TYPES = {"multi_select", "people", "relation", "files"}
+
+def like_pattern(text, prefix="", suffix=""):
+    escaped = str(text).lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{prefix}{escaped}{suffix}"
+
+def compile_condition(column, ptype, op, value):
+    """
+    将单个运算符编译为针对 page_props 行（别名 pp）或 pages 列的谓词。
+    返回 (sql, params, negate)：negate 为 True 表示外层应使用 NOT EXISTS。
+    """
+    if op == "is_empty":
+        return "1", [], True
+    if op == "is_not_empty":
+        return "1", [], False
+
+    if ptype in ("number", "checkbox"):
+        if op not in NUMBER_FILTER_OPS:
+            raise ValueError(f"Unsupported {ptype} filter: {op}")
+        if ptype == "checkbox":
+            value = 1 if value else 0
+        return f"pp.value_num {NUMBER_FILTER_OPS[op]} ?", [value], op == "does_not_equal"
+
+    if ptype in ("date", "created_time", "last_edited_time"):
+        if op in DATE_FILTER_OPS:
+            # 只有日期的条件按日历日比较（与 equals 一致）；带时间的条件按时刻比较，julianday 会换算时区偏移
+            if len(str(value)) <= 10:
+                return f"substr({column}, 1, 10) {DATE_FILTER_OPS[op]} substr(?, 1, 10)", [value], False
+            return f"julianday({column}) {DATE_FILTER_OPS[op]} julianday(?)", [value], False
+        if op == "equals":
+            return f"substr({column}, 1, 10) = substr(?, 1, 10)", [value], False
+        if op in RELATIVE_DATE_FILTERS:
+            start_days, end_days = RELATIVE_DATE_FILTERS[op]
+            today = datetime.now(timezone.utc).date()
+            start = (today + timedelta(days=start_days)).isoformat()
+            end = (today + timedelta(days=end_days)).isoformat()
+            return f"substr({column}, 1, 10) BETWEEN ? AND ?", [start, end], False
+        if op == "this_week":
+            today = datetime.now(timezone.utc).date()
+            start = today - timedelta(days=today.weekday())
+            return f"substr({column}, 1, 10) BETWEEN ? AND ?", [start.isoformat(), (start + timedelta(days=6)).isoformat()], False
+        raise ValueError(f"Unsupported date filter: {op}")
+
+    if op in ("equals", "does_not_equal"):
+        return f"{column} = ?", [str(value)], op == "does_not_equal"
+    if op in ("contains", "does_not_contain"):
+        if ptype in MULTI_VALUE_TYPES:
+            return f"{column} = ?", [str(value)], op == "does_not_contain"
+        return f"instr(lower({column}), lower(?)) > 0", [str(value)], op == "does_not_contain"
+    if op == "starts_with":
+        return f"lower({column}) LIKE ? ESCAPE '\\'", [like_pattern(value, suffix="%")], False
+    if op == "ends_with":
+        return f"lower({column}) LIKE ? ESCAPE '\\'", [like_pattern(value, prefix="%")], False
+    raise ValueError(f"Unsupported {ptype} filter: {op}")
+
+def compile_filter(filter_params, resolver=None):
+    """
+    将 Notion 过滤对象（与 query_database 相同的结构，支持 and/or 嵌套、属性与时间戳条件）编译为 SQL。
+    属性名可使用拼音或别名（需提供 resolver）。返回 (where_sql, params)。
+    """
+    if not filter_params:
+        return "1", []
+
+    for compound, joiner in (("and", " AND "), ("or", " OR ")):
+        if compound in filter_params:
+            parts, params = [], []
+            for sub in filter_params[compound]:
+                sql, sub_params = compile_filter(sub, resolver)
+                parts.append(f"({sql})")
+                params.extend(sub_params)
+            if not parts:
+                return "1", []
+            return joiner.join(parts), params
+
+    if "timestamp" in filter_params:
+        column = filter_params["timestamp"]
+        if column not in ("created_time", "last_edited_time"):
+            raise ValueError(f"Unsupported timestamp filter: {column}")
+        ((op, value),) = filter_params[column].items()
+        sql, params, negate = compile_condition(f"p.{column}", column, op, value)
+        if op in ("is_empty", "is_not_empty"):
+            return (f"p.{column} IS NULL" if negate else f"p.{column} IS NOT NULL"), []
+        return (f"NOT ({sql})" if negate else sql), params
+
+    name = filter_params.get("property")
+    if not name:
+        raise ValueError(f"Unsupported filter: {to_json(filter_params)}")
+    if resolver:
+        name = resolver.resolve(name) or name
+
+    ptype, condition = next((k, v) for k, v in filter_params.items() if k != "property")
+    # formula 条件形如 {"formula": {"string": {...}}}，取内层类型
+    if ptype == "formula":
+        ptype, condition = next(iter(condition.items()))
+    ((op, value),) = condition.items()
+
+    sql, params, negate = compile_condition("pp.value_text", ptype, op, value)
+    exists = f"EXISTS (SELECT 1 FROM page_props pp WHERE pp.page_id = p.page_id AND pp.name = ? AND {sql})"
+    return (f"NOT {exists}" if negate else exists), [name, *params]
+
+def compile_sorts(sorts, resolver=None):
+    """将 Notion 排序数组编译为 ORDER BY 子句，默认按创建时间倒序。"""
+    clauses, params = [], []
+    for sort in sorts or []:
+        direction = "DESC" if sort.get("direction") == "descending" else "ASC"
+        if sort.get("timestamp") in ("created_time", "last_edited_time"):
+            clauses.append(f"p.{sort['timestamp']} {direction}")
+        elif sort.get("property"):
+            name = sort["property"]
+            if resolver:
+                name = resolver.resolve(name) or name
+            clauses.append(
+                "(SELECT COALESCE(pp.value_num, pp.value_text) FROM page_props pp "
+                f"WHERE pp.page_id = p.page_id AND pp.name = ? LIMIT 1) {direction}"
+            )
+            params.append(name)
+    clauses.append("p.created_time DESC")
+    return ", ".join(clauses), params
+
+# ---------------------------------------------------------------------------
+# 同步与异步工具共用的参数处理、请求体构造与结果格式化：两套实现只在请求的发送方式上不同。
+# ---------------------------------------------------------------------------
+
+MISSING_DATABASE_ERROR = "Error: No database_id provided and no default DATABASE_ID found."
+OUTPUT_FORMAT_ERROR = f"Error: format must be one of {', '.join(OUTPUT_FORMATS)}."
+
+def target_database(database_id):
+    """返回工具要操作的数据库 ID：未传 database_id 时使用当前租户/档案的默认数据库，都没有时返回 None。"""
+    _, default_db_id = load_env_vars()
+    return database_id or default_db_id
+
+def status_error(status, result):
+    return f"Error (Status {status}): {to_json(result)}"
+
+def metadata_error(db_meta):
+    return f"Error fetching database metadata: {to_json(db_meta)}"
+
+def database_info_result(db_id, status, db, fields, fmt):
+    if status != 200:
+        return f"Error (Status {status}): 无法访问数据库 {mask_id(db_id)}，请检查集成权限。"
+    return render_database_info(db, fields, fmt)
+
+def database_properties_result(status, db):
+    if status != 200:
+        return status_error(status, db)
+    return to_json(db.get("properties", {}))
+
+def start_query(fields, fmt, max_bytes, start_cursor, max_results):
+    """返回 (builder, limit)：limit 包含续读时需要跳过的条数，None 表示读取全部。"""
+    builder = QueryResultBuilder(fields, fmt, max_bytes, start_cursor)
+    return builder, (max_results + builder.skip if max_results else None)
+
+def prepare_page(db_id, db_meta, title, properties, content):
+    """
+    按数据库架构构造建页请求体，返回 (payload, extra_blocks, error)：
+    extra_blocks 为超出创建请求上限、需在创建后追加的正文 Block。
+    """
+    payload, error = build_page_payload(db_id, db_meta.get("properties", {}), title, properties, content)
+    if error:
+        return None, None, error
+    return payload, split_initial_children(payload), None
+
+def record_created_page(db_id, created, content):
+    """建页成功后的本地维护：记录页面父级、使查询缓存失效、写入检索索引。"""
+    remember_page_parent(created)
+    invalidate_database_queries(db_id)
+    index_pages([created], {created["id"]: content or ""})
+
+def page_created_message(created, append_outcome=None):
+    """建页结果消息；append_outcome 为追加剩余正文的 (status, result, appended, requests_sent)。"""
+    if append_outcome and append_outcome[0] != 200:
+        _, result, appended, _ = append_outcome
+        return (f"Error: page created at {created.get('url')}, but appending content failed "
+                f"after {appended} extra blocks: {to_json(result)}")
+    return f"Page created successfully with content: {created.get('url')}"
+
+def page_info_result(status, page, fields, fmt):
+    if status != 200:
+        return f"Error: {to_json(page)}"
+    remember_page_parent(page)
+    return dump_result(shape_page(page, fields, fmt), fmt)
+
+def page_update_payload(db_id, properties, status_db=None, db_meta=None):
+    """更新请求体：数据库页面按架构归一化属性（架构获取失败时原样提交），非数据库页面直接使用原始属性。"""
+    if db_id and status_db == 200:
+        properties = normalize_properties(db_id, properties, db_props=db_meta.get("properties", {}))
+    return {"properties": properties}
+
+def update_page_flow(page_id, properties, database_id=None):
+    """
+    请求流程：修改页面属性。返回 (db_id, updated, error)，交给 page_updated_result 生成结果消息；
+    error 为失败时的消息，db_id 为 None 表示非数据库页面。
+    """
+    # 写入失败且疑似架构过期时，强制刷新页面父级与架构后重试一次
+    for attempt in range(2):
+        # 获取页面所属的数据库 ID（优先使用提示与缓存）及其架构
+        status_page, parent = yield from page_parent_flow(page_id, database_id, force_refresh=attempt > 0)
+        if status_page != 200:
+            return None, None, f"Error fetching page: {to_json(parent)}"
+        db_id = parent
+
+        # 非数据库页面直接使用原始属性
+        status_db, db_meta = (yield from schema_flow(db_id, force_refresh=attempt > 0)) if db_id else (None, None)
+        payload = page_update_payload(db_id, properties, status_db, db_meta)
+        status, updated = yield "PATCH", f"pages/{page_id}", payload
+        if attempt == 0 and db_id and is_stale_schema_error(status, updated):
+            continue
+        break
+
+    if status not in (200, 201):
+        return db_id, None, f"Error: {to_json(updated)}"
+    return db_id, updated, None
+
+def page_updated_result(db_id, updated, error=None):
+    """更新结果消息；成功时使查询缓存失效并更新检索索引（SQLite 写入与拼音切分，异步工具在线程中调用）。"""
+    if error:
+        return error
+    invalidate_database_queries(db_id)
+    index_pages([updated])
+    return f"Page updated successfully: {updated.get('url')}"
+
+def page_appended_result(page_id, content, outcome):
+    """追加正文后的本地维护（Block 缓存失效、检索索引）与结果消息；outcome 为 append_blocks 的返回值。"""
+    block_cache.invalidate(page_id)
+    if outcome[0] == 200:
+        index_appended_content(page_id, content)
+    return append_result_message(*outcome)
+
+def schema_update_result(db_id, status, result, upgraded=False):
+    """修改数据库架构的结果：成功时用返回的数据库对象刷新架构缓存。"""
+    if status != 200:
+        return f"Error: {to_json(result)}"
+    refresh_schema_cache(db_id, result)
+    if upgraded:
+        return "Database schema upgraded with '工作类型' and '状态' properties."
+    return f"Database schema updated successfully. Current properties: {list(result.get('properties', {}).keys())}"
+
+# ---------------------------------------------------------------------------
+# 同步工具：可在脚本中直接调用；MCP 服务注册的是下方同名的异步版本。
+# ---------------------------------------------------------------------------
+
+@with_call_deadline
+def list_databases(refresh: bool = False) -> str:
+    """
+    功能: 列出当前集成有权访问的所有数据库。结果来自缓存的数据库目录（完整翻页，定期刷新），
+         其他工具的 database 参数即按此目录将标题解析为 ID。
+    
+    入参:
+        - refresh (bool, 可选): 是否立即重新拉取目录（例如刚把新数据库共享给集成），默认 False。
+    
+    返回: 数据库列表的 JSON 字符串，包含每个数据库的标题和 ID。
+    """
+    status, error = load_database_directory(force=refresh)
+    if error:
+        return error
+    return to_json(database_directory.databases)
+
+@with_call_deadline
+def get_database_info(database_id: str = None, fields: list = None, format: str = "full") -> str:
+    """
+    功能: 获取 Notion 数据库的完整元数据，包括标题、架构(Schema)和属性定义。
+    
+    入参:
+        - database_id (str, 可选): Notion 数据库 ID。若不填则使用配置的默认 ID。
+        - fields (list, 可选): 只返回这些属性（支持拼音/别名）。
+        - format (str, 可选): "full" 返回原始 JSON；"compact" 仅返回标题及 {属性名: 类型/选项}。
+    
+    参数结构: 字符串形式的 UUID，例如 "your_database_id_here"。
+    
+    返回: 数据库详情的 JSON 字符串，包含属性名、类型及选项等信息。
+    """
+    if format not in OUTPUT_FORMATS:
+        return OUTPUT_FORMAT_ERROR
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    status, db = get_database_schema(db_id)
+    return database_info_result(db_id, status, db, fields, format)
+
+@with_call_deadline
+def get_database_properties(database_id: str = None) -> str:
+    """
+    功能: 仅检索数据库的属性定义（列信息），用于了解有哪些字段可以操作。
+    
+    入参:
+        - database_id (str, 可选): 数据库 ID。
+    
+    参数结构: 字符串，例如 "your_database_id_here"。
+    
+    返回: 属性架构的 JSON 字符串，显示每个属性的名称、ID 和类型（如 select, multi_select）。
+    """
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    status, db = get_database_schema(db_id)
+    return database_properties_result(status, db)
+
+@with_call_deadline
+def query_database(database_id: str = None, filter_params: dict = None, sorts: list = None,
+                   start_cursor: str = None, page_size: int = 100, max_results: int = 100,
+                   fields: list = None, format: str = "full", max_bytes: int = None) -> str:
+    """
+    功能: 根据特定条件筛选并查询数据库中的页面，自动翻页。短时间内重复的相同查询直接由缓存返回，对该数据库的写入会使缓存失效。
+    
+    入参:
+        - database_id (str, 可选): 目标数据库 ID。
+        - filter_params (dict, 可选): Notion 标准查询对象。
+        - sorts (list, 可选): Notion 标准排序数组。
+        - start_cursor (str, 可选): 从上次返回的 next_cursor 处继续读取。
+        - page_size (int, 可选): 每次请求的条数，最大 100。
+        - max_results (int, 可选): 本次最多返回的条数，默认 100；传 0 表示读取全部。
+        - fields (list, 可选): 只返回这些属性（支持拼音/别名）。
+        - format (str, 可选): "full" 返回原始 JSON；"compact" 将每个属性扁平化为纯值、省略空值并输出压缩 JSON。
+        - max_bytes (int, 可选): 结果字节预算，超出时截断并返回可续读的 next_cursor。
+    
+    参数结构:
+        - database_id: "your_database_id_here"
+        - filter_params: {"property": "状态", "select": {"equals": "已完成"}}
+          注：属性名支持拼音，如 {"property": "zhuang_tai", ...}
+        - sorts: [{"property": "记录时间", "direction": "descending"}]
+        - fields: ["标题", "zhuang_tai"], format: "compact", max_bytes: 20000
+    
+    返回: 匹配页面的列表 JSON，包含 results、has_more 及 next_cursor（有更多结果时可传回 start_cursor 继续读取）。
+    """
+    if format not in OUTPUT_FORMATS:
+        return OUTPUT_FORMAT_ERROR
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    # Clean ID
+    db_id = db_id.strip().strip("<>").replace("-", "")
+    
+    builder, limit = start_query(fields, format, max_bytes, start_cursor, max_results)
+    for status, page in iter_query_pages(db_id, filter_params, sorts, page_size, builder.page_cursor, limit, cached=True):
+        if status != 200:
+            return status_error(status, page)
+        if not builder.add_page(page):
+            break
+
+    return dump_result(builder.result(), format)
+
+def create_page_flow(db_id, title="", properties=None, content=None):
+    """
+    请求流程：创建页面（架构过期时刷新重试、追加超出上限的正文），不含本地维护（见 record_created_page）。
+    返回 (status, created, message)：message 为返回给调用方的结果文本；本地构造请求体失败时 status 为 400。
+    页面已创建但追加剩余正文失败时，status 仍为创建请求的状态码。
+    """
+    # 写入失败且疑似架构过期时，强制刷新架构后重试一次
+    for attempt in range(2):
+        # 获取数据库架构 (优先命中缓存，重试时强制实时拉取)
+        status_db, db_meta = yield from schema_flow(db_id, force_refresh=attempt > 0)
+        if status_db != 200:
+            return status_db, db_meta, metadata_error(db_meta)
+
+        payload, extra_blocks, error = prepare_page(db_id, db_meta, title, properties, content)
+        if error:
+            return 400, None, error
+
+        status, created = yield "POST", "pages", payload
+        if attempt == 0 and is_stale_schema_error(status, created):
+            continue
+        break
+
+    if status not in (200, 201):
+        return status, created, f"Error: {to_json(created)}"
+
+    # 超出创建请求上限的正文 Block 在创建后分批追加
+    append_outcome = (yield from append_blocks_flow(created["id"], extra_blocks)) if extra_blocks else None
+    return status, created, page_created_message(created, append_outcome)
+
+def create_page(db_id, title="", properties=None, content=None):
+    """创建页面并完成本地维护（缓存失效、检索索引），返回值同 create_page_flow。"""
+    status, created, message = run_flow(create_page_flow(db_id, title, properties, content))
+    if status in (200, 201):
+        record_created_page(db_id, created, content)
+    return status, created, message
+
+async def async_create_page(db_id, title="", properties=None, content=None):
+    """create_page 的异步版本，返回值相同；本地维护在线程中执行，不阻塞事件循环。"""
+    status, created, message = await arun_flow(create_page_flow(db_id, title, properties, content))
+    if status in (200, 201):
+        await asyncio.to_thread(record_created_page, db_id, created, content)
+    return status, created, message
+
+@with_call_deadline
+def create_notion_page(database_id: str = None, title: str = "", properties: dict = None, content: str = None) -> str:
+    """
+    功能: 在指定数据库中创建一个新页面。
+    
+    入参:
+        - database_id (str, 可选): 数据库 ID。
+        - title (str, 必填): 页面标题。
+        - properties (dict, 可选): 其他属性键值对。支持拼音映射和简单值自动包装。
+        - content (str, 可选): 写入页面正文的内容。
+    
+    参数结构:
+        - title: "优化用户登录页面"
+        - properties: {"zhuang_tai": "已完成", "gong_zuo_lei_xing": "💻 vue后台web端"}
+          (属性名会自动映射到“状态”、“工作类型”，字符串值会自动包装为对应的 select 或 rich_text 结构)
+        - content: "修复了CSS兼容性问题..."
+    
+    返回: 成功时返回新页面的 URL，失败返回错误信息。开启写后台化（NOTION_WRITE_BEHIND）时立即返回写入票据 JSON，
+         结果通过 get_write_status 查询。
+    """
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+    if write_queue.enabled:
+        return write_queue.submit("create", {"database_id": db_id, "title": title, "properties": properties, "content": content})
+
+    return create_page(db_id, title, properties, content)[2]
+
+@with_call_deadline
+def get_page_info(page_id: str, fields: list = None, format: str = "full") -> str:
+    """
+    功能: 获取 Notion 页面的所有属性值和元数据。
+    
+    入参:
+        - page_id (str, 必填): 页面 ID。
+        - fields (list, 可选): 只返回这些属性（支持拼音/别名）。
+        - format (str, 可选): "full" 返回原始 JSON；"compact" 将每个属性扁平化为纯值并省略空值。
+    
+    参数结构: UUID 字符串，例如 "your_page_id_here"。
+    
+    返回: 页面详情的 JSON 字符串。
+    """
+    if format not in OUTPUT_FORMATS:
+        return OUTPUT_FORMAT_ERROR
+    status, page = notion_request("GET", f"pages/{page_id}")
+    return page_info_result(status, page, fields, format)
+
+@with_call_deadline
+def update_notion_page(page_id: str, properties: dict, database_id: str = None) -> str:
+    """
+    功能: 修改现有页面的属性值。
+    
+    入参:
+        - page_id (str, 必填): 页面 ID。
+        - properties (dict, 必填): 要更新的属性。支持拼音名和简单值。
+        - database_id (str, 可选): 页面所属数据库 ID。提供后可省去一次页面查询。
+    
+    参数结构:
+        - page_id: "your_page_id_here"
+        - properties: {"zhuang_tai": "已完成", "Priority": "High"}
+    
+    返回: 更新成功后的页面 URL。
+    """
+    return page_updated_result(*run_flow(update_page_flow(page_id, properties, database_id)))
+
+@with_call_deadline
+def append_page_content(page_id: str, content: str) -> str:
+    """
+    功能: 向页面内容末尾追加内容。支持 Markdown（标题、列表、待办、引用、代码块），长文本自动切分并分批提交。
+    
+    入参:
+        - page_id (str, 必填): 页面 ID。
+        - content (str, 必填): 要追加的文本或 Markdown 字符串，长度不限。
+    
+    参数结构:
+        - page_id: "your_page_id_here"
+        - content: "## 今日进展\n- 修复登录问题\n```python\nprint('ok')\n```"
+    
+    返回: 成功或失败的确认消息。开启写后台化时立即返回写入票据 JSON；page_id 也可以是建页返回的票据。
+    """
+    if write_queue.enabled:
+        return write_queue.submit("append", {"page_id": page_id, "content": content})
+    outcome = append_blocks(page_id, iter_markdown_blocks(content))
+    return page_appended_result(page_id, content, outcome)
+
+@with_call_deadline
+def update_database_properties(database_id: str = None, properties: dict = None) -> str:
+    """
+    功能: 修改数据库的架构，包括添加、重命名或删除列。
+    
+    入参:
+        - database_id (str, 可选): 数据库 ID。
+        - properties (dict, 必填): 描述属性变更的字典。
+    
+    参数结构:
+        - properties: {"新列名": {"rich_text": {}}, "旧列名": null}
+          (值为 null 时表示删除该列)
+    
+    返回: 成功后的数据库属性列表。
+    """
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    if not properties:
+        return "Error: No property changes provided."
+
+    status, result = notion_request("PATCH", f"databases/{db_id}", body={"properties": properties})
+    return schema_update_result(db_id, status, result)
+
+@with_call_deadline
+def upgrade_database_schema(database_id: str = None) -> str:
+    """
+    功能: 一键升级数据库架构，添加标准的“工作类型”和“状态”选择字段。
+    
+    入参:
+        - database_id (str, 可选): 数据库 ID。
+    
+    返回: 确认升级成功的消息。
+    """
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    status, result = notion_request("PATCH", f"databases/{db_id}", body={"properties": WORKLOG_SCHEMA_PROPERTIES})
+    return schema_update_result(db_id, status, result, upgraded=True)
+
+# ---------------------------------------------------------------------------
+# 异步工具：MCP 服务实际注册的版本，基于 AsyncNotionClient，互不依赖的请求并发执行。
+# ---------------------------------------------------------------------------
+
+def register_async_tool(sync_tool):
+    """将异步实现注册为 MCP 工具，沿用同步版本的工具名与说明文档。"""
+    def decorator(fn):
+        wrapped = with_profile(with_database(with_call_deadline(fn)))
+        mcp.tool(name=sync_tool.__name__, description=inspect.getdoc(sync_tool))(wrapped)
+        return wrapped
+    return decorator
+
+@register_async_tool(list_databases)
+async def list_databases_async(refresh: bool = False) -> str:
+    """list_databases 的异步版本。"""
+    status, error = await async_load_database_directory(force=refresh)
+    if error:
+        return error
+    return to_json(database_directory.databases)
+
+@register_async_tool(get_database_info)
+async def get_database_info_async(database_id: str = None, fields: list = None, format: str = "full") -> str:
+    """get_database_info 的异步版本。"""
+    if format not in OUTPUT_FORMATS:
+        return OUTPUT_FORMAT_ERROR
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    status, db = await async_get_database_schema(db_id)
+    return database_info_result(db_id, status, db, fields, format)
+
+@register_async_tool(get_database_properties)
+async def get_database_properties_async(database_id: str = None) -> str:
+    """get_database_properties 的异步版本。"""
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    status, db = await async_get_database_schema(db_id)
+    return database_properties_result(status, db)
+
+@register_async_tool(query_database)
+async def query_database_async(database_id: str = None, filter_params: dict = None, sorts: list = None,
+                               start_cursor: str = None, page_size: int = 100, max_results: int = 100,
+                               fields: list = None, format: str = "full", max_bytes: int = None) -> str:
+    """query_database 的异步版本。"""
+    if format not in OUTPUT_FORMATS:
+        return OUTPUT_FORMAT_ERROR
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    # Clean ID
+    db_id = db_id.strip().strip("<>").replace("-", "")
+
+    builder, limit = start_query(fields, format, max_bytes, start_cursor, max_results)
+    async for status, page in aiter_query_pages(db_id, filter_params, sorts, page_size, builder.page_cursor, limit,
+                                                cached=True):
+        if status != 200:
+            return status_error(status, page)
+        if not builder.add_page(page):
+            break
+
+    return dump_result(builder.result(), format)
+
+@register_async_tool(create_notion_page)
+async def create_notion_page_async(database_id: str = None, title: str = "", properties: dict = None, content: str = None) -> str:
+    """create_notion_page 的异步版本。"""
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+    if write_queue.enabled:
+        # 日志写入会 fsync，放到线程中执行，避免阻塞事件循环
+        return await asyncio.to_thread(
+            write_queue.submit, "create", {"database_id": db_id, "title": title, "properties": properties, "content": content}
+        )
+
+    return (await async_create_page(db_id, title, properties, content))[2]
+
+@register_async_tool(get_page_info)
+async def get_page_info_async(page_id: str, fields: list = None, format: str = "full") -> str:
+    """get_page_info 的异步版本。"""
+    if format not in OUTPUT_FORMATS:
+        return OUTPUT_FORMAT_ERROR
+    status, page = await async_notion_request("GET", f"pages/{page_id}")
+    return page_info_result(status, page, fields, format)
+
+@register_async_tool(update_notion_page)
+async def update_notion_page_async(page_id: str, properties: dict, database_id: str = None) -> str:
+    """update_notion_page 的异步版本：需要查询页面时，与默认数据库架构并发拉取。"""
+    _, default_db_id = load_env_vars()
+
+    # 大多数页面属于默认数据库：需要 GET 页面且架构未缓存时并发预取，之后的流程直接命中缓存
+    needs_page_get = not (database_id or page_parents.get(page_id) is not None)
+    if needs_page_get and default_db_id and schema_cache.get(default_db_id) is None:
+        await asyncio.gather(async_get_page_parent(page_id), async_get_database_schema(default_db_id))
+
+    outcome = await arun_flow(update_page_flow(page_id, properties, database_id))
+    return await asyncio.to_thread(page_updated_result, *outcome)
+
+@register_async_tool(append_page_content)
+async def append_page_content_async(page_id: str, content: str) -> str:
+    """append_page_content 的异步版本。"""
+    if write_queue.enabled:
+        return await asyncio.to_thread(write_queue.submit, "append", {"page_id": page_id, "content": content})
+    outcome = await async_append_blocks(page_id, iter_markdown_blocks(content))
+    return await asyncio.to_thread(page_appended_result, page_id, content, outcome)
+
+@register_async_tool(update_database_properties)
+async def update_database_properties_async(database_id: str = None, properties: dict = None) -> str:
+    """update_database_properties 的异步版本。"""
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    if not properties:
+        return "Error: No property changes provided."
+
+    status, result = await async_notion_request("PATCH", f"databases/{db_id}", body={"properties": properties})
+    return schema_update_result(db_id, status, result)
+
+@register_async_tool(upgrade_database_schema)
+async def upgrade_database_schema_async(database_id: str = None) -> str:
+    """upgrade_database_schema 的异步版本。"""
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    status, result = await async_notion_request("PATCH", f"databases/{db_id}", body={"properties": WORKLOG_SCHEMA_PROPERTIES})
+    return schema_update_result(db_id, status, result, upgraded=True)
+
+WRITE_JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS writes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    profile TEXT,
+    args TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress INTEGER NOT NULL DEFAULT 0,
+    page_id TEXT,
+    url TEXT,
+    message TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS writes_state ON writes (state, seq);
+"""
+WRITE_TICKET_PREFIX = "wb_"
+
+def is_retryable_write(status):
+    """429 与 503 表示请求确定未被处理，保留在队列中稍后重试；其余失败不再重试。"""
+    return status in RETRYABLE_WRITE_STATUS
+
+def is_uncertain_write(status):
+    """网络错误、超时与 503 以外的 5xx：请求可能已被 Notion 处理，重试可能重复建页或重复追加。"""
+    return status == 0 or (status >= 500 and not is_retryable_write(status))
+
+def uncertain_write_message(message):
+    return f"{message} (outcome unknown, not retried; check the page in Notion before resubmitting)"
+
+class WriteQueue:
+    """
+    持久化的写后台队列（SQLite 日志，WAL + synchronous=FULL，确认前已落盘）：
+    1. submit 记录写入并立即返回票据；后台线程严格按提交顺序提交，上游限流或 503 时队首退避重试，不会乱序；
+       重试次数或等待时长超过上限（NOTION_WRITE_MAX_ATTEMPTS / NOTION_WRITE_MAX_AGE）的队首写入标记为失败。
+       网络错误、超时、其余 5xx 或未预期的异常无法确定写入是否已生效，不重试，标记为失败并提示人工核对。
+    2. 同一页面（同一档案）的连续追加合并为一次 Block 流提交；追加按批记录进度，重试或重启后从断点继续。
+    3. 追加的 page_id 可以是尚未完成的建页票据，提交时解析为实际页面 ID。
+    4. 进程重启后未完成的写入自动重放。建页在“请求已发出、结果未落盘”时崩溃可能重复创建（至少一次语义）。
+    """
+
+    def __init__(self, path=None, enabled=None, batch=None, max_attempts=None, max_age=None):
+        self.path = path or NOTION_WRITE_JOURNAL_PATH
+        self._enabled = NOTION_WRITE_BEHIND if enabled is None else enabled
+        self.batch = batch or NOTION_WRITE_BATCH
+        self.max_attempts = max_attempts or NOTION_WRITE_MAX_ATTEMPTS
+        self.max_age = max_age or NOTION_WRITE_MAX_AGE
+        self._conn = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        """租户自带的 Token 不会写入磁盘日志，因此租户请求总是直接写入。"""
+        return self._enabled and not tenant_session()
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript(WRITE_JOURNAL_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return conn.execute(sql, params).fetchall()
+
+    def submit(self, kind, args):
+        """记录一次写入并唤醒后台线程，返回票据 JSON。"""
+        ticket = WRITE_TICKET_PREFIX + os.urandom(8).hex()
+        now = time.time()
+        self._execute(
+            "INSERT INTO writes (ticket, kind, profile, args, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (ticket, kind, _active_profile.get(), json_bytes(args).decode("utf-8"), now, now),
+        )
+        self.start()
+        self._wake.set()
+        pending = self._execute("SELECT COUNT(*) FROM writes WHERE state = 'pending'")[0][0]
+        return to_json({"queued": True, "ticket": ticket, "kind": kind, "pending": pending})
+
+    def start(self):
+        """启动后台提交线程（幂等）；启动时日志中遗留的未完成写入会被依次重放。"""
+        with self._lock:
+            if self._thread is not None:
+                return self._thread
+            self._thread = threading.Thread(target=self._run, name="notion-write-behind", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _run(self):
+        failures = 0
+        while True:
+            rows = self._execute(
+                "SELECT seq, ticket, kind, profile, args, attempts, progress, created_at FROM writes "
+                "WHERE state = 'pending' ORDER BY seq LIMIT ?", (self.batch,)
+            )
+            if not rows:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                retry = self._flush(rows)
+            except Exception as e:
+                # 未预期的异常不能让后台线程退出；请求可能已发出，队首条目标记为失败而不是重试
+                self._record(rows[0][1], "failed", uncertain_write_message(f"Error: {e}"), attempt=True)
+                retry = False
+            failures = failures + 1 if retry else 0
+            if retry:
+                time.sleep(min(NOTION_WRITE_RETRY_MAX, retry_delay(failures) + NOTION_BACKOFF_BASE))
+
+    def _record(self, ticket, state, message=None, page_id=None, url=None, attempt=False, progress=None):
+        self._execute(
+            "UPDATE writes SET state = ?, message = COALESCE(?, message), page_id = COALESCE(?, page_id), "
+            "url = COALESCE(?, url), attempts = attempts + ?, progress = COALESCE(?, progress), updated_at = ? "
+            "WHERE ticket = ?",
+            (state, message, page_id, url, int(attempt), progress, time.time(), ticket),
+        )
+
+    def _retry_or_fail(self, tickets, message, attempts, created_at):
+        """
+        队首写入遇到暂时性故障：未超过重试上限时保持 pending 并返回 True（退避后重试）；
+        否则将 tickets 全部标记为失败并返回 False，队列继续处理后续写入。
+        """
+        attempts += 1
+        if attempts < self.max_attempts and time.time() - created_at < self.max_age:
+            self._record(tickets[0], "pending", message, attempt=True)
+            return True
+        message = f"{message} (gave up after {attempts} attempts)"
+        for ticket in tickets:
+            self._record(ticket, "failed", message, attempt=ticket == tickets[0])
+        return False
+
+    def _resolve_page(self, page_id):
+        """将建页票据解析为实际页面 ID，返回 (page_id, error)。"""
+        if not page_id.startswith(WRITE_TICKET_PREFIX):
+            return page_id, None
+        rows = self._execute("SELECT state, page_id FROM writes WHERE ticket = ? AND kind = 'create'", (page_id,))
+        if not rows:
+            return None, f"Error: Unknown write ticket {page_id}."
+        state, resolved = rows[0]
+        if state != "done" or not resolved:
+            return None, f"Error: Page creation {page_id} did not succeed."
+        return resolved, None
+
+    def _flush(self, rows):
+        """提交队首的一组写入；返回 True 表示遇到暂时性故障、需要退避后重试。"""
+        seq, ticket, kind, profile, args, attempts, progress, created_at = rows[0]
+        args = json_loads(args)
+        with use_profile(profile), call_deadline():
+            if kind == "create":
+                status, created, message = create_page(
+                    args["database_id"], args.get("title", ""), args.get("properties"), args.get("content")
+                )
+                if status in (200, 201):
+                    self._record(ticket, "done", message, page_id=created["id"], url=created.get("url"), attempt=True)
+                    return False
+                if is_retryable_write(status):
+                    return self._retry_or_fail([ticket], message, attempts, created_at)
+                if is_uncertain_write(status):
+                    message = uncertain_write_message(message)
+                self._record(ticket, "failed", message, attempt=True)
+                return False
+
+            page_id, error = self._resolve_page(args["page_id"])
+            if error:
+                self._record(ticket, "failed", error, attempt=True)
+                return False
+
+            # 合并同一页面、同一档案的连续追加
+            group = [(ticket, args["content"])]
+            for _, next_ticket, next_kind, next_profile, next_args, *_ in rows[1:]:
+                next_args = json_loads(next_args)
+                if next_kind != "append" or next_profile != profile or next_args["page_id"] != args["page_id"]:
+                    break
+                group.append((next_ticket, next_args["content"]))
+            return self._flush_appends(page_id, group, progress, attempts, created_at)
+
+    def _flush_appends(self, page_id, group, progress, attempts, created_at):
+        """
+        按批追加一组正文，每批成功后把进度记到组首条目，崩溃或重试时跳过已追加的 Block。
+        放弃重试或结果未知时整组标记为失败：进度是整组 Block 流的偏移，单独重放组内后续条目可能重复追加。
+        """
+        head = group[0][0]
+        blocks = (block for _, content in group for block in iter_markdown_blocks(content))
+        remaining = (block for index, block in enumerate(blocks) if index >= progress)
+        appended = progress
+        status, result = 200, {}
+        try:
+            for batch in iter_block_batches(remaining):
+                status, result = notion_request("PATCH", f"blocks/{page_id}/children", body={"children": batch})
+                if status != 200:
+                    break
+                appended += len(batch)
+                self._record(head, "pending", progress=appended)
+        except Exception as e:
+            status, result = 0, {"message": str(e)}
+        block_cache.invalidate(page_id)
+
+        if status != 200:
+            tickets = [ticket for ticket, _ in group]
+            message = f"Error after appending {appended} blocks: {to_json(result)}"
+            if is_retryable_write(status):
+                return self._retry_or_fail(tickets, message, attempts, created_at)
+            if is_uncertain_write(status):
+                message = uncertain_write_message(message)
+                for ticket in tickets:
+                    self._record(ticket, "failed", message, attempt=ticket == head)
+                return False
+            self._record(head, "failed", message, attempt=True)
+            return False
+
+        for ticket, content in group:
+            index_appended_content(page_id, content)
+            self._record(ticket, "done", "Content appended to page successfully.", page_id=page_id, attempt=ticket == head)
+        return False
+
+    def status(self, ticket=None, limit=20):
+        """指定票据时返回该条写入的状态；否则返回各状态计数、最早未完成写入的等待时长与最近的失败。"""
+        columns = "ticket, kind, state, attempts, page_id, url, message, created_at, updated_at"
+        keys = columns.split(", ")
+        if ticket:
+            rows = self._execute(f"SELECT {columns} FROM writes WHERE ticket = ?", (ticket,))
+            return dict(zip(keys, rows[0])) if rows else None
+        counts = dict(self._execute("SELECT state, COUNT(*) FROM writes GROUP BY state"))
+        oldest = self._execute("SELECT MIN(created_at) FROM writes WHERE state = 'pending'")[0][0]
+        head = self._execute(f"SELECT {columns} FROM writes WHERE state = 'pending' ORDER BY seq LIMIT 1")
+        failed = self._execute(f"SELECT {columns} FROM writes WHERE state = 'failed' ORDER BY seq DESC LIMIT ?", (limit,))
+        return {
+            "enabled": self.enabled,
+            "counts": {state: counts.get(state, 0) for state in ("pending", "done", "failed")},
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+            "head": dict(zip(keys, head[0])) if head else None,
+            "recent_failures": [dict(zip(keys, row)) for row in failed],
+        }
+
+write_queue = WriteQueue()
+
+def start_background_workers():
+    """服务启动时调用：定期写出指标文件，开启写后台化时重放日志中遗留的写入。"""
+    start_metrics_dump()
+    if write_queue.enabled:
+        write_queue.start()
+
+def bulk_deadline(count):
+    """批量工具的总时限：在单次调用时限基础上，按限流速率为每条写入预留时间。"""
+    return NOTION_CALL_DEADLINE + count / NOTION_RATE_LIMIT
+
+async def run_bounded(jobs, concurrency=None):
+    """以有限并发执行一组协程工厂，按输入顺序返回结果。"""
+    semaphore = asyncio.Semaphore(concurrency or NOTION_BULK_CONCURRENCY)
+
+    async def run(job):
+        async with semaphore:
+            return await job()
+
+    return await asyncio.gather(*(run(job) for job in jobs))
 
 @mcp.tool()
-def get_database_info(database_id: str = None) -> str:
+@with_profile
+@with_database
+async def create_notion_pages(database_id: str = None, items: list = None) -> str:
     """
-    功能: 获取 Notion 数据库的完整元数据，包括标题、架构(Schema)和属性定义。
+    功能: 在指定数据库中批量创建页面。架构只获取一次，所有条目共享同一属性解析器，写入请求在限流下有限并发执行。
     
     入参:
-        - database_id (str, 可选): Notion 数据库 ID。若不填则使用配置的默认 ID。
+        - database_id (str, 可选): 数据库 ID。
+        - items (list, 必填): 待创建的条目列表，每项结构同 create_notion_page 的参数。
     
-    参数结构: 字符串形式的 UUID，例如 "your_database_id_here"。
+    参数结构:
+        - items: [
+            {"title": "优化用户登录页面", "properties": {"zhuang_tai": "已完成"}, "content": "修复了CSS兼容性问题..."},
+            {"title": "接口联调"}
+          ]
+          (条目也可以直接是标题字符串)
     
-    返回: 数据库详情的 JSON 字符串，包含属性名、类型及选项等信息。
+    返回: JSON 汇总，包含成功/失败数量及每个条目的 success、url 或 error。
     """
-    _, default_db_id = load_env_vars()
-    db_id = database_id or default_db_id
+    db_id = target_database(database_id)
     if not db_id:
-        return "错误: 未提供 database_id 且未发现默认配置。"
+        return MISSING_DATABASE_ERROR
+    if not items:
+        return "Error: No items provided."
 
-    status, db = notion_request("GET", f"databases/{db_id}")
-    if status != 200:
-        return f"错误 (状态码 {status})，数据库 ID: {mask_id(db_id)}。请检查集成权限。"
-    return json.dumps(db, indent=2, ensure_ascii=False)
+    items = [{"title": item} if isinstance(item, str) else (item or {}) for item in items]
+
+    with call_deadline(bulk_deadline(len(items))):
+        results = [None] * len(items)
+        pending = list(range(len(items)))
+
+        # 写入失败且疑似架构过期时，刷新一次架构后重试这些条目
+        for attempt in range(2):
+            status_db, db_meta = await async_get_database_schema(db_id, force_refresh=attempt > 0)
+            if status_db != 200:
+                return metadata_error(db_meta)
+            db_props = db_meta.get("properties", {})
+
+            payloads = {}
+            for index in pending:
+                item = items[index]
+                payload, error = build_page_payload(
+                    db_id, db_props, item.get("title", ""), item.get("properties"), item.get("content")
+                )
+                if error:
+                    results[index] = {"index": index, "success": False, "error": error}
+                else:
+                    payloads[index] = payload
+
+            def make_job(payload):
+                async def job():
+                    extra_blocks = split_initial_children(payload)
+                    status, created = await async_notion_request("POST", "pages", body=payload)
+                    # 超出创建请求上限的正文 Block 在创建后分批追加
+                    if status in (200, 201) and extra_blocks:
+                        append_status, append_result, _, _ = await async_append_blocks(created["id"], extra_blocks)
+                        if append_status != 200:
+                            created = dict(created, append_error=append_result)
+                    return status, created
+                return job
+
+            responses = await run_bounded([make_job(payload) for payload in payloads.values()])
+
+            stale, indexed = [], []
+            for index, (status, created) in zip(payloads, responses):
+                if status in (200, 201):
+                    remember_page_parent(created)
+                    indexed.append((created, items[index].get("content")))
+                    results[index] = {"index": index, "success": True, "url": created.get("url"), "id": created.get("id")}
+                elif attempt == 0 and is_stale_schema_error(status, created):
+                    stale.append(index)
+                else:
+                    results[index] = {"index": index, "success": False, "status": status, "error": created}
+            if indexed:
+                invalidate_database_queries(db_id)
+            await asyncio.to_thread(
+                index_pages, [page for page, _ in indexed], {page["id"]: content or "" for page, content in indexed}
+            )
+            if not stale:
+                break
+            pending = stale
+
+    created_count = sum(1 for r in results if r["success"])
+    summary = {"created": created_count, "failed": len(results) - created_count, "results": results}
+    return to_json(summary)
 
 @mcp.tool()
-def get_database_properties(database_id: str = None) -> str:
+@with_profile
+@with_database
+async def update_notion_pages(updates: list, database_id: str = None) -> str:
     """
-    功能: 仅检索数据库的属性定义（列信息），用于了解有哪些字段可以操作。
+    功能: 批量修改多个页面的属性值。复用页面->数据库映射与架构缓存，按数据库分组归一化属性后并发提交。
     
     入参:
-        - database_id (str, 可选): 数据库 ID。
+        - updates (list, 必填): 待更新条目，每项包含 page_id、properties，可选 database_id。
+        - database_id (str, 可选): 所有页面共同所属的数据库 ID（条目内的 database_id 优先）。提供后可省去页面查询。
     
-    参数结构: 字符串，例如 "your_database_id_here"。
+    参数结构:
+        - updates: [
+            {"page_id": "your_page_id_here", "properties": {"zhuang_tai": "已完成"}},
+            {"page_id": "another_page_id", "properties": {"Priority": "High"}}
+          ]
     
-    返回: 属性架构的 JSON 字符串，显示每个属性的名称、ID 和类型（如 select, multi_select）。
+    返回: JSON 汇总，包含成功/失败数量及每个页面的 success、url 或 error。
     """
-    _, default_db_id = load_env_vars()
-    db_id = database_id or default_db_id
-    if not db_id:
-        return "Error: No database_id provided and no default DATABASE_ID found."
+    if not updates:
+        return "Error: No updates provided."
+
+    results = [None] * len(updates)
+    pending = []
+    for index, update in enumerate(updates):
+        if not isinstance(update, dict) or not update.get("page_id") or not isinstance(update.get("properties"), dict):
+            results[index] = {"index": index, "success": False, "error": "Each update needs page_id and properties."}
+        else:
+            pending.append(index)
+
+    with call_deadline(bulk_deadline(len(updates))):
+        # 写入失败且疑似架构过期时，强制刷新页面父级与架构后重试这些条目
+        for attempt in range(2):
+            force = attempt > 0
+
+            # 1. 解析每个页面所属数据库（命中提示或缓存时不发请求）
+            def make_parent_job(update):
+                hint = update.get("database_id") or database_id
+                return lambda: async_get_page_parent(update["page_id"], hint, force_refresh=force)
+
+            parents = await run_bounded([make_parent_job(updates[index]) for index in pending])
+
+            groups = {}
+            for index, (status_page, parent) in zip(pending, parents):
+                if status_page != 200:
+                    results[index] = {"index": index, "page_id": updates[index]["page_id"], "success": False,
+                                      "status": status_page, "error": parent}
+                else:
+                    groups.setdefault(parent, []).append(index)
+
+            # 2. 按数据库分组，并发获取架构后批量归一化属性
+            db_ids = [db_id for db_id in groups if db_id]
+            schemas = await asyncio.gather(*(async_get_database_schema(db_id, force_refresh=force) for db_id in db_ids))
+            payloads = {}
+            for db_id, indices in groups.items():
+                raw = [updates[index]["properties"] for index in indices]
+                status_db, db_meta = schemas[db_ids.index(db_id)] if db_id else (None, None)
+                if status_db == 200:
+                    normalized = normalize_properties_batch(db_id, raw, db_props=db_meta.get("properties", {}))
+                else:
+                    # 非数据库页面或架构获取失败时，直接使用原始属性
+                    normalized = raw
+                for index, props in zip(indices, normalized):
+                    payloads[index] = (db_id, {"properties": props})
 
-    status, db = notion_request("GET", f"databases/{db_id}")
+            # 3. 有限并发提交 PATCH
+            def make_patch_job(index, payload):
+                return lambda: async_notion_request("PATCH", f"pages/{updates[index]['page_id']}", body=payload)
+
+            order = list(payloads)
+            responses = await run_bounded([make_patch_job(index, payloads[index][1]) for index in order])
+
+            stale, indexed, written = [], [], set()
+            for index, (status, updated) in zip(order, responses):
+                page_id = updates[index]["page_id"]
+                if status in (200, 201):
+                    indexed.append(updated)
+                    written.add(payloads[index][0])
+                    results[index] = {"index": index, "page_id": page_id, "success": True, "url": updated.get("url")}
+                elif attempt == 0 and payloads[index][0] and is_stale_schema_error(status, updated):
+                    stale.append(index)
+                else:
+                    results[index] = {"index": index, "page_id": page_id, "success": False, "status": status, "error": updated}
+            for written_db in written:
+                invalidate_database_queries(written_db)
+            await asyncio.to_thread(index_pages, indexed)
+            if not stale:
+                break
+            pending = stale
+
+    updated_count = sum(1 for r in results if r["success"])
+    summary = {"updated": updated_count, "failed": len(results) - updated_count, "results": results}
+    return to_json(summary)
+
+async def fetch_page_text(page_id):
+    """读取页面顶层 Block（首批 100 个）的纯文本，供检索索引使用；失败时返回 None。"""
+    status, result = await async_notion_request("GET", f"blocks/{page_id}/children?page_size={NOTION_BLOCK_BATCH}")
     if status != 200:
-        return f"Error (Status {status}): {json.dumps(db, indent=2, ensure_ascii=False)}"
-    return json.dumps(db.get("properties", {}), indent=2, ensure_ascii=False)
+        return None
+    return "\n".join(text for text in map(block_plain_text, result.get("results", [])) if text)
+
+# 页面正文的输出格式
+CONTENT_FORMATS = ("markdown", "text")
+LIST_BLOCK_TYPES = {"bulleted_list_item", "numbered_list_item", "to_do"}
+MARKDOWN_PREFIXES = {
+    "heading_1": "# ", "heading_2": "## ", "heading_3": "### ",
+    "bulleted_list_item": "- ", "toggle": "- ", "quote": "> ", "callout": "> ",
+}
+MEDIA_BLOCK_TYPES = {"image", "file", "pdf", "video", "audio"}
+LINK_BLOCK_TYPES = {"bookmark", "embed", "link_preview"}
+
+def rich_text_markdown(rich_text):
+    """将 rich_text 数组转换为 Markdown：保留粗体、斜体、删除线、行内代码、公式与链接。"""
+    parts = []
+    for item in rich_text or []:
+        text = item.get("plain_text") or item.get("text", {}).get("content", "")
+        if not text:
+            continue
+        if item.get("type") == "equation":
+            parts.append(f"${text}$")
+            continue
+        annotations = item.get("annotations") or {}
+        if annotations.get("code"):
+            text = f"`{text}`"
+        if annotations.get("bold"):
+            text = f"**{text}**"
+        if annotations.get("italic"):
+            text = f"*{text}*"
+        if annotations.get("strikethrough"):
+            text = f"~~{text}~~"
+        if item.get("href"):
+            text = f"[{text}]({item['href']})"
+        parts.append(text)
+    return "".join(parts)
+
+def render_block(block, fmt, number=1):
+    """渲染单个 Block（不含子级）为 Markdown 或纯文本。"""
+    kind = block.get("type")
+    data = block.get(kind) or {}
+    markdown = fmt == "markdown"
+    text = (rich_text_markdown if markdown else plain_text)(data.get("rich_text"))
+
+    if kind in ("child_page", "child_database"):
+        return f"📄 {data.get('title', '')}" if markdown else data.get("title", "")
+    if kind == "equation":
+        return f"$$\n{data.get('expression', '')}\n$$" if markdown else data.get("expression", "")
+    if kind in MEDIA_BLOCK_TYPES or kind in LINK_BLOCK_TYPES:
+        url = data.get("url") or (data.get(data.get("type")) or {}).get("url", "")
+        caption = plain_text(data.get("caption"))
+        if not markdown:
+            return caption or url
+        return f"![{caption}]({url})" if kind == "image" else f"[{caption or url}]({url})"
+    if not markdown:
+        return text
+
+    if kind == "code":
+        return f"```{data.get('language', '')}\n{plain_text(data.get('rich_text'))}\n```"
+    if kind == "divider":
+        return "---"
+    if kind == "to_do":
+        return ("- [x] " if data.get("checked") else "- [ ] ") + text
+    if kind == "numbered_list_item":
+        return f"{number}. {text}"
+    if kind == "callout":
+        text = ((data.get("icon") or {}).get("emoji", "") + " " + text).strip()
+    prefix = MARKDOWN_PREFIXES.get(kind, "")
+    if prefix.startswith(">"):
+        return "\n".join(prefix + line for line in text.split("\n"))
+    return prefix + text
+
+def render_table(node, fmt):
+    """渲染表格 Block：Markdown 下以首行为表头，纯文本下单元格以制表符分隔。"""
+    rows = []
+    for child in node.get("children") or []:
+        cells = child["block"].get("table_row", {}).get("cells", [])
+        if fmt == "markdown":
+            rows.append("| " + " | ".join(rich_text_markdown(cell).replace("|", "\\|") for cell in cells) + " |")
+            if len(rows) == 1:
+                rows.append("|" + " --- |" * len(cells))
+        else:
+            rows.append("\t".join(plain_text(cell) for cell in cells))
+    return "\n".join(rows)
+
+def iter_rendered_blocks(nodes, fmt, max_depth, level=0):
+    """按文档顺序流式渲染 Block 树（最多 max_depth 层），逐段 yield 文本；子级按层级缩进。"""
+    indent = "  " * level
+    previous, number = None, 0
+    for node in nodes:
+        block = node["block"]
+        kind = block.get("type")
+        number = number + 1 if kind == "numbered_list_item" and previous == kind else 1
+        if previous is not None:
+            yield "\n" if level or (kind in LIST_BLOCK_TYPES and previous in LIST_BLOCK_TYPES) else "\n\n"
+        chunk = render_table(node, fmt) if kind == "table" else render_block(block, fmt, number)
+        yield "\n".join(indent + line if line else line for line in chunk.split("\n"))
+        if node.get("children") and kind != "table" and level + 1 < max_depth:
+            yield "\n"
+            yield from iter_rendered_blocks(node["children"], fmt, max_depth, level + 1)
+        previous = kind
+
+def take_bytes(chunks, max_bytes):
+    """拼接文本片段，超过 max_bytes（UTF-8 字节）时截断；返回 (text, truncated)。"""
+    parts, used = [], 0
+    for chunk in chunks:
+        encoded = chunk.encode("utf-8")
+        if used + len(encoded) > max_bytes:
+            parts.append(encoded[:max_bytes - used].decode("utf-8", errors="ignore"))
+            return "".join(parts), True
+        parts.append(chunk)
+        used += len(encoded)
+    return "".join(parts), False
+
+class BlockTreeReader:
+    """
+    并发读取页面的 Block 树：
+    1. 每个 Block 的子级按游标分页读取；兄弟子树并发展开，同时在途的请求数不超过 concurrency。
+    2. 子树按 last_edited_time 命中 block_cache 时不再请求。
+    3. 已读取的文本量超过 max_bytes 后不再发起新请求，未读完的子树不写入缓存。
+    """
+
+    def __init__(self, max_depth, max_bytes, concurrency=None):
+        self.max_depth = max_depth
+        self.budget = max_bytes
+        self.semaphore = asyncio.Semaphore(concurrency or NOTION_BULK_CONCURRENCY)
+        self.requests = 0
+        self.errors = []
+
+    async def list_children(self, block_id):
+        """分页读取全部直接子级，返回 (status, blocks 或错误详情, 是否读完)。"""
+        blocks, cursor = [], None
+        while self.budget > 0:
+            path = f"blocks/{block_id}/children?page_size={NOTION_MAX_PAGE_SIZE}"
+            if cursor:
+                path += f"&start_cursor={cursor}"
+            async with self.semaphore:
+                status, page = await async_notion_request("GET", path)
+            self.requests += 1
+            if status != 200:
+                return status, page, False
+            for block in page.get("results", []):
+                blocks.append(block)
+                self.budget -= len(block_plain_text(block).encode("utf-8")) + 1
+            cursor = page.get("next_cursor")
+            if not page.get("has_more") or not cursor:
+                return 200, blocks, True
+        return 200, blocks, False
+
+    async def read(self, block_id, edited=None, depth=None):
+        """读取 block_id 之下 depth 层的子树，返回 (status, nodes 或错误详情)；nodes 为 [{"block", "children"}]。"""
+        depth = self.max_depth if depth is None else depth
+        cached = block_cache.get(block_id, edited, depth)
+        if cached is not None:
+            return 200, cached
+
+        status, blocks, complete = await self.list_children(block_id)
+        if status != 200:
+            return status, blocks
+
+        expand = [block for block in blocks if block.get("has_children") and depth > 1]
+        subtrees = await asyncio.gather(*(self.read(block["id"], block.get("last_edited_time"), depth - 1) for block in expand))
+        children = {}
+        for block, (child_status, child_nodes) in zip(expand, subtrees):
+            if child_status == 200:
+                children[block["id"]] = child_nodes
+            else:
+                complete = False
+                self.errors.append({"block_id": block["id"], "status": child_status, "error": child_nodes})
+
+        nodes = [{"block": block, "children": children.get(block["id"])} for block in blocks]
+        if complete and self.budget > 0:
+            block_cache.put(block_id, edited, depth, nodes)
+        return 200, nodes
 
 @mcp.tool()
-def query_database(database_id: str = None, filter_params: dict = None) -> str:
+@with_profile
+async def get_page_content(page_id: str, format: str = "markdown", max_depth: int = 3, max_bytes: int = 100000) -> str:
     """
-    功能: 根据特定条件筛选并查询数据库中的页面。
+    功能: 读取页面正文（Block 树）并渲染为 Markdown 或纯文本。子级分页读取、兄弟子树并发展开，
+         并按 last_edited_time 缓存已读取的子树，页面未修改时只需一次请求。
     
     入参:
-        - database_id (str, 可选): 目标数据库 ID。
-        - filter_params (dict, 可选): Notion 标准查询对象。
+        - page_id (str, 必填): 页面 ID。
+        - format (str, 可选): "markdown"（默认，保留标题、列表、待办、代码块、表格与行内样式）或 "text"（纯文本）。
+        - max_depth (int, 可选): 最多展开的嵌套层数，默认 3；1 表示只读取顶层 Block。
+        - max_bytes (int, 可选): 输出正文的最大字节数（UTF-8），默认 100000；超出后停止读取并截断。
     
-    参数结构:
-        - database_id: "your_database_id_here"
-        - filter_params: {"property": "状态", "select": {"equals": "已完成"}}
-          注：属性名支持拼音，如 {"property": "zhuang_tai", ...}
+    参数结构: page_id 为 UUID 字符串，例如 "your_page_id_here"。
     
-    返回: 匹配页面的列表 JSON，包含页面 ID、属性摘要及 URL。
+    返回: JSON，包含 title、content（渲染后的正文）、truncated（是否因 max_bytes 截断）、blocks（读取的 Block 数）
+         与 requests（本次发起的请求数）；部分子树读取失败时附带 errors。
     """
-    _, default_db_id = load_env_vars()
-    db_id = database_id or default_db_id
-    if not db_id:
-        return "Error: No database_id provided."
+    if format not in CONTENT_FORMATS:
+        return f"Error: format must be one of {', '.join(CONTENT_FORMATS)}."
+    max_depth, max_bytes = max(1, max_depth), max(1, max_bytes)
 
-    # Clean ID
-    db_id = db_id.strip().strip("<>").replace("-", "")
-    
-    body = {}
-    if filter_params:
-        body["filter"] = filter_params
-        
-    status, results = notion_request("POST", f"databases/{db_id}/query", body=body)
+    status, page = await async_notion_request("GET", f"pages/{page_id}")
+    if status != 200:
+        return f"Error: {to_json(page)}"
+    remember_page_parent(page)
+
+    reader = BlockTreeReader(max_depth, max_bytes)
+    status, nodes = await reader.read(page_id, page.get("last_edited_time"))
     if status != 200:
-        return f"Error (Status {status}): {json.dumps(results, indent=2, ensure_ascii=False)}"
-    return json.dumps(results, indent=2, ensure_ascii=False)
+        return f"Error fetching page content: {to_json(nodes)}"
+
+    content, truncated = take_bytes(iter_rendered_blocks(nodes, format, max_depth), max_bytes)
+    title = next((plain_text(value) for ptype, value in map(property_value, page.get("properties", {}).values())
+                  if ptype == "title"), "")
+
+    def count(nodes):
+        return sum(1 + count(node.get("children") or []) for node in nodes)
+
+    result = {
+        "id": page.get("id"),
+        "title": title,
+        "format": format,
+        "content": content,
+        "truncated": truncated or reader.budget <= 0,
+        "blocks": count(nodes),
+        "requests": reader.requests + 1,
+    }
+    if reader.errors:
+        result["errors"] = reader.errors
+    return to_json(result)
 
 @mcp.tool()
-def create_notion_page(database_id: str = None, title: str = "", properties: dict = None, content: str = None) -> str:
+@with_profile
+@with_database
+async def aggregate_database(database_id: str = None, group_by: list = None, date_bucket: str = "day",
+                             filter_params: dict = None, limit: int = 100) -> str:
     """
-    功能: 在指定数据库中创建一个新页面。
+    功能: 在服务端流式遍历数据库查询结果并分组计数，只返回汇总表，适合“本周每种工作类型各有多少条”这类统计。
     
     入参:
         - database_id (str, 可选): 数据库 ID。
-        - title (str, 必填): 页面标题。
-        - properties (dict, 可选): 其他属性键值对。支持拼音映射和简单值自动包装。
-        - content (str, 可选): 写入页面正文的内容。
+        - group_by (list, 可选): 分组属性名（支持拼音/别名），可多个组合；支持 select、status、multi_select、checkbox、
+          日期类属性，以及页面的 created_time / last_edited_time。不传时只统计总数。
+        - date_bucket (str, 可选): 日期类分组的粒度，"day"、"week"（以周一日期表示）、"month" 或 "year"，默认 "day"。
+        - filter_params (dict, 可选): 与 query_database 相同的 Notion 标准查询对象，先过滤再统计。
+        - limit (int, 可选): 最多返回的分组数，默认 100；传 0 返回全部。
     
     参数结构:
-        - title: "优化用户登录页面"
-        - properties: {"zhuang_tai": "已完成", "gong_zuo_lei_xing": "💻 vue后台web端"}
-          (属性名会自动映射到“状态”、“工作类型”，字符串值会自动包装为对应的 select 或 rich_text 结构)
-        - content: "修复了CSS兼容性问题..."
+        - group_by: ["工作类型"] 或 ["记录时间", "状态"]
+        - filter_params: {"property": "记录时间", "date": {"this_week": {}}}
     
-    返回: 成功时返回新页面的 URL，失败返回错误信息。
+    返回: JSON 汇总，包含 total（匹配的行数）、group_count 与 groups（每组的分组值与 count）。
     """
-    _, default_db_id = load_env_vars()
-    db_id = database_id or default_db_id
+    db_id = target_database(database_id)
     if not db_id:
-        return "Error: No database_id provided."
+        return MISSING_DATABASE_ERROR
+    if date_bucket not in AGGREGATE_BUCKETS:
+        return f"Error: date_bucket must be one of {', '.join(AGGREGATE_BUCKETS)}."
 
-    # 1. 实时获取数据库最新架构 (核心优化：确保每次操作前同步最新列名)
-    status_db, db_meta = notion_request("GET", f"databases/{db_id}")
+    status_db, db_meta = await async_get_database_schema(db_id)
     if status_db != 200:
-        return f"Error fetching database metadata: {json.dumps(db_meta)}"
-    
-    db_props_meta = db_meta.get("properties", {})
-    
-    # 2. 归一化输入属性 (透传实时获取的 db_props_meta)
-    normalized_input = normalize_properties(db_id, properties or {}, db_props=db_props_meta)
-    
-    # 3. 构造最终属性 payload
-    payload_props = {}
-    
-    # 寻找标题属性名称
-    title_prop_name = next((name for name, spec in db_props_meta.items() if spec.get("type") == "title"), "Name")
-    
-    # 处理标题：优先从归一化属性中提取，其次使用 title 参数
-    if title_prop_name in normalized_input:
-        payload_props[title_prop_name] = normalized_input.pop(title_prop_name)
-    elif title:
-        payload_props[title_prop_name] = {"title": [{"text": {"content": title}}]}
-    
-    # 处理正文 (Content)：优先寻找名字匹配的属性，其次作为正文 Block
-    content_placed_in_prop = False
-    if content:
-        # 定义内容属性可能的候选名 (根据属性名来放内容)
-        content_keywords = ["内容", "正文", "描述", "备注", "summary", "content", "description", "note", "detail"]
-        
-        # 1. 尝试在数据库中寻找匹配这些关键词的 rich_text 属性
-        target_content_prop = next((name for name, spec in db_props_meta.items() 
-                                   if spec.get("type") == "rich_text" and 
-                                   any(kw in name.lower() or kw in "".join(pypinyin.lazy_pinyin(name.lower())) for kw in content_keywords)), None)
-        
-        if target_content_prop and target_content_prop not in normalized_input:
-            payload_props[target_content_prop] = {"rich_text": [{"text": {"content": content}}]}
-            content_placed_in_prop = True
+        return metadata_error(db_meta)
+    db_props = db_meta.get("properties", {})
+    resolver = get_property_resolver(db_props)
 
-    # 4. 自动填充辅助属性 (如果数据库支持且未手动提供)
-    
-    # 记录时间 (智能寻找日期属性)
-    date_prop = next((name for name, spec in db_props_meta.items() if spec.get("type") == "date"), None)
-    if date_prop and date_prop not in payload_props and date_prop not in normalized_input:
-        payload_props[date_prop] = {"date": {"start": get_now_str()}}
-    
-    # 智能预测工作类型 (如果未手动提供)
-    select_props = [name for name, spec in db_props_meta.items() if spec.get("type") == "select"]
-    work_type_prop = next((name for name in select_props if any(kw in name.lower() or kw in "".join(pypinyin.lazy_pinyin(name.lower())) for kw in ["type", "类型"])), None)
-    
-    if work_type_prop and work_type_prop not in normalized_input:
-        predicted = infer_work_type(title, content, db_props_meta)
-        if predicted:
-            payload_props[work_type_prop] = {"select": {"name": predicted}}
-    
-    # 5. 合并剩余属性
-    payload_props.update(normalized_input)
-    
-    # 最终检查：移除任何可能导致 Notion 报错的空值或不规范键
-    final_props = {k: v for k, v in payload_props.items() if k in db_props_meta}
-    
-    # 确保标题存在 (兜底)
-    if title_prop_name not in final_props:
-        if title:
-            final_props[title_prop_name] = {"title": [{"text": {"content": title}}]}
-        elif properties:
-             first_val = list(properties.values())[0]
-             final_props[title_prop_name] = {"title": [{"text": {"content": str(first_val)}}]}
-        else:
-             return f"Error: Title property ('{title_prop_name}') is mandatory."
+    names = []
+    for key in group_by or []:
+        name = key if key in PAGE_TIMESTAMPS else resolver.resolve(key)
+        if name is None:
+            return f"Error: Unknown property {to_json(key)}. Available: {', '.join(db_props)}"
+        names.append(name)
 
-    payload = {
-        "parent": {"database_id": db_id},
-        "properties": final_props
-    }
+    prop_types = {name: db_props[name].get("type") for name in names if name in db_props}
+    counter = GroupCounter(names, prop_types, date_bucket)
+    with call_deadline(NOTION_CALL_DEADLINE * 10):
+        async for status, page in aiter_query_pages(db_id, filter_params, cached=True):
+            if status != 200:
+                return f"Error (Status {status}) after scanning {counter.total} pages: {to_json(page)}"
+            for item in page.get("results", []):
+                counter.add_page(item)
 
-    # 如果 content 没有被放入属性，则作为正文 Block 插入
-    if content and not content_placed_in_prop:
-        payload["children"] = [
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [{"type": "text", "text": {"content": content}}]
-                }
-            }
-        ]
-    
-    status, created = notion_request("POST", "pages", body=payload)
-    if status not in (200, 201):
-        return f"Error: {json.dumps(created, indent=2, ensure_ascii=False)}"
-    
-    return f"Page created successfully with content: {created.get('url')}"
+    summary = {"database_id": db_id, "group_by": names, **counter.result(limit)}
+    if counter.date_fields:
+        summary["date_bucket"] = date_bucket
+    return to_json(summary)
+
+def prepare_resolver(db_props):
+    """加载拼音词典并为架构编译属性解析器（CPU 密集，预热时在线程中执行）。"""
+    get_pinyin("预热")
+    if db_props:
+        get_property_resolver(db_props)
+
+async def warm_up():
+    """预热默认档案：建立异步连接池、拉取默认数据库架构与数据库目录并编译解析器，使首次工具调用不必承担冷启动开销。"""
+    token, db_id = load_env_vars()
+    db_props = None
+    if token:
+        with call_deadline():
+            directory = asyncio.ensure_future(async_load_database_directory())
+            if db_id:
+                status, db = await async_get_database_schema(db_id)
+                if status == 200:
+                    db_props = db.get("properties", {})
+                else:
+                    print(f"⚠️ 警告: 预热数据库架构失败 ({mask_id(db_id)}): {to_json(db)}", file=sys.stderr)
+            _, error = await directory
+        if error:
+            print(f"⚠️ 警告: 预热数据库目录失败: {error}", file=sys.stderr)
+    await asyncio.to_thread(prepare_resolver, db_props)
+
+class WarmupMiddleware(Middleware):
+    """首个客户端完成 initialize 握手后，在后台启动一次 warm_up（不阻塞握手响应）。"""
+
+    def __init__(self):
+        self.task = None
+
+    async def on_initialize(self, context, call_next):
+        result = await call_next(context)
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(warm_up())
+        return result
+
+if NOTION_WARMUP:
+    mcp.add_middleware(WarmupMiddleware())
+
+class TenantMiddleware(Middleware):
+    """
+    HTTP/SSE 传输下的多租户：请求头 X-Notion-Token（及可选的 X-Notion-Database-Id）指定本次调用使用的集成 Token 与默认数据库；
+    未携带时沿用 .env 配置，NOTION_REQUIRE_TENANT_TOKEN=1 时直接拒绝。stdio 传输不受影响。
+    """
+
+    async def on_call_tool(self, context, call_next):
+        from fastmcp.exceptions import ToolError
+        from fastmcp.server.dependencies import get_http_request
+
+        try:
+            headers = get_http_request().headers
+        except RuntimeError:
+            # 非 HTTP 请求（如 stdio）
+            return await call_next(context)
+        token = headers.get("x-notion-token", "").strip()
+        if token:
+            with use_tenant(token, headers.get("x-notion-database-id", "").strip()):
+                return await call_next(context)
+        if NOTION_REQUIRE_TENANT_TOKEN:
+            raise ToolError("Missing X-Notion-Token header.")
+        return await call_next(context)
+
+mcp.add_middleware(TenantMiddleware())
+
+def create_http_app():
+    """
+    多进程部署用的 ASGI 应用工厂（无状态 HTTP，任意 worker 都能处理任意请求），例如：
+    uvicorn --factory notion_mcp:create_http_app --workers 4 --port 8000
+    每个 worker 进程各自维护租户注册表与限流器，并各自启动后台任务（重放写后台日志、写出指标文件）。
+    """
+    start_background_workers()
+    return mcp.http_app(transport="http", stateless_http=True)
 
 @mcp.tool()
-def get_page_info(page_id: str) -> str:
+def get_server_metrics(format: str = "json") -> str:
     """
-    功能: 获取 Notion 页面的所有属性值和元数据。
+    功能: 查看服务运行指标：每个工具与每个 Notion 端点的调用次数、耗时分位数（p50/p95/p99）、失败与状态码分布、
+         重试次数、收发字节数，以及各缓存的命中率。
     
     入参:
-        - page_id (str, 必填): 页面 ID。
+        - format (str, 可选): "json"（默认）返回汇总 JSON；"prometheus" 返回 Prometheus 文本格式。
     
-    参数结构: UUID 字符串，例如 "your_page_id_here"。
+    返回: 指标 JSON 或 Prometheus 文本；配置了 NOTION_METRICS_FILE 时同时刷新该文件。
+    """
+    if not metrics.enabled:
+        return "Error: Metrics are disabled (NOTION_METRICS=0)."
+    if NOTION_METRICS_FILE:
+        try:
+            metrics.write_prometheus(NOTION_METRICS_FILE)
+        except OSError as e:
+            print(f"⚠️ 警告: 写出指标文件失败: {e}", file=sys.stderr)
+    if format == "prometheus":
+        return metrics.prometheus()
+    return to_json(metrics.snapshot())
+
+@mcp.tool()
+def get_cache_stats() -> str:
+    """
+    功能: 查看查询结果缓存与架构缓存的命中/未命中次数、条目数与占用字节数，以及被合并（共享在途结果）的只读请求数，用于评估缓存效果。
     
-    返回: 页面完整详情的 JSON 字符串。
+    入参: 无。
+    
+    返回: 缓存统计 JSON。
     """
-    status, page = notion_request("GET", f"pages/{page_id}")
-    if status != 200:
-        return f"Error: {json.dumps(page, indent=2, ensure_ascii=False)}"
-    return json.dumps(page, indent=2, ensure_ascii=False)
+    return to_json(metrics.cache_stats())
 
 @mcp.tool()
-def update_notion_page(page_id: str, properties: dict) -> str:
+@local_store_only
+@with_profile
+@with_database
+async def sync_database(database_id: str = None, full: bool = False, include_content: bool = False) -> str:
     """
-    功能: 修改现有页面的属性值。
+    功能: 将数据库的页面同步到本地 SQLite 镜像，供 query_local 快速读取，并更新 search_pages 的检索索引。首次为全量同步，之后按 last_edited_time 增量同步。
     
     入参:
-        - page_id (str, 必填): 页面 ID。
-        - properties (dict, 必填): 要更新的属性。支持拼音名和简单值。
-    
-    参数结构:
-        - page_id: "your_page_id_here"
-        - properties: {"zhuang_tai": "已完成", "Priority": "High"}
+        - database_id (str, 可选): 数据库 ID。
+        - full (bool, 可选): 是否强制全量同步（会清除 Notion 中已删除的页面），默认 False。
+        - include_content (bool, 可选): 是否同时读取本次有改动页面的正文文本加入检索索引（每页多一次请求），默认 False。
     
-    返回: 更新成功后的页面 URL。
+    返回: 同步摘要 JSON，包含同步模式、本次拉取的页面数与镜像中的页面总数。
     """
-    # 获取页面所属的数据库 ID 及其最新架构
-    status_page, page_info = notion_request("GET", f"pages/{page_id}")
-    if status_page != 200:
-        return f"Error fetching page: {json.dumps(page_info)}"
-    
-    db_id = page_info.get("parent", {}).get("database_id")
+    db_id = target_database(database_id)
     if not db_id:
-        # 如果不是数据库页面，直接使用原始属性
-        normalized_props = properties
-    else:
-        # 实时获取数据库最新架构
-        status_db, db_meta = notion_request("GET", f"databases/{db_id}")
-        db_props = db_meta.get("properties", {}) if status_db == 200 else None
-        normalized_props = normalize_properties(db_id, properties, db_props=db_props)
+        return MISSING_DATABASE_ERROR
 
-    payload = {"properties": normalized_props}
-    status, updated = notion_request("PATCH", f"pages/{page_id}", body=payload)
-    if status not in (200, 201):
-        return f"Error: {json.dumps(updated, indent=2, ensure_ascii=False)}"
-    
-    return f"Page updated successfully: {updated.get('url')}"
+    status_db, db_meta = await async_get_database_schema(db_id)
+    if status_db != 200:
+        return metadata_error(db_meta)
+
+    # 镜像与检索索引的 SQLite 读写在线程中执行，避免阻塞事件循环上的其他工具调用
+    state = None if full else await asyncio.to_thread(local_mirror.get_state, db_id)
+    last_edited = state[0] if state else None
+    filter_params = None
+    if last_edited:
+        # Notion 的 last_edited_time 精确到分钟，使用 on_or_after 避免漏掉边界上的修改
+        filter_params = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": last_edited}}
+    sorts = [{"timestamp": "last_edited_time", "direction": "ascending"}]
+
+    fetched, seen_ids = 0, []
+    with call_deadline(NOTION_CALL_DEADLINE * 10):
+        async for status, page in aiter_query_pages(db_id, filter_params, sorts):
+            if status != 200:
+                return f"Error (Status {status}) after syncing {fetched} pages: {to_json(page)}"
+            results = page.get("results", [])
+            await asyncio.to_thread(local_mirror.upsert_pages, db_id, results)
+            contents = None
+            if include_content:
+                def make_job(page_id):
+                    return lambda: fetch_page_text(page_id)
+                texts = await run_bounded([make_job(item["id"]) for item in results])
+                contents = {item["id"]: text for item, text in zip(results, texts) if text is not None}
+            await asyncio.to_thread(index_pages, results, contents)
+            for item in results:
+                remember_page_parent(item)
+                seen_ids.append(item["id"])
+                if not last_edited or (item.get("last_edited_time") or "") > last_edited:
+                    last_edited = item.get("last_edited_time")
+            fetched += len(results)
+
+    def finish():
+        removed = local_mirror.prune(db_id, seen_ids) if state is None else []
+        if removed:
+            search_index.remove(removed)
+        local_mirror.set_state(db_id, last_edited, db_meta.get("properties", {}))
+        return removed, local_mirror.count(db_id)
+
+    removed, total = await asyncio.to_thread(finish)
+    summary = {
+        "database_id": db_id,
+        "mode": "incremental" if state else "full",
+        "fetched": fetched,
+        "removed": len(removed),
+        "total": total,
+        "last_edited_time": last_edited,
+    }
+    return to_json(summary)
 
 @mcp.tool()
-def append_page_content(page_id: str, content: str) -> str:
+@local_store_only
+@with_profile
+@with_database
+def query_local(database_id: str = None, filter_params: dict = None, sorts: list = None, max_results: int = 100,
+                fields: list = None, format: str = "full") -> str:
     """
-    功能: 向页面内容末尾追加文本段落。
+    功能: 在本地镜像中查询已同步数据库的页面（需先调用 sync_database），无需访问 Notion，适合重复的只读查询。
     
     入参:
-        - page_id (str, 必填): 页面 ID。
-        - content (str, 必填): 要追加的文本字符串。
+        - database_id (str, 可选): 数据库 ID。
+        - filter_params (dict, 可选): 与 query_database 相同的 Notion 标准查询对象，支持 and/or 嵌套；属性名支持拼音。
+        - sorts (list, 可选): Notion 标准排序数组。
+        - max_results (int, 可选): 最多返回的条数，默认 100；传 0 表示全部。
+        - fields (list, 可选): 只返回这些属性（支持拼音/别名）。
+        - format (str, 可选): "full" 返回原始 JSON；"compact" 将每个属性扁平化为纯值并输出压缩 JSON。
     
     参数结构:
-        - page_id: "your_page_id_here"
-        - content: "这是追加的内容。"
+        - filter_params: {"and": [{"property": "状态", "select": {"equals": "已完成"}},
+                                  {"property": "记录时间", "date": {"past_week": {}}}]}
     
-    返回: 成功或失败的确认消息。
+    返回: 与 query_database 相同结构的 JSON，附带镜像中最新的 last_edited_time 提示数据新鲜度。
     """
-    payload = {
-        "children": [
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [{"type": "text", "text": {"content": content}}]
-                }
-            }
-        ]
+    if format not in OUTPUT_FORMATS:
+        return OUTPUT_FORMAT_ERROR
+    db_id = target_database(database_id)
+    if not db_id:
+        return MISSING_DATABASE_ERROR
+
+    state = local_mirror.get_state(db_id)
+    if state is None:
+        return f"Error: Database {mask_id(db_id)} has not been synced. Call sync_database first."
+
+    resolver = get_property_resolver(state[1]) if state[1] else None
+    try:
+        where_sql, params = compile_filter(filter_params, resolver)
+        order_sql, order_params = compile_sorts(sorts, resolver)
+    except (ValueError, AttributeError, StopIteration) as e:
+        return f"Error: Invalid filter_params or sorts: {e}"
+
+    pages = local_mirror.query(db_id, where_sql, params, order_sql, order_params, max_results or None)
+    result = {
+        "object": "list",
+        "results": [shape_page(page, fields, format) for page in pages],
+        "last_edited_time": state[0],
     }
-    status, result = notion_request("PATCH", f"blocks/{page_id}/children", body=payload)
-    if status != 200:
-        return f"Error: {json.dumps(result, indent=2, ensure_ascii=False)}"
+    return dump_result(result, format)
+
+@mcp.tool()
+@local_store_only
+@with_profile
+@with_database
+def search_pages(query: str, database_id: str = None, limit: int = 20) -> str:
+    """
+    功能: 在本地全文索引中检索页面标题、rich_text 属性与正文，支持中文子串与拼音（全拼/首字母）匹配，按相关度排序。
+         索引随本服务的创建/更新/追加操作及 sync_database 自动更新。
+    
+    入参:
+        - query (str, 必填): 检索词，多个词以空格分隔（需同时命中），例如 "登录 bug"、"gongzuo"、"gzrz"。
+        - database_id (str, 可选): 只检索该数据库的页面，默认检索当前档案凭据下全部已索引的页面。
+        - limit (int, 可选): 最多返回的条数，默认 20。
     
-    return "Content appended to page successfully."
+    返回: JSON 列表，每项包含 id、url、title、snippet（命中片段）与 score（越大越相关）。
+    """
+    if not query or not query.strip():
+        return "Error: No query provided."
+    try:
+        results = search_index.search(query, database_id, max(1, limit), index_scope())
+    except sqlite3.OperationalError as e:
+        return f"Error: Invalid search query: {e}"
+    return to_json({"query": query, "results": results})
 
 @mcp.tool()
-def update_database_properties(database_id: str = None, properties: dict = None) -> str:
+@with_profile
+@with_database
+async def predict_work_types(items: list, database_id: str = None) -> str:
     """
-    功能: 修改数据库的架构，包括添加、重命名或删除列。
+    功能: 批量预测条目的工作类型（与创建页面时自动填充的规则相同），不写入 Notion；可用于预览或回填历史数据。
     
     入参:
-        - database_id (str, 可选): 数据库 ID。
-        - properties (dict, 必填): 描述属性变更的字典。
+        - items (list, 必填): 待预测的条目，每项为 {"title": ..., "content": ...} 或直接为标题字符串。
+        - database_id (str, 可选): 数据库 ID，用于读取工作类型属性的可选项。
     
     参数结构:
-        - properties: {"新列名": {"rich_text": {}}, "旧列名": null}
-          (值为 null 时表示删除该列)
+        - items: [{"title": "修复小程序登录", "content": "微信授权回调"}, "整理日常记录"]
     
-    返回: 成功后的数据库属性列表。
+    返回: JSON 列表，每项包含 work_type（预测结果）与 scores（各命中选项的得分与命中的关键词）。
     """
-    _, default_db_id = load_env_vars()
-    db_id = database_id or default_db_id
+    db_id = target_database(database_id)
     if not db_id:
-        return "Error: No database_id provided."
+        return MISSING_DATABASE_ERROR
+    if not items:
+        return "Error: No items provided."
 
-    if not properties:
-        return "Error: No property changes provided."
+    status_db, db_meta = await async_get_database_schema(db_id)
+    if status_db != 200:
+        return metadata_error(db_meta)
+    classifier = work_type_classifier(db_meta.get("properties", {}))
+    if classifier is None:
+        return "Error: Database has no work type property."
 
-    status, result = notion_request("PATCH", f"databases/{db_id}", body={"properties": properties})
-    if status != 200:
-        return f"Error: {json.dumps(result, indent=2, ensure_ascii=False)}"
-    
-    return f"Database schema updated successfully. Current properties: {list(result.get('properties', {}).keys())}"
+    items = [{"title": item} if isinstance(item, str) else (item or {}) for item in items]
+    pairs = [(item.get("title", ""), item.get("content")) for item in items]
+    predictions = infer_work_types(db_meta.get("properties", {}), pairs)
+    results = [
+        {"index": index, "work_type": predicted, "scores": classifier.scores(title, content)}
+        for index, ((title, content), predicted) in enumerate(zip(pairs, predictions))
+    ]
+    return to_json(results)
 
 @mcp.tool()
-def upgrade_database_schema(database_id: str = None) -> str:
+@local_store_only
+def get_write_status(ticket: str = None) -> str:
     """
-    功能: 一键升级数据库架构，添加标准的“工作类型”和“状态”选择字段。
+    功能: 查看写后台队列（NOTION_WRITE_BEHIND=1 时建页与追加正文先入队、立即返回票据）的提交状态。
     
     入参:
-        - database_id (str, 可选): 数据库 ID。
+        - ticket (str, 可选): 入队时返回的票据（wb_ 开头）。不传时返回队列汇总。
     
-    返回: 确认升级成功的消息。
+    返回: 指定票据时返回该写入的 state（pending / done / failed）、尝试次数、页面 ID、URL 与结果信息；
+         否则返回各状态计数、最早未完成写入的等待时长、队首条目与最近的失败。
     """
-    _, default_db_id = load_env_vars()
-    db_id = database_id or default_db_id
-    if not db_id:
-        return "Error: No database_id provided."
-
-    properties = {
-        "工作类型": {
-            "select": {
-                "options": [
-                    {"name": "📱 小程序端", "color": "blue"},
-                    {"name": "💻 vue后台web端", "color": "green"},
-                    {"name": "🔌 fastAPI后台接口端", "color": "purple"},
-                    {"name": "📝 日常记录", "color": "gray"}
-                ]
-            }
-        },
-        "状态": {
-            "select": {
-                "options": [
-                    {"name": "未开始", "color": "gray"},
-                    {"name": "进行中", "color": "blue"},
-                    {"name": "已完成", "color": "green"}
-                ]
-            }
-        }
-    }
-
-    status, result = notion_request("PATCH", f"databases/{db_id}", body={"properties": properties})
-    if status != 200:
-        return f"Error: {json.dumps(result, indent=2, ensure_ascii=False)}"
-    
-    return "Database schema upgraded with '工作类型' and '状态' properties."
+    if not write_queue.enabled and not os.path.exists(write_queue.path):
+        return "Write-behind mode is disabled (set NOTION_WRITE_BEHIND=1)."
+    if ticket:
+        result = write_queue.status(ticket)
+        if result is None:
+            return f"Error: Unknown write ticket {ticket}."
+        return to_json(result)
+    return to_json(write_queue.status())
 
 if __name__ == "__main__":
-    mcp.run()
+    start_background_workers()
+    if NOTION_TRANSPORT == "stdio":
+        mcp.run()
+    else:
+        mcp.run(transport=NOTION_TRANSPORT, host=NOTION_HOST, port=NOTION_PORT)